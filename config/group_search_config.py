@@ -187,6 +187,28 @@ MIN_TIME_BETWEEN_RESPONSES = 3
 # Máximo de respuestas por grupo por hora
 MAX_RESPONSES_PER_HOUR = 50
 
+# Respuestas seguidas que puede recibir un grupo antes de aplicar el límite por hora
+GROUP_RESPONSE_BURST = 3
+
+# Máximo de respuestas automáticas por minuto sumando todos los grupos
+# (el resto del cupo de envíos de Telegram queda para los chats privados)
+GLOBAL_GROUP_RESPONSES_PER_MINUTE = 20
+GLOBAL_GROUP_RESPONSE_BURST = 5
+
+# ======================
+# CACHÉ DE RESPUESTAS
+# ======================
+
+# Segundos que se reutiliza la respuesta a la misma búsqueda en un grupo
+GROUP_CACHE_TTL = 600
+
+# Búsquedas recordadas por grupo y grupos recordados en total
+GROUP_CACHE_MAX_QUERIES = 50
+GROUP_CACHE_MAX_CHATS = 1000
+
+# No repetir la misma tarjeta en un grupo si se envió hace menos de estos segundos
+GROUP_REPEAT_SUPPRESS_SECONDS = 120
+
 # ======================
 # PERSONALIZACIÓN POR IDIOMA
 # ======================
@@ -33,7 +33,72 @@ NOTIFICATION_GROUPS = [
 
 DATABASE_URL = os.getenv('DATABASE_URL')
 TMDB_API_KEY = os.getenv('TMDB_API_KEY', '')
+# Límite de peticiones por segundo a TMDB (su cuota es ~50/s por IP) y conexiones keep-alive
+TMDB_RATE_LIMIT = float(os.getenv('TMDB_RATE_LIMIT', 40))
+TMDB_MAX_CONNECTIONS = int(os.getenv('TMDB_MAX_CONNECTIONS', 10))
+# Respuestas de TMDB que se mantienen en memoria (el resto queda en la tabla tmdb_cache)
+TMDB_CACHE_MEMORY_ITEMS = int(os.getenv('TMDB_CACHE_MEMORY_ITEMS', 512))
 ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_IDS', '').split(',') if id.strip()]
 WEBAPP_URL = os.getenv('WEBAPP_URL', 'http://localhost:5000/ad_viewer.html')
 API_SERVER_URL = os.getenv('API_SERVER_URL', 'http://localhost:5000')
 FLASK_PORT = int(os.getenv('FLASK_PORT', 5000))
+
+# Cola de entregas de /api/ad-completed (server.py)
+DELIVERY_WORKERS = int(os.getenv('DELIVERY_WORKERS', 4))
+DELIVERY_QUEUE_SIZE = int(os.getenv('DELIVERY_QUEUE_SIZE', 200))
+# Segundos en los que un mismo (usuario, contenido) ya entregado no se vuelve a enviar
+DELIVERY_DEDUP_SECONDS = int(os.getenv('DELIVERY_DEDUP_SECONDS', 120))
+DELIVERY_MAX_RETRIES = int(os.getenv('DELIVERY_MAX_RETRIES', 3))
+
+# Broadcast: Telegram admite ~30 mensajes/s a chats distintos
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 25))
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 20))
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 500))
+# Cada cuántos segundos se edita el mensaje de progreso
+BROADCAST_PROGRESS_SECONDS = float(os.getenv('BROADCAST_PROGRESS_SECONDS', 5))
+# Filas del ledger de entregas que se acumulan antes de escribirlas
+BROADCAST_LEDGER_BATCH_SIZE = int(os.getenv('BROADCAST_LEDGER_BATCH_SIZE', 200))
+
+# Backfill del canal de almacenamiento (/backfill): forward_messages de hasta 100 ids
+# por llamada a un chat privado de trabajo (por defecto, el chat del admin)
+BACKFILL_SCRATCH_CHAT_ID = int(os.getenv('BACKFILL_SCRATCH_CHAT_ID')) if os.getenv('BACKFILL_SCRATCH_CHAT_ID') else None
+BACKFILL_WINDOW = min(int(os.getenv('BACKFILL_WINDOW', 100)), 100)
+BACKFILL_CONCURRENCY = int(os.getenv('BACKFILL_CONCURRENCY', 4))
+BACKFILL_RATE = float(os.getenv('BACKFILL_RATE', 20))
+# Ventanas vacías consecutivas para dar por terminado el canal (si no se indica hasta dónde)
+BACKFILL_MAX_EMPTY_WINDOWS = int(os.getenv('BACKFILL_MAX_EMPTY_WINDOWS', 3))
+
+# Cada cuántos segundos el índice de búsqueda en memoria (y el detector de
+# títulos de grupos) trae los videos/series nuevos o editados por otros
+# procesos (scripts de indexación, servidor web, /reindexar_titulos), según
+# id y updated_at. Las ediciones hechas con SQL directo que no tocan
+# updated_at no se ven hasta reiniciar
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', 60))
+
+# Caché LRU de resultados de búsqueda (se invalida al cambiar el catálogo);
+# SEARCH_CACHE_MAX_ENTRIES=0 la desactiva
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 1000))
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', SEARCH_INDEX_REFRESH_SECONDS))
+
+# Estado de navegación de los usuarios: en memoria, escrito a la BD en lotes
+# cada NAV_STATE_FLUSH_SECONDS y al apagar el bot
+NAV_STATE_FLUSH_SECONDS = float(os.getenv('NAV_STATE_FLUSH_SECONDS', 5))
+NAV_STATE_FLUSH_BATCH = int(os.getenv('NAV_STATE_FLUSH_BATCH', 500))
+NAV_STATE_CACHE_MAX_USERS = int(os.getenv('NAV_STATE_CACHE_MAX_USERS', 20000))
+
+# Árboles de navegación de series (temporadas/episodios) en memoria
+SHOW_TREE_CACHE_SIZE = int(os.getenv('SHOW_TREE_CACHE_SIZE', 300))
+SHOW_TREE_TTL = int(os.getenv('SHOW_TREE_TTL', 600))
+
+# Contadores de /stats (tabla stats_rollup): cada cuántos segundos se
+# recalculan desde las tablas para corregir desvíos
+STATS_RECONCILE_SECONDS = int(os.getenv('STATS_RECONCILE_SECONDS', 3600))
+
+# Rollups por hora de /stats_canales: solo se usan para el primer día de
+# 'week'/'month', se guardan al menos 32 días
+CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS = max(int(os.getenv('CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS', 35)), 32)
+
+# Motor de búsqueda de videos/series:
+#   'memory' - índice invertido en memoria del proceso (por defecto)
+#   'sql'    - ranking en la base de datos (pg_trgm en PostgreSQL, FTS5 en SQLite)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'memory').lower()
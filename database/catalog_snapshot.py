@@ -0,0 +1,214 @@
+"""
+Snapshot precalculado del catálogo (películas + series) para la Mini App
+
+El JSON de /api/catalog, /api/movies y /api/series se serializa y comprime
+(gzip y brotli) una sola vez por versión del catálogo. add_video, update_video,
+add_tv_show y add_episode suben la versión con catalog_version.bump(); el
+siguiente pedido reconstruye el snapshot.
+
+El ETag es un hash del contenido, así que si una reconstrucción produce el
+mismo JSON los clientes siguen recibiendo 304.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class CatalogVersion:
+    """Contador de cambios del catálogo, compartido por todo el proceso"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+            return self.value
+
+# Versión compartida por todas las instancias de DatabaseManager del proceso
+catalog_version = CatalogVersion()
+
+# Columnas del catálogo que se pueden pedir (snapshot completo y ?fields=)
+CATALOG_FIELDS = {
+    'movie': [
+        'id', 'title', 'original_title', 'year', 'overview', 'poster_url',
+        'backdrop_url', 'vote_average', 'runtime', 'genres', 'message_id'
+    ],
+    'series': [
+        'id', 'name', 'original_name', 'year', 'overview', 'poster_url',
+        'backdrop_url', 'vote_average', 'genres', 'number_of_seasons', 'status'
+    ],
+}
+
+# Lo mínimo que necesita la grilla de la Mini App (sin overview ni backdrop)
+CATALOG_GRID_FIELDS = {
+    'movie': ['id', 'title', 'original_title', 'year', 'poster_url', 'vote_average', 'message_id'],
+    'series': ['id', 'name', 'original_name', 'year', 'poster_url', 'vote_average', 'number_of_seasons'],
+}
+
+class CatalogBody:
+    """
+    Cuerpo del catálogo ya serializado y comprimido, con su ETag.
+
+    No se modifica después de creado: al reconstruir se arma uno nuevo y se
+    reemplaza la referencia, así un pedido nunca mezcla el ETag de una
+    versión con el cuerpo de otra.
+    """
+
+    __slots__ = ('etag', 'body', 'gzip_body', 'brotli_body', 'version', 'built_at')
+
+    def __init__(self, payload, version):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9)
+        self.brotli_body = brotli.compress(body) if brotli else None
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def select_body(self, accept_encoding):
+        """Elige el cuerpo según Accept-Encoding: (bytes, content_encoding o None)"""
+        accept_encoding = (accept_encoding or '').lower()
+        if self.brotli_body is not None and 'br' in accept_encoding:
+            return self.brotli_body, 'br'
+        if 'gzip' in accept_encoding:
+            return self.gzip_body, 'gzip'
+        return self.body, None
+
+# Límites que ya tenían /api/movies (get_all_videos) y /api/series
+MOVIES_VIEW_LIMIT = 500
+SERIES_VIEW_LIMIT = 1000
+
+def _movie_item(row):
+    """Película con el formato de /api/movies"""
+    return {
+        'id': row['id'],
+        'title': row['title'] or 'Sin título',
+        'year': row['year'],
+        'overview': row['overview'] or '',
+        'poster_url': row['poster_url'] or '',
+        'backdrop_url': row['backdrop_url'] or '',
+        'rating': float(row['vote_average']) if row['vote_average'] else None,
+        'genres': row['genres'].split(',') if row['genres'] else [],
+        'type': 'movie',
+        'message_id': row['message_id'],
+    }
+
+def _series_item(row):
+    """Serie con el formato de /api/series"""
+    return {
+        'id': row['id'],
+        'name': row['name'] or 'Sin título',
+        'original_name': row['original_name'],
+        'year': row['year'],
+        'overview': row['overview'] or '',
+        'poster_url': row['poster_url'] or '',
+        'backdrop_url': row['backdrop_url'] or '',
+        'vote_average': float(row['vote_average']) if row['vote_average'] else None,
+        'genres': row['genres'],
+        'number_of_seasons': row['number_of_seasons'],
+        'status': row['status'],
+        'type': 'series',
+    }
+
+def build_catalog_bodies(movies, series, bot_username, version):
+    """
+    Serializa y comprime las vistas del catálogo (CPU: se corre fuera del event loop)
+
+    Returns:
+        dict vista -> CatalogBody: 'catalog' (/api/catalog), 'movies'
+        (/api/movies) y 'series' (/api/series), todas de la misma versión
+    """
+    movie_items = [_movie_item(row) for row in movies[:MOVIES_VIEW_LIMIT]]
+    series_items = [_series_item(row) for row in series[:SERIES_VIEW_LIMIT]]
+    return {
+        'catalog': CatalogBody({
+            'movies': movies,
+            'series': series,
+            'bot_username': bot_username,
+            'total_movies': len(movies),
+            'total_series': len(series),
+        }, version),
+        'movies': CatalogBody({
+            'movies': movie_items,
+            'total': len(movie_items),
+            'bot_username': bot_username,
+        }, version),
+        'series': CatalogBody({
+            'series': series_items,
+            'total': len(series_items),
+        }, version),
+    }
+
+class CatalogSnapshot:
+    """Referencia a las vistas vigentes del catálogo, reconstruidas al cambiar el contenido"""
+
+    def __init__(self, max_age=300):
+        """
+        Args:
+            max_age: segundos máximos antes de reconstruir aunque no haya
+                cambios locales (para ver lo que agreguen otros procesos)
+        """
+        self.max_age = max_age
+        # dict vista -> CatalogBody; se reemplaza entero, nunca se modifica
+        self.current = None
+        self._lock = None
+
+    def is_stale(self, current):
+        if current is None:
+            return True
+        # Todas las vistas se construyen juntas: alcanza con mirar una
+        body = current['catalog']
+        return (
+            body.version != catalog_version.value
+            or time.monotonic() - body.built_at > self.max_age
+        )
+
+    async def get(self, db, bot_username, view='catalog'):
+        """
+        Retorna el CatalogBody vigente de una vista, reconstruyendo todas si
+        cambió el catálogo
+
+        Args:
+            view: 'catalog', 'movies' o 'series'
+        """
+        current = self.current
+        if not self.is_stale(current):
+            return current[view]
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # Otro pedido pudo haberlo reconstruido mientras esperábamos
+            current = self.current
+            if self.is_stale(current):
+                version = catalog_version.value
+                movies, series = await db.get_catalog_rows()
+                # gzip-9 y brotli tardan: en un hilo, para no frenar el loop
+                # (en server.py es el mismo que corre las entregas)
+                loop = asyncio.get_running_loop()
+                current = await loop.run_in_executor(
+                    None, build_catalog_bodies, movies, series, bot_username, version
+                )
+                self.current = current
+        return current[view]
+
+    @staticmethod
+    def etag_matches(if_none_match, etag):
+        """Compara el header If-None-Match con el ETag actual"""
+        if not if_none_match or not etag:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        candidates = [value.strip() for value in if_none_match.split(',')]
+        # Algunos proxies agregan W/ al reenviar
+        return any(value == etag or value == f"W/{etag}" for value in candidates)
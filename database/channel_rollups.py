@@ -0,0 +1,93 @@
+"""
+Rollups de visitas por canal (channel_visit_rollups) para /stats_canales
+
+register_channel_visit suma cada visita, en la misma transacción, a tres
+buckets de su canal: la hora, el día (UTC) y el total histórico. Cada
+bucket guarda visitas, usuarios nuevos, última visita y un sketch
+HyperLogLog de los usuarios, así que los únicos de un período salen de unir
+los sketches de sus buckets:
+
+    today  -> el bucket del día
+    week   -> horas del primer día parcial + días completos (≤ 24 + 7 filas)
+    month  -> horas del primer día parcial + días completos (≤ 24 + 30 filas)
+    total  -> el bucket histórico
+
+Las filas leídas no dependen de cuánta historia haya. Los buckets por hora
+solo hacen falta para el primer día de week/month y se borran después de
+CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS.
+"""
+from datetime import datetime, timedelta
+
+from utils.hyperloglog import HyperLogLog
+
+HOUR = 'hour'
+DAY = 'day'
+ALL = 'all'
+
+# bucket_start del total histórico (misma fecha de inicio que usaba 'total')
+ALL_TIME_START = datetime(2020, 1, 1)
+
+PERIOD_DAYS = {'week': 7, 'month': 30}
+
+def floor_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def floor_day(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def visit_buckets(visited_at):
+    """(granularidad, bucket_start) que suma una visita; visited_at en UTC sin tzinfo"""
+    return [
+        (HOUR, floor_hour(visited_at)),
+        (DAY, floor_day(visited_at)),
+        (ALL, ALL_TIME_START),
+    ]
+
+def period_ranges(period, now):
+    """
+    Buckets que cubren un período hasta `now` (UTC sin tzinfo).
+
+    Returns:
+        lista de (granularidad, desde, hasta) con desde <= bucket_start < hasta
+    """
+    tomorrow = floor_day(now) + timedelta(days=1)
+    if period == 'today':
+        return [(DAY, floor_day(now), tomorrow)]
+    if period in PERIOD_DAYS:
+        start = now - timedelta(days=PERIOD_DAYS[period])
+        first_full_day = floor_day(start) + timedelta(days=1)
+        return [
+            (HOUR, floor_hour(start), first_full_day),
+            (DAY, first_full_day, tomorrow),
+        ]
+    return [(ALL, ALL_TIME_START, ALL_TIME_START + timedelta(days=1))]
+
+class BucketTotals:
+    """Totales de uno o varios buckets de un canal"""
+
+    __slots__ = ('visits', 'new_users', 'last_visit', 'users')
+
+    def __init__(self):
+        self.visits = 0
+        self.new_users = 0
+        self.last_visit = None
+        self.users = HyperLogLog()
+
+    def add_visit(self, user_id, is_new_user, visited_at):
+        self.visits += 1
+        self.new_users += 1 if is_new_user else 0
+        if self.last_visit is None or visited_at > self.last_visit:
+            self.last_visit = visited_at
+        self.users.add(user_id)
+
+    def add_bucket(self, visits, new_users, last_visit, sketch):
+        """Une una fila de channel_visit_rollups"""
+        self.visits += visits or 0
+        self.new_users += new_users or 0
+        if last_visit is not None and (self.last_visit is None or last_visit > self.last_visit):
+            self.last_visit = last_visit
+        self.users.merge(HyperLogLog.from_bytes(sketch))
+
+    def unique_users(self):
+        # La estimación nunca puede superar las visitas
+        return min(self.users.count(), self.visits)
@@ -1,21 +1,61 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, or_, func, update, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, or_, and_, func, update, delete, insert, inspect, text
 from .models import (
-    Base, User, Video, Search, Favorite, AdToken, BotConfig, 
+    Base, User, Video, Search, Favorite, AdToken, BotConfig, TmdbCache, PendingVideo,
+    Broadcast, BroadcastDelivery,
     TvShow, Episode, UserNavigationState,
     UserTicket, TicketTransaction, Referral, UserActivity,
-    ChannelSource, ChannelVisit
+    ChannelSource, ChannelVisit, ChannelVisitRollup, StatsRollup
+)
+from .search_index import video_index, tv_show_index, normalize_text, VIDEO_SEARCH_FIELDS, TV_SHOW_SEARCH_FIELDS
+from .search_sql import build_ranked_search, ensure_search_schema
+from .catalog_snapshot import catalog_version, CATALOG_FIELDS, CATALOG_GRID_FIELDS
+from .title_matcher import title_matcher
+from .search_cache import search_cache
+from .navigation_state import navigation_states
+from .show_tree import show_trees, ShowTree, EpisodeEntry
+from .migrations import apply_migrations
+from .channel_rollups import visit_buckets, period_ranges, BucketTotals, HOUR
+from utils.hyperloglog import HyperLogLog
+from config.settings import (
+    DATABASE_URL, SEARCH_INDEX_REFRESH_SECONDS, SEARCH_BACKEND,
+    CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS
 )
-from config.settings import DATABASE_URL
-import unicodedata
 import secrets
 import asyncio
 import logging
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timezone, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Títulos que detecta title_matcher en los mensajes de grupo: (tipo, modelo, campos)
+TITLE_MATCHER_SOURCES = [
+    ('movie', Video, ('title', 'original_title')),
+    ('series', TvShow, ('name', 'original_name')),
+]
+
+# Contadores de stats_rollup y la consulta que los recalcula desde cero
+GLOBAL_STATS_COUNTERS = {
+    'total_users': lambda: select(func.count(User.id)),
+    'verified_users': lambda: select(func.count(User.id)).where(User.verified == True),
+    'total_videos': lambda: select(func.count(Video.id)),
+    'total_series': lambda: select(func.count(TvShow.id)),
+    'total_episodes': lambda: select(func.count(Episode.id)),
+    'tickets_available': lambda: select(func.coalesce(func.sum(UserTicket.tickets), 0)),
+    'tickets_used': lambda: select(func.coalesce(func.sum(UserTicket.tickets_used), 0)),
+    'total_referrals': lambda: select(func.count(Referral.id)),
+    'verified_referrals': lambda: select(func.count(Referral.id)).where(
+        Referral.status.in_(['verified', 'rewarded'])
+    ),
+}
+STATS_ROLLUP_ID = 1
+
+# Margen al buscar filas editadas por otros procesos (ver _changed_catalog_rows)
+CATALOG_CHANGE_LOOKBACK = timedelta(minutes=5)
+
 class DatabaseManager:
     def __init__(self):
         if not DATABASE_URL:
@@ -42,11 +82,47 @@ class DatabaseManager:
     async def init_db(self):
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+        
+        await self._ensure_reachability_schema()
+        
+        # Índices y otros cambios versionados (schema_migrations)
+        await apply_migrations(self.engine)
+        
+        # Columnas normalizadas e índices de búsqueda en bases ya existentes
+        await ensure_search_schema(
+            self.engine,
+            [(Video, VIDEO_SEARCH_FIELDS), (TvShow, TV_SHOW_SEARCH_FIELDS)],
+            use_sql_backend=(SEARCH_BACKEND == 'sql')
+        )
+        
+        # Rollups de /stats_canales para las visitas anteriores a la tabla
+        await self._ensure_channel_rollups()
+    
+    async def _ensure_reachability_schema(self):
+        """Columnas is_reachable/unreachable_* e índice parcial en una tabla users ya existente"""
+        bool_true = '1' if self.engine.dialect.name == 'sqlite' else 'TRUE'
+        async with self.engine.begin() as conn:
+            existing = await conn.run_sync(
+                lambda sync_conn: {col['name'] for col in inspect(sync_conn).get_columns('users')}
+            )
+            columns = {
+                'is_reachable': f"BOOLEAN NOT NULL DEFAULT {bool_true}",
+                'unreachable_reason': "VARCHAR(30)",
+                'unreachable_since': "TIMESTAMP",
+            }
+            for column_name, ddl in columns.items():
+                if column_name not in existing:
+                    await conn.execute(text(f"ALTER TABLE users ADD COLUMN {column_name} {ddl}"))
+                    logger.info(f"Columna users.{column_name} agregada")
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_users_reachable_id ON users (id) WHERE is_reachable"
+            ))
     
     async def add_user(self, user_id, username, first_name):
         async with self.async_session() as session:
             user = User(user_id=user_id, username=username, first_name=first_name)
             session.add(user)
+            await self._bump_stats(session, total_users=1)
             await session.commit()
     
     async def get_user(self, user_id):
@@ -64,6 +140,80 @@ class DatabaseManager:
             )
             return result.scalars().all()
     
+    async def count_users(self, after_id=0, reachable_only=False):
+        """Cantidad de usuarios registrados (con users.id mayor a after_id)"""
+        async with self.async_session() as session:
+            stmt = select(func.count(User.id)).where(User.id > after_id)
+            if reachable_only:
+                stmt = stmt.where(User.is_reachable == True)
+            result = await session.execute(stmt)
+            return result.scalar() or 0
+    
+    async def iter_user_id_batches(self, batch_size=500, after_id=0, reachable_only=False):
+        """
+        Recorre los user_id de Telegram en lotes, con cursor sobre users.id.
+        
+        Cada lote usa su propia sesión, así un broadcast largo no retiene una
+        conexión del pool ni carga toda la tabla en memoria. Con
+        reachable_only=True usa el índice parcial ix_users_reachable_id.
+        
+        Yields:
+            (último users.id del lote, lista de user_id) para usar de checkpoint
+        """
+        last_id = after_id
+        while True:
+            async with self.async_session() as session:
+                stmt = (
+                    select(User.id, User.user_id)
+                    .where(User.id > last_id)
+                    .order_by(User.id)
+                    .limit(batch_size)
+                )
+                if reachable_only:
+                    stmt = stmt.where(User.is_reachable == True)
+                result = await session.execute(stmt)
+                rows = result.all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield last_id, [row.user_id for row in rows]
+    
+    async def mark_users_unreachable(self, user_ids, reason):
+        """Marca un lote de usuarios como no alcanzables (bloquearon el bot, cuenta borrada...)"""
+        if not user_ids:
+            return
+        async with self.async_session() as session:
+            await session.execute(
+                update(User)
+                .where(User.user_id.in_(user_ids), User.is_reachable == True)
+                .values(is_reachable=False, unreachable_reason=reason, unreachable_since=datetime.utcnow())
+            )
+            await session.commit()
+    
+    async def mark_user_reachable(self, user_id):
+        """Vuelve a marcar como alcanzable a un usuario (desbloqueó el bot)"""
+        async with self.async_session() as session:
+            await session.execute(
+                update(User)
+                .where(User.user_id == user_id, User.is_reachable == False)
+                .values(is_reachable=True, unreachable_reason=None, unreachable_since=None)
+            )
+            await session.commit()
+    
+    async def get_user_reach_stats(self, active_days=7):
+        """Totales de usuarios para el menú de broadcast: total, alcanzables y activos"""
+        since = datetime.utcnow() - timedelta(days=active_days)
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(
+                    func.count(User.id),
+                    func.count(User.id).filter(User.is_reachable == True),
+                    func.count(User.id).filter(User.is_reachable == True, User.last_active > since)
+                )
+            )
+            total, reachable, active = result.one()
+            return {'total': total or 0, 'reachable': reachable or 0, 'active': active or 0}
+    
     async def update_user_verification(self, user_id, verified):
         async with self.async_session() as session:
             result = await session.execute(
@@ -71,7 +221,10 @@ class DatabaseManager:
             )
             user = result.scalar_one_or_none()
             if user:
+                delta = int(bool(verified)) - int(bool(user.verified))
                 user.verified = verified
+                if delta:
+                    await self._bump_stats(session, verified_users=delta)
                 await session.commit()
     
     async def add_video(self, file_id, message_id, title, description="", tags="", 
@@ -125,8 +278,16 @@ class DatabaseManager:
                         genres=genres,
                         channel_message_id=channel_message_id
                     )
+                    self._fill_search_columns(video, VIDEO_SEARCH_FIELDS)
                     session.add(video)
+                    await session.execute(self._pending_status_stmt([message_id], 'indexed'))
+                    await self._bump_stats(session, total_videos=1)
                     await session.commit()
+                    if video_index.loaded:
+                        video_index.upsert(video.id, self._index_fields(video, VIDEO_SEARCH_FIELDS))
+                    if title_matcher.loaded:
+                        title_matcher.upsert('movie', video.id, (video.title_norm, video.original_title_norm))
+                    catalog_version.bump()
                     return video
                 except Exception as e:
                     print(f"❌ Error al agregar video: {e}")
@@ -141,16 +302,170 @@ class DatabaseManager:
     
     def normalize_text(self, text):
         """Normaliza texto: quita acentos, convierte a minúsculas"""
-        if not text:
-            return ""
-        # Quitar acentos (á->a, é->e, etc.)
-        text = ''.join(
-            c for c in unicodedata.normalize('NFD', text)
-            if unicodedata.category(c) != 'Mn'
+        return normalize_text(text)
+    
+    @staticmethod
+    def _fill_search_columns(obj, fields):
+        """Llena las columnas <campo>_norm que usa la búsqueda"""
+        for field, _, _ in fields:
+            setattr(obj, f"{field}_norm", normalize_text(getattr(obj, field)) or None)
+    
+    async def _ranked_sql_search(self, session, model, fields, query, limit):
+        """Búsqueda con SEARCH_BACKEND='sql': el ranking se hace en la base de datos"""
+        stmt = build_ranked_search(
+            model, fields, self.normalize_text(query), limit=limit,
+            dialect_name=self.engine.dialect.name
+        )
+        if stmt is None:
+            return []
+        result = await session.execute(stmt)
+        return [row[0] for row in result.all()]
+    
+    @staticmethod
+    def _index_fields(obj, fields):
+        """Columnas <campo>_norm de un video/serie en el orden de `fields` (sin re-normalizar)"""
+        return tuple(getattr(obj, f"{field}_norm") or "" for field, _, _ in fields)
+    
+    async def _sync_search_index(self, session, index, model, label):
+        """
+        Carga el índice de búsqueda la primera vez y luego, cada
+        SEARCH_INDEX_REFRESH_SECONDS, trae las filas nuevas (id > max_id) y las
+        editadas (updated_at posterior a lo ya visto), para ver lo que indexen
+        o corrijan otros procesos (scripts de indexación, servidor web,
+        /reindexar_titulos desde el otro proceso).
+        
+        Las ediciones con SQL directo que no actualizan updated_at no se ven
+        hasta reiniciar.
+        """
+        now = time.monotonic()
+        columns = [model.id, model.updated_at] + [getattr(model, f"{field}_norm") for field, _, _ in index.fields]
+        
+        if not index.loaded:
+            result = await session.execute(select(*columns))
+            rows = result.all()
+            index.load(
+                ((row.id, self._index_fields(row, index.fields)) for row in rows),
+                synced_at=now
+            )
+            index.updated_until = max((row.updated_at for row in rows if row.updated_at), default=None)
+            logger.info(f"Índice de búsqueda de {label} cargado: {len(index)} filas")
+            return
+        
+        if now - index.synced_at < SEARCH_INDEX_REFRESH_SECONDS:
+            return
+        
+        index.synced_at = now
+        rows, changed = await self._changed_catalog_rows(session, model, columns, index.max_id, index.updated_until)
+        for row in rows:
+            changed |= index.upsert(row.id, self._index_fields(row, index.fields))
+            if row.updated_at and (index.updated_until is None or row.updated_at > index.updated_until):
+                index.updated_until = row.updated_at
+        if changed:
+            # Filas de otro proceso: las búsquedas cacheadas ya no valen
+            catalog_version.bump()
+    
+    @staticmethod
+    async def _changed_catalog_rows(session, model, columns, max_id, updated_until):
+        """
+        Filas con id > max_id o updated_at >= updated_until - CATALOG_CHANGE_LOOKBACK
+        (margen para transacciones que confirmaron tarde con un now() anterior).
+        
+        Returns:
+            (filas, True si alguna es nueva o tiene updated_at posterior a updated_until)
+        """
+        condition = model.id > max_id
+        if updated_until is not None:
+            condition = or_(condition, model.updated_at >= updated_until - CATALOG_CHANGE_LOOKBACK)
+        else:
+            condition = or_(condition, model.updated_at.isnot(None))
+        result = await session.execute(select(*columns).where(condition))
+        rows = result.all()
+        changed = any(
+            row.id > max_id or (row.updated_at and (updated_until is None or row.updated_at > updated_until))
+            for row in rows
+        )
+        return rows, changed
+    
+    async def _ranked_index_search(self, session, index, model, label, query, limit):
+        """Rankea con el índice en memoria y trae solo las filas ganadoras"""
+        await self._sync_search_index(session, index, model, label)
+        
+        ranked = index.search(self.normalize_text(query), limit=limit)
+        if not ranked:
+            return []
+        
+        ids = [doc_id for score, doc_id in ranked]
+        result = await session.execute(
+            select(model).where(model.id.in_(ids))
         )
-        return text.lower()
+        rows_by_id = {row.id: row for row in result.scalars().all()}
+        return [rows_by_id[doc_id] for doc_id in ids if doc_id in rows_by_id]
+    
+    async def _sync_title_matcher(self, session):
+        """
+        Carga title_matcher la primera vez y luego agrega solo los títulos
+        nuevos o editados (id y updated_at), igual que _sync_search_index
+        """
+        now = time.monotonic()
+        loaded = title_matcher.loaded
+        if loaded:
+            title_matcher.synced_at = now
+        
+        rows = []
+        updated_until = {}
+        for kind, model, fields in TITLE_MATCHER_SOURCES:
+            columns = [model.id, model.updated_at] + [getattr(model, f"{field}_norm") for field in fields]
+            previous = title_matcher.updated_until.get(kind)
+            if loaded:
+                result_rows, _ = await self._changed_catalog_rows(
+                    session, model, columns, title_matcher.max_ids.get(kind, 0), previous
+                )
+            else:
+                result_rows = (await session.execute(select(*columns))).all()
+            updated_until[kind] = max(
+                [row.updated_at for row in result_rows if row.updated_at] + ([previous] if previous else []),
+                default=None
+            )
+            rows.extend((kind, row[0], tuple(row[2:])) for row in result_rows)
+        
+        if not loaded:
+            title_matcher.load(rows, synced_at=now)
+            title_matcher.updated_until = updated_until
+            logger.info(f"Detector de títulos cargado: {len(title_matcher)} títulos")
+            return
+        for kind, doc_id, normalized in rows:
+            title_matcher.upsert(kind, doc_id, normalized)
+        title_matcher.updated_until = updated_until
+    
+    async def find_title_mentions(self, text):
+        """
+        Tipos del catálogo ('movie', 'series') con algún título mencionado en
+        el texto, sin consultar la base de datos salvo para cargar/refrescar
+        el detector cada SEARCH_INDEX_REFRESH_SECONDS
+        """
+        if not title_matcher.loaded or time.monotonic() - title_matcher.synced_at >= SEARCH_INDEX_REFRESH_SECONDS:
+            async with self.async_session() as session:
+                await self._sync_title_matcher(session)
+        return title_matcher.find(text)
+    
+    async def _cached_search(self, kind, search, query, limit):
+        """Resultados de search(query, limit) a través de search_cache"""
+        key = (kind, normalize_text(query), limit)
+        cached = search_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # La versión se toma antes de buscar: si el catálogo cambia mientras
+        # tanto, el resultado no se guarda
+        version = catalog_version.value
+        results = await search(query, limit)
+        search_cache.put(key, results, version)
+        return results
     
     async def search_videos(self, query, limit=10):
+        return await self._cached_search('movie', self._search_videos, query, limit)
+    
+    async def _search_videos(self, query, limit):
         async with self.async_session() as session:
             if not query or query.strip() == "":
                 # Sin query, retornar videos recientes
@@ -159,67 +474,10 @@ class DatabaseManager:
                 )
                 return result.scalars().all()
             
-            # Normalizar la búsqueda
-            normalized_query = self.normalize_text(query)
-            
-            # Filtrar palabras muy cortas (stopwords)
-            stopwords = {'de', 'la', 'el', 'y', 'en', 'a', 'los', 'las', 'un', 'una', 'del', 'al'}
-            search_terms = [term for term in normalized_query.split() if len(term) >= 3 and term not in stopwords]
+            if SEARCH_BACKEND == 'sql':
+                return await self._ranked_sql_search(session, Video, VIDEO_SEARCH_FIELDS, query, limit)
             
-            # Si no hay términos válidos después de filtrar, usar la query completa
-            if not search_terms:
-                search_terms = normalized_query.split()
-            
-            # Buscar solo primeros 1000 videos (aumentado para mejor cobertura)
-            result = await session.execute(
-                select(Video).order_by(Video.added_at.desc()).limit(1000)
-            )
-            all_videos = result.scalars().all()
-            
-            # Filtrar y rankear resultados
-            matching_videos = []
-            for video in all_videos:
-                # Normalizar campos
-                norm_title = self.normalize_text(video.title or "")
-                norm_desc = self.normalize_text(video.description or "")
-                norm_tags = self.normalize_text(video.tags or "")
-                norm_original = self.normalize_text(video.original_title or "")
-                
-                # Calcular score de relevancia
-                score = 0
-                matches = 0  # Contador de términos que coinciden
-                
-                # Búsqueda exacta completa en título (máxima prioridad)
-                if normalized_query in norm_title:
-                    score += 100
-                    matches = len(search_terms)
-                
-                # Búsqueda exacta en título original
-                if normalized_query in norm_original:
-                    score += 80
-                    matches = len(search_terms)
-                
-                # Términos individuales en título (solo si coinciden)
-                for term in search_terms:
-                    if len(term) >= 3:  # Solo términos de 3+ caracteres
-                        if term in norm_title:
-                            score += 10
-                            matches += 1
-                        if term in norm_original:
-                            score += 8
-                            matches += 1
-                
-                # Bonus si coinciden todos los términos en el título
-                if matches >= len(search_terms) and len(search_terms) > 1:
-                    score += 50
-                
-                # Solo agregar si tiene score significativo y al menos 1 coincidencia
-                if score > 0 and matches > 0:
-                    matching_videos.append((score, video))
-            
-            # Ordenar por score y retornar top resultados
-            matching_videos.sort(reverse=True, key=lambda x: x[0])
-            return [video for score, video in matching_videos[:limit]]
+            return await self._ranked_index_search(session, video_index, Video, "videos", query, limit)
     
     async def get_video_by_id(self, video_id):
         async with self.async_session() as session:
@@ -236,6 +494,87 @@ class DatabaseManager:
             )
             return result.scalars().all()
     
+    async def get_catalog_rows(self):
+        """
+        Películas y series del catálogo como listas de dicts, solo con las
+        columnas que muestra la Mini App (para el snapshot de /api/catalog, /api/movies y /api/series)
+        """
+        movie_columns = [getattr(Video, field) for field in CATALOG_FIELDS['movie']]
+        series_columns = [getattr(TvShow, field) for field in CATALOG_FIELDS['series']]
+        async with self.async_session() as session:
+            movies = await session.execute(select(*movie_columns).order_by(Video.id.desc()))
+            series = await session.execute(select(*series_columns).order_by(TvShow.id.desc()))
+            return (
+                [dict(row) for row in movies.mappings()],
+                [dict(row) for row in series.mappings()]
+            )
+    
+    async def get_catalog_page(self, content_type='movie', fields=None, cursor=None, limit=40,
+                               genre=None, year=None, query=None, item_id=None):
+        """
+        Página del catálogo con cursor (keyset) sobre id, del más nuevo al más viejo.
+        
+        Args:
+            content_type: 'movie' o 'series'
+            fields: columnas a devolver (subconjunto de CATALOG_FIELDS); por defecto las de la grilla
+            cursor: id del último elemento de la página anterior (None = primera página)
+            limit: elementos por página
+            genre, year, query: filtros (género contenido en genres, año exacto, texto en el título)
+            item_id: devolver solo ese elemento
+        
+        Returns:
+            dict con items, next_cursor (None si no hay más) y total (solo en la primera página)
+        """
+        if content_type == 'series':
+            model, title_fields = TvShow, ('name', 'original_name')
+        else:
+            content_type = 'movie'
+            model, title_fields = Video, ('title', 'original_title')
+        
+        allowed = CATALOG_FIELDS[content_type]
+        fields = [field for field in (fields or CATALOG_GRID_FIELDS[content_type]) if field in allowed]
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        
+        conditions = []
+        if item_id is not None:
+            conditions.append(model.id == item_id)
+        if genre:
+            conditions.append(func.lower(model.genres).contains(genre.strip().lower(), autoescape=True))
+        if year:
+            # videos.year es texto, tv_shows.year es entero
+            conditions.append(model.year == (str(year) if model is Video else int(year)))
+        if query and query.strip():
+            normalized_query = self.normalize_text(query.strip())
+            conditions.append(or_(*[
+                getattr(model, f"{field}_norm").contains(normalized_query, autoescape=True)
+                for field in title_fields
+            ]))
+        
+        async with self.async_session() as session:
+            stmt = select(*[getattr(model, field) for field in fields]).where(*conditions)
+            if cursor is not None:
+                stmt = stmt.where(model.id < cursor)
+            result = await session.execute(
+                stmt.order_by(model.id.desc()).limit(limit + 1)
+            )
+            items = [dict(row) for row in result.mappings()]
+            
+            total = None
+            if cursor is None:
+                total_result = await session.execute(
+                    select(func.count(model.id)).where(*conditions)
+                )
+                total = total_result.scalar() or 0
+        
+        has_more = len(items) > limit
+        items = items[:limit]
+        return {
+            'items': items,
+            'next_cursor': items[-1]['id'] if has_more else None,
+            'total': total
+        }
+    
     async def log_search(self, user_id, query, results_count, metadata=None):
         async with self.async_session() as session:
             search = Search(user_id=user_id, query=query, results_count=results_count)
@@ -358,7 +697,15 @@ class DatabaseManager:
                             value = value[:500]
                         setattr(video, key, value)
                 
+                # Recalcular columnas normalizadas solo si cambió un campo buscable
+                if any(field in kwargs for field, _, _ in VIDEO_SEARCH_FIELDS):
+                    self._fill_search_columns(video, VIDEO_SEARCH_FIELDS)
                 await session.commit()
+                if video_index.loaded:
+                    video_index.upsert(video.id, self._index_fields(video, VIDEO_SEARCH_FIELDS))
+                if title_matcher.loaded:
+                    title_matcher.upsert('movie', video.id, (video.title_norm, video.original_title_norm))
+                catalog_version.bump()
                 print(f"✅ Video {message_id} actualizado: {video.title}")
                 return True
                 
@@ -366,8 +713,12 @@ class DatabaseManager:
             print(f"❌ Error al actualizar video {message_id}: {e}")
             return False
     
+    def search_cache_stats(self):
+        """Aciertos y memoria de la caché de resultados de búsqueda (para /stats)"""
+        return search_cache.stats()
+    
     async def update_video_title(self, message_id, new_title):
-        """Actualiza solo el título de un video"""
+        """Actualiza solo el título de un video (update_video recalcula title_norm)"""
         return await self.update_video(message_id, title=new_title)
     
     async def get_config(self, key, default=None):
@@ -397,6 +748,301 @@ class DatabaseManager:
             await session.commit()
             return True
     
+    # ==================== COLA DE INDEXACIÓN ====================
+    
+    async def upsert_pending_video(self, message_id, file_id, caption=None, file_unique_id=None,
+                                   file_name=None, mime_type=None, file_size=None, duration=None,
+                                   posted_at=None, edited_at=None):
+        """
+        Guarda (o actualiza, si el post se editó) un video del canal de
+        almacenamiento en la cola de indexación. Un video ya indexado conserva
+        su estado; solo se actualizan los datos del archivo y el caption.
+        """
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(PendingVideo).where(PendingVideo.message_id == message_id)
+            )
+            pending = result.scalar_one_or_none()
+            if pending is None:
+                pending = PendingVideo(message_id=message_id, status='pending', posted_at=posted_at)
+                session.add(pending)
+            
+            pending.file_id = file_id
+            pending.file_unique_id = file_unique_id
+            pending.caption = caption
+            pending.file_name = file_name[:255] if file_name else None
+            pending.mime_type = mime_type
+            pending.file_size = file_size
+            pending.duration = duration
+            if edited_at is not None:
+                pending.edited_at = edited_at
+            
+            await session.commit()
+            return pending
+    
+    async def get_pending_video(self, message_id):
+        """Obtiene un video de la cola por su message_id en el canal"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(PendingVideo).where(PendingVideo.message_id == message_id)
+            )
+            return result.scalar_one_or_none()
+    
+    async def get_pending_videos(self, after_message_id=0, limit=50, statuses=('pending',)):
+        """Videos de la cola con message_id > after_message_id, en el orden del canal"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(PendingVideo)
+                .where(
+                    PendingVideo.message_id > after_message_id,
+                    PendingVideo.status.in_(statuses)
+                )
+                .order_by(PendingVideo.message_id)
+                .limit(limit)
+            )
+            return result.scalars().all()
+    
+    async def count_pending_videos(self, after_message_id=0):
+        """Cantidad de videos pendientes de indexar"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(func.count(PendingVideo.id)).where(
+                    PendingVideo.message_id > after_message_id,
+                    PendingVideo.status == 'pending'
+                )
+            )
+            return result.scalar() or 0
+    
+    async def get_known_storage_message_ids(self, first_id, last_id):
+        """
+        message_ids del canal de almacenamiento entre first_id y last_id que ya
+        están en la cola, en videos o en episodios (el backfill no los vuelve a leer)
+        """
+        known = set()
+        async with self.async_session() as session:
+            for column in (PendingVideo.message_id, Video.message_id, Episode.message_id):
+                result = await session.execute(
+                    select(column).where(column >= first_id, column <= last_id)
+                )
+                known.update(row[0] for row in result.all())
+        return known
+    
+    @staticmethod
+    def _pending_status_stmt(message_ids, status):
+        return (
+            update(PendingVideo)
+            .where(PendingVideo.message_id.in_(message_ids))
+            .values(status=status)
+        )
+    
+    async def set_pending_video_status(self, message_ids, status):
+        """Marca videos de la cola como 'pending', 'indexed' o 'skipped'"""
+        if not message_ids:
+            return
+        async with self.async_session() as session:
+            await session.execute(self._pending_status_stmt(message_ids, status))
+            await session.commit()
+    
+    # ==================== CACHÉ DE TMDB ====================
+    
+    async def get_tmdb_cache(self, cache_key):
+        """Obtiene una respuesta cacheada de TMDB vigente: (status_code, payload, expires_at) o None"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(TmdbCache.status_code, TmdbCache.payload, TmdbCache.expires_at)
+                .where(TmdbCache.cache_key == cache_key)
+            )
+            row = result.first()
+            if not row or row.expires_at <= datetime.utcnow():
+                return None
+            return row.status_code, row.payload, row.expires_at
+    
+    async def set_tmdb_cache(self, cache_key, endpoint, status_code, payload, expires_at):
+        """Guarda o reemplaza una respuesta de TMDB en el caché"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(TmdbCache).where(TmdbCache.cache_key == cache_key)
+            )
+            entry = result.scalar_one_or_none()
+            
+            if entry:
+                entry.status_code = status_code
+                entry.payload = payload
+                entry.expires_at = expires_at
+            else:
+                session.add(TmdbCache(
+                    cache_key=cache_key,
+                    endpoint=endpoint[:200],
+                    status_code=status_code,
+                    payload=payload,
+                    expires_at=expires_at
+                ))
+            
+            await session.commit()
+    
+    async def purge_expired_tmdb_cache(self):
+        """Borra las entradas vencidas del caché de TMDB. Retorna cuántas se borraron"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                delete(TmdbCache).where(TmdbCache.expires_at <= datetime.utcnow())
+            )
+            await session.commit()
+            return result.rowcount
+    
+    # ==================== MÉTODOS PARA BROADCAST ====================
+    
+    async def create_broadcast(self, admin_id, message_type, text=None, media_type=None,
+                               media_file_id=None, reply_markup=None, total=0):
+        """Registra un broadcast antes de empezar a enviarlo. Retorna su id"""
+        async with self.async_session() as session:
+            broadcast = Broadcast(
+                admin_id=admin_id,
+                message_type=message_type,
+                text=text,
+                media_type=media_type,
+                media_file_id=media_file_id,
+                reply_markup=reply_markup,
+                total=total
+            )
+            session.add(broadcast)
+            await session.commit()
+            return broadcast.id
+    
+    async def finish_broadcast(self, broadcast_id, status, sent=None, failed=None):
+        """Actualiza el estado (y opcionalmente los totales) de un broadcast"""
+        values = {'status': status, 'finished_at': datetime.utcnow()}
+        if sent is not None:
+            values['sent'] = sent
+        if failed is not None:
+            values['failed'] = failed
+        async with self.async_session() as session:
+            await session.execute(
+                update(Broadcast).where(Broadcast.id == broadcast_id).values(**values)
+            )
+            await session.commit()
+    
+    async def update_broadcast_text(self, broadcast_id, text):
+        """Guarda el texto nuevo de un broadcast editado (lo usan las siguientes ediciones)"""
+        async with self.async_session() as session:
+            await session.execute(
+                update(Broadcast).where(Broadcast.id == broadcast_id).values(text=text)
+            )
+            await session.commit()
+    
+    async def get_broadcast(self, broadcast_id):
+        async with self.async_session() as session:
+            result = await session.execute(select(Broadcast).where(Broadcast.id == broadcast_id))
+            return result.scalar_one_or_none()
+    
+    async def get_unfinished_broadcasts(self):
+        """Broadcasts que quedaron enviándose (por ejemplo al reiniciar el bot)"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Broadcast).where(Broadcast.status == 'sending').order_by(Broadcast.id)
+            )
+            return result.scalars().all()
+    
+    async def checkpoint_broadcast(self, broadcast_id, last_user_id, sent, failed):
+        """Guarda hasta qué users.id se procesó el broadcast y los totales parciales"""
+        async with self.async_session() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(last_user_id=last_user_id, sent=sent, failed=failed)
+            )
+            await session.commit()
+    
+    async def get_ledger_chat_ids(self, broadcast_id, chat_ids):
+        """De `chat_ids`, los que ya figuran en el ledger de este broadcast (con cualquier estado)"""
+        if not chat_ids:
+            return set()
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(BroadcastDelivery.chat_id).where(
+                    BroadcastDelivery.broadcast_id == broadcast_id,
+                    BroadcastDelivery.chat_id.in_(chat_ids)
+                )
+            )
+            return set(result.scalars().all())
+    
+    async def get_last_broadcast(self):
+        """Último broadcast terminado que todavía no se eliminó"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Broadcast)
+                .where(Broadcast.status == 'completed')
+                .order_by(Broadcast.id.desc())
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+    
+    async def add_broadcast_deliveries(self, rows):
+        """
+        Inserta un lote de entregas en el ledger con un solo INSERT.
+        
+        Args:
+            rows: lista de dicts con broadcast_id, chat_id, message_id y status
+        """
+        if not rows:
+            return
+        async with self.async_session() as session:
+            await session.execute(insert(BroadcastDelivery), rows)
+            await session.commit()
+    
+    async def set_broadcast_delivery_status(self, broadcast_id, chat_ids, status):
+        """Cambia el estado de un lote de entregas de un broadcast"""
+        if not chat_ids:
+            return
+        async with self.async_session() as session:
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(
+                    BroadcastDelivery.broadcast_id == broadcast_id,
+                    BroadcastDelivery.chat_id.in_(chat_ids)
+                )
+                .values(status=status)
+            )
+            await session.commit()
+    
+    async def count_broadcast_deliveries(self, broadcast_id, statuses=('sent', 'edited')):
+        """Cantidad de entregas de un broadcast en los estados dados"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(func.count(BroadcastDelivery.id)).where(
+                    BroadcastDelivery.broadcast_id == broadcast_id,
+                    BroadcastDelivery.status.in_(statuses)
+                )
+            )
+            return result.scalar() or 0
+    
+    async def iter_broadcast_deliveries(self, broadcast_id, statuses=('sent', 'edited'), batch_size=500):
+        """
+        Recorre las entregas de un broadcast en lotes de (chat_id, message_id),
+        con cursor sobre chat_id (usa el índice único broadcast_id + chat_id)
+        
+        Yields:
+            (último chat_id del lote, lista de (chat_id, message_id))
+        """
+        last_chat_id = None
+        while True:
+            async with self.async_session() as session:
+                stmt = (
+                    select(BroadcastDelivery.chat_id, BroadcastDelivery.message_id)
+                    .where(
+                        BroadcastDelivery.broadcast_id == broadcast_id,
+                        BroadcastDelivery.status.in_(statuses)
+                    )
+                    .order_by(BroadcastDelivery.chat_id)
+                    .limit(batch_size)
+                )
+                if last_chat_id is not None:
+                    stmt = stmt.where(BroadcastDelivery.chat_id > last_chat_id)
+                rows = (await session.execute(stmt)).all()
+            if not rows:
+                return
+            last_chat_id = rows[-1].chat_id
+            yield last_chat_id, [(row.chat_id, row.message_id) for row in rows]
+    
     # ==================== MÉTODOS PARA SERIES ====================
     
     async def add_tv_show(self, name, tmdb_id=None, original_name=None, year=None, 
@@ -418,9 +1064,17 @@ class DatabaseManager:
                     number_of_seasons=number_of_seasons,
                     status=status
                 )
+                self._fill_search_columns(show, TV_SHOW_SEARCH_FIELDS)
                 session.add(show)
+                await self._bump_stats(session, total_series=1)
                 await session.commit()
                 await session.refresh(show)
+                if tv_show_index.loaded:
+                    tv_show_index.upsert(show.id, self._index_fields(show, TV_SHOW_SEARCH_FIELDS))
+                if title_matcher.loaded:
+                    title_matcher.upsert('series', show.id, (show.name_norm, show.original_name_norm))
+                show_trees.invalidate(show.id)
+                catalog_version.bump()
                 return show
             except Exception as e:
                 logger.error(f"Error al agregar serie: {e}", exc_info=True)
@@ -445,6 +1099,9 @@ class DatabaseManager:
     
     async def search_tv_shows(self, query, limit=10):
         """Busca series por nombre"""
+        return await self._cached_search('series', self._search_tv_shows, query, limit)
+    
+    async def _search_tv_shows(self, query, limit):
         async with self.async_session() as session:
             if not query or query.strip() == "":
                 result = await session.execute(
@@ -452,56 +1109,10 @@ class DatabaseManager:
                 )
                 return result.scalars().all()
             
-            normalized_query = self.normalize_text(query)
-            
-            # Filtrar palabras muy cortas (stopwords)
-            stopwords = {'de', 'la', 'el', 'y', 'en', 'a', 'los', 'las', 'un', 'una', 'del', 'al'}
-            search_terms = [term for term in normalized_query.split() if len(term) >= 3 and term not in stopwords]
-            
-            if not search_terms:
-                search_terms = normalized_query.split()
+            if SEARCH_BACKEND == 'sql':
+                return await self._ranked_sql_search(session, TvShow, TV_SHOW_SEARCH_FIELDS, query, limit)
             
-            result = await session.execute(
-                select(TvShow).order_by(TvShow.added_at.desc()).limit(1000)
-            )
-            all_shows = result.scalars().all()
-            
-            matching_shows = []
-            for show in all_shows:
-                norm_name = self.normalize_text(show.name or "")
-                norm_original = self.normalize_text(show.original_name or "")
-                
-                score = 0
-                matches = 0
-                
-                # Búsqueda exacta completa
-                if normalized_query in norm_name:
-                    score += 100
-                    matches = len(search_terms)
-                if normalized_query in norm_original:
-                    score += 80
-                    matches = len(search_terms)
-                
-                # Términos individuales
-                for term in search_terms:
-                    if len(term) >= 3:
-                        if term in norm_name:
-                            score += 10
-                            matches += 1
-                        if term in norm_original:
-                            score += 8
-                            matches += 1
-                
-                # Bonus por todos los términos
-                if matches >= len(search_terms) and len(search_terms) > 1:
-                    score += 50
-                
-                # Solo agregar si tiene score y coincidencias
-                if score > 0 and matches > 0:
-                    matching_shows.append((score, show))
-            
-            matching_shows.sort(key=lambda x: x[0], reverse=True)
-            return [show for score, show in matching_shows[:limit]]
+            return await self._ranked_index_search(session, tv_show_index, TvShow, "series", query, limit)
     
     async def add_episode(self, tv_show_id, file_id, message_id, season_number, 
                          episode_number, title=None, overview=None, air_date=None, 
@@ -523,8 +1134,12 @@ class DatabaseManager:
                     channel_message_id=channel_message_id
                 )
                 session.add(episode)
+                await session.execute(self._pending_status_stmt([message_id], 'indexed'))
+                await self._bump_stats(session, total_episodes=1)
                 await session.commit()
                 await session.refresh(episode)
+                show_trees.invalidate(tv_show_id)
+                catalog_version.bump()
                 return episode
             except Exception as e:
                 print(f"❌ Error al agregar episodio: {e}")
@@ -596,41 +1211,72 @@ class DatabaseManager:
             )
             return result.all()
     
+    async def get_show_tree(self, tv_show_id):
+        """
+        Árbol de navegación de una serie (temporadas y episodios) desde el
+        caché show_trees; la primera vez se carga con dos consultas.
+        
+        Returns:
+            ShowTree o None si la serie no existe
+        """
+        tree = show_trees.get(tv_show_id)
+        if tree is not None:
+            return tree
+        
+        generation = show_trees.generation
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(TvShow.id, TvShow.name, TvShow.year).where(TvShow.id == tv_show_id)
+            )
+            show = result.first()
+            if show is None:
+                return None
+            
+            result = await session.execute(
+                select(Episode.id, Episode.season_number, Episode.episode_number, Episode.title)
+                .where(Episode.tv_show_id == tv_show_id)
+                .order_by(Episode.season_number, Episode.episode_number, Episode.id)
+            )
+            episodes = [EpisodeEntry(*row) for row in result.all()]
+        
+        tree = ShowTree(show.id, show.name, show.year, episodes)
+        show_trees.put(tree, generation)
+        return tree
+    
     # ==================== MÉTODOS PARA NAVEGACIÓN ====================
     
     async def set_user_state(self, user_id, menu, show_id=None):
-        """Guarda el estado de navegación del usuario"""
-        async with self.async_session() as session:
-            # Use merge to handle both insert and update
-            state = UserNavigationState(
-                user_id=user_id,
-                current_menu=menu,
-                selected_show_id=show_id,
-                last_interaction=datetime.utcnow()
-            )
-            await session.merge(state)
-            await session.commit()
-            return True
+        """Guarda el estado de navegación del usuario (en memoria; se escribe con flush_navigation_states)"""
+        navigation_states.set(user_id, UserNavigationState(
+            user_id=user_id,
+            current_menu=menu,
+            selected_show_id=show_id,
+            last_interaction=datetime.utcnow()
+        ))
+        return True
     
     async def get_user_state(self, user_id):
-        """Obtiene el estado de navegación del usuario"""
+        """Obtiene el estado de navegación del usuario (la BD solo se lee la primera vez)"""
+        found, state = navigation_states.lookup(user_id)
+        if found:
+            return state
+        
         async with self.async_session() as session:
             result = await session.execute(
                 select(UserNavigationState).where(UserNavigationState.user_id == user_id)
             )
-            return result.scalar_one_or_none()
+            state = result.scalar_one_or_none()
+        navigation_states.remember(user_id, state)
+        return state
     
     async def clear_user_state(self, user_id):
-        """Limpia el estado de navegación del usuario"""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(UserNavigationState).where(UserNavigationState.user_id == user_id)
-            )
-            state = result.scalar_one_or_none()
-            if state:
-                await session.delete(state)
-                await session.commit()
-            return True
+        """Limpia el estado de navegación del usuario (en memoria; se borra con flush_navigation_states)"""
+        navigation_states.set(user_id, None)
+        return True
+    
+    async def flush_navigation_states(self):
+        """Escribe en la BD los estados de navegación pendientes. Retorna cuántos se escribieron"""
+        return await navigation_states.flush(self)
 
     # ============ SISTEMA DE TICKETS ============
     
@@ -677,6 +1323,7 @@ class DatabaseManager:
             )
             session.add(transaction)
             
+            await self._bump_stats(session, tickets_available=amount)
             await session.commit()
             return user_ticket.tickets
     
@@ -715,6 +1362,7 @@ class DatabaseManager:
             )
             session.add(activity)
             
+            await self._bump_stats(session, tickets_available=-1, tickets_used=1)
             await session.commit()
             return True
     
@@ -748,6 +1396,7 @@ class DatabaseManager:
                 status='pending'
             )
             session.add(referral)
+            await self._bump_stats(session, total_referrals=1)
             await session.commit()
             return referral
     
@@ -775,6 +1424,7 @@ class DatabaseManager:
             
             referral.status = 'verified'
             referral.verified_at = datetime.now(timezone.utc)
+            await self._bump_stats(session, verified_referrals=1)
             await session.commit()
             return referral
     
@@ -886,56 +1536,66 @@ class DatabaseManager:
 
     # ============ ESTADÍSTICAS ADMIN ============
     
+    @staticmethod
+    async def _bump_stats(session, **deltas):
+        """
+        Suma `deltas` a los contadores de stats_rollup dentro de la transacción
+        de la escritura (se confirma o se descarta junto con ella).
+        
+        Si la fila todavía no existe no hace nada: la crea el primer
+        reconcile_global_stats con los totales reales.
+        """
+        values = {
+            name: getattr(StatsRollup, name) + delta
+            for name, delta in deltas.items() if delta
+        }
+        if values:
+            await session.execute(
+                update(StatsRollup).where(StatsRollup.id == STATS_ROLLUP_ID).values(**values)
+            )
+    
     async def get_global_stats(self):
-        """Obtiene estadísticas globales para el dashboard admin"""
+        """Obtiene estadísticas globales para el dashboard admin (una lectura de stats_rollup)"""
         async with self.async_session() as session:
-            # Total usuarios
-            total_users = await session.execute(select(func.count(User.id)))
-            
-            # Usuarios verificados
-            verified_users = await session.execute(
-                select(func.count(User.id)).where(User.verified == True)
-            )
-            
-            # Total videos indexados
-            total_videos = await session.execute(select(func.count(Video.id)))
-            
-            # Total series
-            total_series = await session.execute(select(func.count(TvShow.id)))
-            
-            # Total episodios
-            total_episodes = await session.execute(select(func.count(Episode.id)))
-            
-            # Total tickets en circulación
-            total_tickets = await session.execute(
-                select(func.sum(UserTicket.tickets))
-            )
-            
-            # Total tickets usados
-            tickets_used = await session.execute(
-                select(func.sum(UserTicket.tickets_used))
-            )
-            
-            # Total referidos
-            total_referrals = await session.execute(select(func.count(Referral.id)))
-            
-            # Referidos verificados
-            verified_referrals = await session.execute(
-                select(func.count(Referral.id))
-                .where(Referral.status.in_(['verified', 'rewarded']))
+            rollup = await session.get(StatsRollup, STATS_ROLLUP_ID)
+            if rollup is not None:
+                return {name: getattr(rollup, name) or 0 for name in GLOBAL_STATS_COUNTERS}
+        return await self.reconcile_global_stats()
+    
+    async def reconcile_global_stats(self):
+        """
+        Recalcula los contadores de stats_rollup desde las tablas.
+        
+        Corrige lo que no pasa por DatabaseManager (scripts SQL, cambios hechos
+        en Supabase) y las escrituras concurrentes con un recálculo anterior.
+        Lo ejecuta el job periódico (STATS_RECONCILE_SECONDS).
+        """
+        async with self.async_session() as session:
+            # Un solo UPDATE con subconsultas: los totales se calculan y se
+            # guardan en la misma sentencia
+            values = {
+                name: query().scalar_subquery()
+                for name, query in GLOBAL_STATS_COUNTERS.items()
+            }
+            values['reconciled_at'] = func.now()
+            result = await session.execute(
+                update(StatsRollup).where(StatsRollup.id == STATS_ROLLUP_ID).values(**values)
             )
+            if result.rowcount == 0:
+                # Primera vez: crear la fila (otro proceso pudo crearla al mismo tiempo)
+                try:
+                    await session.execute(
+                        insert(StatsRollup).values(id=STATS_ROLLUP_ID, **values)
+                    )
+                    await session.commit()
+                except IntegrityError:
+                    await session.rollback()
+                    return await self.reconcile_global_stats()
+            else:
+                await session.commit()
             
-            return {
-                'total_users': total_users.scalar() or 0,
-                'verified_users': verified_users.scalar() or 0,
-                'total_videos': total_videos.scalar() or 0,
-                'total_series': total_series.scalar() or 0,
-                'total_episodes': total_episodes.scalar() or 0,
-                'tickets_available': total_tickets.scalar() or 0,
-                'tickets_used': tickets_used.scalar() or 0,
-                'total_referrals': total_referrals.scalar() or 0,
-                'verified_referrals': verified_referrals.scalar() or 0
-            }
+            rollup = await session.get(StatsRollup, STATS_ROLLUP_ID, populate_existing=True)
+            return {name: getattr(rollup, name) or 0 for name in GLOBAL_STATS_COUNTERS}
 
     # ======================
     # MÉTODOS CHANNEL STATS
@@ -985,112 +1645,217 @@ class DatabaseManager:
                 )
                 is_new_user = user_result.scalar() is None
                 
-                # Registrar la visita
+                # Registrar la visita (hora UTC fija: la misma que usan los rollups)
+                visited_at = datetime.utcnow()
                 visit = ChannelVisit(
                     user_id=user_id,
                     channel_source_id=channel.id,
+                    visited_at=visited_at,
                     is_new_user=is_new_user
                 )
                 session.add(visit)
+                await self._bump_channel_rollups(session, channel.id, user_id, is_new_user, visited_at)
                 await session.commit()
                 return True
         except Exception as e:
             logger.error(f"Error registrando visita: {e}")
             return False
     
+    async def _bump_channel_rollups(self, session, channel_source_id, user_id, is_new_user, visited_at):
+        """Suma una visita a sus buckets de hora, día y total dentro de la transacción de la visita"""
+        buckets = visit_buckets(visited_at)
+        result = await session.execute(
+            select(ChannelVisitRollup)
+            .where(
+                ChannelVisitRollup.channel_source_id == channel_source_id,
+                or_(*[
+                    and_(ChannelVisitRollup.granularity == granularity, ChannelVisitRollup.bucket_start == bucket_start)
+                    for granularity, bucket_start in buckets
+                ])
+            )
+            .with_for_update()
+        )
+        existing = {(row.granularity, row.bucket_start): row for row in result.scalars()}
+        
+        for granularity, bucket_start in buckets:
+            row = existing.get((granularity, bucket_start))
+            if row is None:
+                totals = BucketTotals()
+                totals.add_visit(user_id, is_new_user, visited_at)
+                try:
+                    # Otro proceso pudo crear el mismo bucket al mismo tiempo
+                    async with session.begin_nested():
+                        session.add(ChannelVisitRollup(
+                            channel_source_id=channel_source_id,
+                            granularity=granularity,
+                            bucket_start=bucket_start,
+                            visits=totals.visits,
+                            new_users=totals.new_users,
+                            last_visit=totals.last_visit,
+                            users_sketch=totals.users.to_bytes()
+                        ))
+                    continue
+                except IntegrityError:
+                    result = await session.execute(
+                        select(ChannelVisitRollup)
+                        .where(
+                            ChannelVisitRollup.channel_source_id == channel_source_id,
+                            ChannelVisitRollup.granularity == granularity,
+                            ChannelVisitRollup.bucket_start == bucket_start
+                        )
+                        .with_for_update()
+                    )
+                    row = result.scalar_one()
+            
+            row.visits += 1
+            if is_new_user:
+                row.new_users += 1
+            if row.last_visit is None or visited_at > row.last_visit:
+                row.last_visit = visited_at
+            sketch = HyperLogLog.from_bytes(row.users_sketch)
+            if sketch.add(user_id):
+                row.users_sketch = sketch.to_bytes()
+    
+    async def _ensure_channel_rollups(self):
+        """Arma los rollups desde channel_visits si la tabla está vacía y ya hay visitas"""
+        async with self.async_session() as session:
+            has_rollups = (await session.execute(select(ChannelVisitRollup.visits).limit(1))).first()
+            has_visits = (await session.execute(select(ChannelVisit.id).limit(1))).first()
+        if has_visits and not has_rollups:
+            buckets = await self.rebuild_channel_visit_rollups()
+            logger.info(f"Rollups de visitas por canal reconstruidos: {buckets} buckets")
+    
+    async def rebuild_channel_visit_rollups(self, batch_size=5000):
+        """
+        Recalcula channel_visit_rollups desde channel_visits (una pasada por id).
+        
+        Los buckets por hora solo se arman para los últimos
+        CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS días.
+        
+        Returns:
+            cantidad de buckets escritos
+        """
+        hourly_since = datetime.utcnow() - timedelta(days=CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS)
+        totals = {}  # (channel_source_id, granularidad, bucket_start) -> BucketTotals
+        async with self.async_session() as session:
+            last_id = 0
+            while True:
+                result = await session.execute(
+                    select(ChannelVisit.id, ChannelVisit.channel_source_id, ChannelVisit.user_id,
+                           ChannelVisit.is_new_user, ChannelVisit.visited_at)
+                    .where(ChannelVisit.id > last_id)
+                    .order_by(ChannelVisit.id)
+                    .limit(batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                for row in rows:
+                    if row.visited_at is None:
+                        continue
+                    visited_at = row.visited_at.replace(tzinfo=None)
+                    for granularity, bucket_start in visit_buckets(visited_at):
+                        if granularity == HOUR and visited_at < hourly_since:
+                            continue
+                        key = (row.channel_source_id, granularity, bucket_start)
+                        if key not in totals:
+                            totals[key] = BucketTotals()
+                        totals[key].add_visit(row.user_id, row.is_new_user, visited_at)
+                last_id = rows[-1].id
+            
+            await session.execute(delete(ChannelVisitRollup))
+            values = [
+                {
+                    'channel_source_id': channel_source_id,
+                    'granularity': granularity,
+                    'bucket_start': bucket_start,
+                    'visits': bucket.visits,
+                    'new_users': bucket.new_users,
+                    'last_visit': bucket.last_visit,
+                    'users_sketch': bucket.users.to_bytes(),
+                }
+                for (channel_source_id, granularity, bucket_start), bucket in totals.items()
+            ]
+            for i in range(0, len(values), batch_size):
+                await session.execute(insert(ChannelVisitRollup), values[i:i + batch_size])
+            await session.commit()
+        return len(totals)
+    
+    async def purge_old_channel_hourly_rollups(self):
+        """Borra los buckets por hora más viejos que CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS"""
+        cutoff = datetime.utcnow() - timedelta(days=CHANNEL_HOURLY_ROLLUP_RETENTION_DAYS)
+        async with self.async_session() as session:
+            result = await session.execute(
+                delete(ChannelVisitRollup).where(
+                    ChannelVisitRollup.granularity == HOUR,
+                    ChannelVisitRollup.bucket_start < cutoff
+                )
+            )
+            await session.commit()
+            return result.rowcount or 0
+    
     async def get_channel_stats_by_period(self, period: str = 'today'):
-        """Obtener estadísticas de canales por período"""
+        """
+        Obtener estadísticas de canales por período.
+        
+        Lee solo los buckets de channel_visit_rollups que cubren el período
+        (ver database/channel_rollups.py); los usuarios únicos son una
+        estimación HyperLogLog.
+        """
         try:
             async with self.async_session() as session:
-                from datetime import datetime, timedelta
-                
                 now = datetime.now(timezone.utc)
+                ranges = period_ranges(period, now.replace(tzinfo=None))
+                start_date = ranges[0][1].replace(tzinfo=timezone.utc)
                 
-                if period == 'today':
-                    start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                elif period == 'week':
-                    start_date = now - timedelta(days=7)
-                elif period == 'month':
-                    start_date = now - timedelta(days=30)
-                else:  # 'total'
-                    start_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+                sources_result = await session.execute(
+                    select(ChannelSource.id, ChannelSource.channel_id,
+                           ChannelSource.channel_name, ChannelSource.added_at)
+                    .where(ChannelSource.is_active == True)
+                )
+                sources = sources_result.all()
                 
-                # Query para obtener stats por canal - versión simplificada
-                if period == 'total':
-                    # Para el total, no filtramos por fecha
-                    query = select(
-                        ChannelSource.channel_id,
-                        ChannelSource.channel_name,
-                        ChannelSource.added_at,
-                        func.count(ChannelVisit.id).label('total_visits'),
-                        func.count(func.distinct(ChannelVisit.user_id)).label('unique_users'),
-                        func.sum(func.cast(ChannelVisit.is_new_user, Integer)).label('new_users'),
-                        func.max(ChannelVisit.visited_at).label('last_visit')
-                    ).select_from(
-                        ChannelSource.__table__.join(
-                            ChannelVisit.__table__, 
-                            ChannelSource.id == ChannelVisit.channel_source_id,
-                            isouter=True
-                        )
-                    ).where(
-                        ChannelSource.is_active == True
-                    ).group_by(
-                        ChannelSource.id,
-                        ChannelSource.channel_id,
-                        ChannelSource.channel_name,
-                        ChannelSource.added_at
-                    ).order_by(
-                        func.count(func.distinct(ChannelVisit.user_id)).desc()
+                rollups_result = await session.execute(
+                    select(ChannelVisitRollup.channel_source_id, ChannelVisitRollup.visits,
+                           ChannelVisitRollup.new_users, ChannelVisitRollup.last_visit,
+                           ChannelVisitRollup.users_sketch)
+                    .join(ChannelSource, ChannelSource.id == ChannelVisitRollup.channel_source_id)
+                    .where(
+                        ChannelSource.is_active == True,
+                        or_(*[
+                            and_(
+                                ChannelVisitRollup.granularity == granularity,
+                                ChannelVisitRollup.bucket_start >= since,
+                                ChannelVisitRollup.bucket_start < until
+                            )
+                            for granularity, since, until in ranges
+                        ])
                     )
-                else:
-                    # Para períodos específicos, usar SQL directo para evitar problemas de timezone
-                    query = select(
-                        ChannelSource.channel_id,
-                        ChannelSource.channel_name,
-                        ChannelSource.added_at,
-                        func.count(ChannelVisit.id).label('total_visits'),
-                        func.count(func.distinct(ChannelVisit.user_id)).label('unique_users'),
-                        func.sum(func.cast(ChannelVisit.is_new_user, Integer)).label('new_users'),
-                        func.max(ChannelVisit.visited_at).label('last_visit')
-                    ).select_from(
-                        ChannelSource.__table__.join(
-                            ChannelVisit.__table__, 
-                            ChannelSource.id == ChannelVisit.channel_source_id,
-                            isouter=True
-                        )
-                    ).where(
-                        ChannelSource.is_active == True
-                    ).group_by(
-                        ChannelSource.id,
-                        ChannelSource.channel_id,
-                        ChannelSource.channel_name,
-                        ChannelSource.added_at
-                    ).order_by(
-                        func.count(func.distinct(ChannelVisit.user_id)).desc()
+                )
+                totals = {source.id: BucketTotals() for source in sources}
+                for row in rollups_result:
+                    totals[row.channel_source_id].add_bucket(
+                        row.visits, row.new_users, row.last_visit, row.users_sketch
                     )
                 
-                result = await session.execute(query)
-                channels = result.fetchall()
-                
-                # Calcular totales
-                total_users = sum(c.unique_users or 0 for c in channels)
-                total_visits = sum(c.total_visits or 0 for c in channels)
+                channels = [
+                    {
+                        'channel_id': source.channel_id,
+                        'channel_name': source.channel_name,
+                        'added_at': source.added_at,
+                        'unique_users': totals[source.id].unique_users(),
+                        'total_visits': totals[source.id].visits,
+                        'new_users': totals[source.id].new_users,
+                        'last_visit': totals[source.id].last_visit
+                    } for source in sources
+                ]
+                channels.sort(key=lambda c: c['unique_users'], reverse=True)
                 
                 return {
-                    'channels': [
-                        {
-                            'channel_id': c.channel_id,
-                            'channel_name': c.channel_name,
-                            'added_at': c.added_at,
-                            'unique_users': c.unique_users or 0,
-                            'total_visits': c.total_visits or 0,
-                            'new_users': c.new_users or 0,
-                            'last_visit': c.last_visit
-                        } for c in channels
-                    ],
+                    'channels': channels,
                     'period': period,
-                    'total_users': total_users,
-                    'total_visits': total_visits,
+                    'total_users': sum(c['unique_users'] for c in channels),
+                    'total_visits': sum(c['total_visits'] for c in channels),
                     'start_date': start_date,
                     'generated_at': now
                 }
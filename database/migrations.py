@@ -0,0 +1,114 @@
+"""
+Migraciones versionadas del esquema
+
+create_all crea las tablas nuevas con sus índices, pero no agrega índices a
+tablas que ya existen. Cada migración es una lista de sentencias SQL que
+funcionan igual en PostgreSQL y SQLite; init_db aplica en orden las que no
+estén en schema_migrations y registra cada una al terminar.
+
+Las sentencias usan IF NOT EXISTS: en una base nueva create_all ya creó los
+índices (mismos nombres que en models.py) y la migración solo se registra.
+Las columnas nuevas se agregan con add_columns_if_missing, porque SQLite no
+tiene ADD COLUMN IF NOT EXISTS.
+"""
+import logging
+
+from sqlalchemy import select, insert, inspect
+
+from .models import SchemaMigration
+
+logger = logging.getLogger(__name__)
+
+# Índices de las búsquedas frecuentes: (nombre, tabla, columnas). Deben
+# coincidir con los Index declarados en models.py
+HOT_LOOKUP_INDEXES = [
+    ('ix_videos_message_id', 'videos', ('message_id',)),
+    ('ix_episodes_show_season_episode', 'episodes', ('tv_show_id', 'season_number', 'episode_number')),
+    ('ix_episodes_message_id', 'episodes', ('message_id',)),
+    ('ix_ad_tokens_user_video', 'ad_tokens', ('user_id', 'video_id', 'completed', 'expires_at')),
+    ('ix_user_activity_user_created', 'user_activity', ('user_id', 'created_at')),
+    ('ix_ticket_transactions_user_created', 'ticket_transactions', ('user_id', 'created_at')),
+    ('ix_referrals_referrer_id', 'referrals', ('referrer_id',)),
+    ('ix_channel_visits_source_visited', 'channel_visits', ('channel_source_id', 'visited_at')),
+]
+
+def create_index_sql(name, table, columns):
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+def drop_index_sql(name):
+    return f"DROP INDEX IF EXISTS {name}"
+
+def add_columns_if_missing(table, columns):
+    """
+    Paso de migración que agrega las columnas que falten en una tabla existente
+
+    Args:
+        columns: lista de (nombre, tipo SQL)
+    """
+    async def step(conn):
+        existing = await conn.run_sync(
+            lambda sync_conn: {col['name'] for col in inspect(sync_conn).get_columns(table)}
+        )
+        for column_name, ddl in columns:
+            if column_name not in existing:
+                await conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column_name} {ddl}")
+                logger.info(f"Columna {table}.{column_name} agregada")
+    return step
+
+# Versión del pack de índices (la usa benchmark_indexes.py)
+HOT_LOOKUP_INDEXES_VERSION = 1
+
+# (versión, descripción, pasos) en orden de aplicación. Un paso es una
+# sentencia SQL o una corrutina que recibe la conexión.
+MIGRATIONS = [
+    # Antes del pack de índices: ix_ad_tokens_user_video cubre expires_at, que
+    # en bases viejas no existe (antes la agregaba server.py después de init_db)
+    (0, 'Columnas expires_at e ip_address de ad_tokens', [
+        add_columns_if_missing('ad_tokens', [
+            ('expires_at', 'TIMESTAMP'),
+            ('ip_address', 'VARCHAR(50)'),
+        ]),
+    ]),
+    (HOT_LOOKUP_INDEXES_VERSION, 'Índices de búsquedas frecuentes',
+     [create_index_sql(*index) for index in HOT_LOOKUP_INDEXES]),
+]
+
+async def _applied_versions(engine):
+    async with engine.begin() as conn:
+        result = await conn.execute(select(SchemaMigration.version))
+        return {row[0] for row in result}
+
+async def apply_migrations(engine):
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción.
+
+    Returns:
+        lista de versiones aplicadas
+    """
+    applied = await _applied_versions(engine)
+
+    newly_applied = []
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            async with engine.begin() as conn:
+                for statement in statements:
+                    if callable(statement):
+                        await statement(conn)
+                    else:
+                        await conn.exec_driver_sql(statement)
+                await conn.execute(
+                    insert(SchemaMigration).values(version=version, description=description)
+                )
+        except Exception as e:
+            # Si otro proceso la aplicó al mismo tiempo ya está registrada
+            if version in await _applied_versions(engine):
+                logger.info(f"Migración {version} ({description}) aplicada por otro proceso")
+                continue
+            # Las siguientes pueden depender de esta: se reintentan en el próximo arranque
+            logger.error(f"Migración {version} ({description}) falló: {e}")
+            break
+        logger.info(f"Migración {version} aplicada: {description}")
+        newly_applied.append(version)
+    return newly_applied
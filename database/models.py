@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, BigInteger, ForeignKey, Date, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, BigInteger, ForeignKey, Date, Float, LargeBinary, UniqueConstraint, Index, text, true
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -7,6 +7,14 @@ Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Solo los usuarios alcanzables, ordenados por id: lo que recorre un broadcast
+        Index(
+            'ix_users_reachable_id', 'id',
+            postgresql_where=text('is_reachable'),
+            sqlite_where=text('is_reachable')
+        ),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, unique=True, nullable=False)
@@ -15,9 +23,19 @@ class User(Base):
     verified = Column(Boolean, default=False)
     joined_at = Column(DateTime, server_default=func.now())
     last_active = Column(DateTime, onupdate=func.now())
+    # False si bloqueó el bot o borró la cuenta (Forbidden / Chat not found / my_chat_member)
+    is_reachable = Column(Boolean, nullable=False, default=True, server_default=true())
+    unreachable_reason = Column(String(30))  # 'blocked', 'deactivated', 'not_found'
+    unreachable_since = Column(DateTime)
 
 class Video(Base):
     __tablename__ = 'videos'
+    __table_args__ = (
+        # Deep links video_<id> y chequeo de duplicados al indexar
+        Index('ix_videos_message_id', 'message_id'),
+        # Refresco de los índices en memoria: filas cambiadas por otros procesos
+        Index('ix_videos_updated_at', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     file_id = Column(String(200), unique=True, nullable=False)
@@ -41,9 +59,18 @@ class Video(Base):
     runtime = Column(Integer)
     genres = Column(String(500))  # separados por coma
     channel_message_id = Column(BigInteger)  # ID del mensaje publicado en canal verificación
+    
+    # Campos normalizados para búsqueda (sin acentos, minúsculas), se llenan al escribir
+    title_norm = Column(String(500))
+    original_title_norm = Column(String(500))
+    tags_norm = Column(String(500))
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 class TvShow(Base):
     __tablename__ = 'tv_shows'
+    __table_args__ = (
+        Index('ix_tv_shows_updated_at', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     name = Column(String(500), nullable=False)
@@ -58,9 +85,19 @@ class TvShow(Base):
     number_of_seasons = Column(Integer)
     status = Column(String(50))
     added_at = Column(DateTime, server_default=func.now())
+    
+    # Campos normalizados para búsqueda (sin acentos, minúsculas), se llenan al escribir
+    name_norm = Column(String(500))
+    original_name_norm = Column(String(500))
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 class Episode(Base):
     __tablename__ = 'episodes'
+    __table_args__ = (
+        # Menús de temporadas/episodios y chequeo de duplicados
+        Index('ix_episodes_show_season_episode', 'tv_show_id', 'season_number', 'episode_number'),
+        Index('ix_episodes_message_id', 'message_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     tv_show_id = Column(Integer, ForeignKey('tv_shows.id', ondelete='CASCADE'), nullable=False)
@@ -103,6 +140,10 @@ class Favorite(Base):
 
 class AdToken(Base):
     __tablename__ = 'ad_tokens'
+    __table_args__ = (
+        # has_valid_token
+        Index('ix_ad_tokens_user_video', 'user_id', 'video_id', 'completed', 'expires_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     token = Column(String(100), unique=True, nullable=False)
@@ -123,6 +164,71 @@ class BotConfig(Base):
     value = Column(String(500), nullable=False)  # Valor como string
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+class PendingVideo(Base):
+    """Videos publicados en el canal de almacenamiento, capturados al llegar (cola de indexación)"""
+    __tablename__ = 'pending_videos'
+
+    id = Column(Integer, primary_key=True)
+    message_id = Column(BigInteger, unique=True, nullable=False)  # ID del mensaje en STORAGE_CHANNEL_ID
+    file_id = Column(String(200), nullable=False)
+    file_unique_id = Column(String(100))
+    caption = Column(Text)
+    file_name = Column(String(255))
+    mime_type = Column(String(100))
+    file_size = Column(BigInteger)
+    duration = Column(Integer)  # Segundos
+    status = Column(String(10), default='pending', nullable=False)  # pending, indexed, skipped
+    posted_at = Column(DateTime)  # Fecha del post en el canal
+    edited_at = Column(DateTime)  # Última edición (edited_channel_post)
+    created_at = Column(DateTime, server_default=func.now())
+
+class TmdbCache(Base):
+    """Respuestas de la API de TMDB cacheadas (ver utils/tmdb_cache.py)"""
+    __tablename__ = 'tmdb_cache'
+    
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), unique=True, nullable=False)  # sha256 de endpoint + params
+    endpoint = Column(String(200), nullable=False)  # Ej: '/tv/84958/season/1'
+    status_code = Column(Integer, nullable=False)  # 200 o 404 (caché negativo)
+    payload = Column(Text)  # JSON de la respuesta
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+# ============ BROADCAST ============
+
+class Broadcast(Base):
+    """Mensaje masivo enviado desde /broadcast (también es el job que se reanuda al reiniciar)"""
+    __tablename__ = 'broadcasts'
+    
+    id = Column(Integer, primary_key=True)
+    admin_id = Column(BigInteger, nullable=False)
+    message_type = Column(String(20), nullable=False)  # 'welcome', 'thanks', 'custom'
+    text = Column(Text)
+    media_type = Column(String(20))  # 'video', 'photo', 'audio', 'document' o None
+    media_file_id = Column(String(200))
+    reply_markup = Column(Text)  # JSON del teclado inline (para poder editar sin perder botones)
+    status = Column(String(20), default='sending')  # sending, completed, failed, deleted
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    last_user_id = Column(Integer, default=0)  # Checkpoint: users.id hasta el que ya se procesó todo
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime)
+
+class BroadcastDelivery(Base):
+    """Ledger de entregas: un registro por chat de cada broadcast"""
+    __tablename__ = 'broadcast_deliveries'
+    __table_args__ = (
+        # También sirve de índice para recorrer un broadcast por chat_id
+        UniqueConstraint('broadcast_id', 'chat_id', name='uq_broadcast_deliveries_chat'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    broadcast_id = Column(Integer, ForeignKey('broadcasts.id', ondelete='CASCADE'), nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    message_id = Column(BigInteger)  # None si no se pudo enviar
+    status = Column(String(10), nullable=False)  # sent, failed, blocked, edited, deleted
+
 # ============ SISTEMA DE TICKETS Y REFERIDOS ============
 
 class UserTicket(Base):
@@ -140,6 +246,9 @@ class UserTicket(Base):
 class TicketTransaction(Base):
     """Historial de transacciones de tickets"""
     __tablename__ = 'ticket_transactions'
+    __table_args__ = (
+        Index('ix_ticket_transactions_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, nullable=False)
@@ -152,6 +261,9 @@ class TicketTransaction(Base):
 class Referral(Base):
     """Sistema de referidos"""
     __tablename__ = 'referrals'
+    __table_args__ = (
+        Index('ix_referrals_referrer_id', 'referrer_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     referrer_id = Column(BigInteger, nullable=False)  # Quien invitó
@@ -164,6 +276,9 @@ class Referral(Base):
 class UserActivity(Base):
     """Registro de actividad del usuario"""
     __tablename__ = 'user_activity'
+    __table_args__ = (
+        Index('ix_user_activity_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, nullable=False)
@@ -188,6 +303,9 @@ class ChannelSource(Base):
 class ChannelVisit(Base):
     """Registro de visitas desde canales específicos"""
     __tablename__ = 'channel_visits'
+    __table_args__ = (
+        Index('ix_channel_visits_source_visited', 'channel_source_id', 'visited_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, nullable=False)
@@ -197,3 +315,43 @@ class ChannelVisit(Base):
     
     # Relación
     channel_source = relationship("ChannelSource")
+
+class ChannelVisitRollup(Base):
+    """Visitas por canal agregadas por hora, día y total (database/channel_rollups.py)"""
+    __tablename__ = 'channel_visit_rollups'
+    __table_args__ = (
+        Index('ix_channel_visit_rollups_bucket', 'granularity', 'bucket_start'),
+    )
+    
+    channel_source_id = Column(Integer, ForeignKey('channel_sources.id', ondelete='CASCADE'), primary_key=True)
+    granularity = Column(String(4), primary_key=True)  # 'hour', 'day', 'all'
+    bucket_start = Column(DateTime, primary_key=True)  # UTC
+    visits = Column(Integer, nullable=False, default=0)
+    new_users = Column(Integer, nullable=False, default=0)
+    last_visit = Column(DateTime)
+    users_sketch = Column(LargeBinary)  # HyperLogLog de user_id (utils/hyperloglog.py)
+
+class SchemaMigration(Base):
+    """Migraciones de esquema ya aplicadas (database/migrations.py)"""
+    __tablename__ = 'schema_migrations'
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String(200))
+    applied_at = Column(DateTime, server_default=func.now())
+
+class StatsRollup(Base):
+    """Contadores globales de /stats (una sola fila, id=1)"""
+    __tablename__ = 'stats_rollup'
+    
+    id = Column(Integer, primary_key=True)
+    total_users = Column(BigInteger, nullable=False, default=0)
+    verified_users = Column(BigInteger, nullable=False, default=0)
+    total_videos = Column(BigInteger, nullable=False, default=0)
+    total_series = Column(BigInteger, nullable=False, default=0)
+    total_episodes = Column(BigInteger, nullable=False, default=0)
+    tickets_available = Column(BigInteger, nullable=False, default=0)
+    tickets_used = Column(BigInteger, nullable=False, default=0)
+    total_referrals = Column(BigInteger, nullable=False, default=0)
+    verified_referrals = Column(BigInteger, nullable=False, default=0)
+    reconciled_at = Column(DateTime)  # Último recálculo completo
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,141 @@
+"""
+Caché write-behind del estado de navegación (UserNavigationState)
+
+get_user_state se sirve desde memoria; set_user_state y clear_user_state
+solo cambian la memoria y marcan al usuario como pendiente. Los pendientes
+se escriben en lote cada NAV_STATE_FLUSH_SECONDS (job del bot) y al apagar:
+un DELETE de todos los user_id del lote y un INSERT de los que tienen
+estado, en una sola transacción. Si un usuario cambia varias veces entre
+dos escrituras, solo se guarda el último estado.
+
+El estado solo lo usa el proceso del bot, así que la memoria manda: si el
+proceso se corta sin apagar bien se pierden como mucho los últimos segundos
+de navegación (el usuario vuelve al menú).
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import delete, insert
+
+from config.settings import NAV_STATE_CACHE_MAX_USERS, NAV_STATE_FLUSH_BATCH
+from .models import UserNavigationState
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ('user_id', 'current_menu', 'selected_show_id', 'last_interaction')
+
+class NavigationStateCache:
+    """Estados de navegación en memoria con escritura diferida en lotes"""
+
+    def __init__(self, max_users=NAV_STATE_CACHE_MAX_USERS, batch_size=NAV_STATE_FLUSH_BATCH):
+        self.max_users = max_users
+        self.batch_size = batch_size
+        self._states = OrderedDict()  # user_id -> UserNavigationState o None (sin estado)
+        self._dirty = {}  # user_id -> estado a escribir (None = borrar)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+    def lookup(self, user_id):
+        """(True, estado) si el usuario está en memoria, (False, None) si hay que leerlo"""
+        with self._lock:
+            if user_id not in self._states:
+                self.misses += 1
+                return False, None
+            self._states.move_to_end(user_id)
+            self.hits += 1
+            return True, self._states[user_id]
+
+    def remember(self, user_id, state):
+        """Guarda un estado leído de la BD (si no cambió en memoria mientras tanto)"""
+        with self._lock:
+            if user_id not in self._states:
+                self._states[user_id] = state
+                self._evict()
+
+    def set(self, user_id, state):
+        """Cambia el estado en memoria y lo deja pendiente de escribir (None = borrar)"""
+        with self._lock:
+            self._states[user_id] = state
+            self._states.move_to_end(user_id)
+            self._dirty[user_id] = state
+            self._evict()
+
+    def _evict(self):
+        # Solo se descartan los usuarios ya escritos: los pendientes esperan al flush
+        excess = len(self._states) - self.max_users
+        if excess <= 0:
+            return
+        for user_id in list(self._states):
+            if excess <= 0:
+                break
+            if user_id not in self._dirty:
+                del self._states[user_id]
+                excess -= 1
+
+    @property
+    def pending(self):
+        return len(self._dirty)
+
+    async def flush(self, db):
+        """
+        Escribe los estados pendientes en lotes.
+
+        Returns:
+            cantidad de usuarios escritos
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        items = list(dirty.items())
+        written = 0
+        failed = {}
+        for i in range(0, len(items), self.batch_size):
+            batch = items[i:i + self.batch_size]
+            try:
+                await self._write(db, batch)
+                written += len(batch)
+            except Exception as e:
+                logger.error(f"Error guardando {len(batch)} estados de navegación: {e}")
+                failed.update(batch)
+
+        if failed:
+            with self._lock:
+                # Lo que cambió durante el flush es más nuevo: no se pisa
+                for user_id, state in failed.items():
+                    self._dirty.setdefault(user_id, state)
+
+        self.flushed += written
+        return written
+
+    @staticmethod
+    async def _write(db, batch):
+        rows = [
+            {column: getattr(state, column) for column in _COLUMNS}
+            for _, state in batch if state is not None
+        ]
+        async with db.async_session() as session:
+            await session.execute(
+                delete(UserNavigationState).where(
+                    UserNavigationState.user_id.in_([user_id for user_id, _ in batch])
+                )
+            )
+            if rows:
+                await session.execute(insert(UserNavigationState), rows)
+            await session.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'users': len(self._states),
+            'pending': len(self._dirty),
+            'hit_ratio': (self.hits / total) if total else 0.0,
+            'flushed': self.flushed,
+        }
+
+# Caché compartida por todas las instancias de DatabaseManager del proceso
+navigation_states = NavigationStateCache()
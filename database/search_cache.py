@@ -0,0 +1,91 @@
+"""
+Caché LRU de resultados de búsqueda de películas y series
+
+La clave es (tipo, query normalizada, limit) y cada entrada guarda la versión
+del catálogo (catalog_version) con la que se calculó: add_video,
+update_video, add_tv_show y add_episode suben la versión, y el índice en
+memoria también la sube cuando trae filas nuevas de otros procesos, así que
+una entrada de una versión anterior no se devuelve. Además cada entrada
+vence a los `ttl` segundos (para SEARCH_BACKEND='sql', que no tiene ese
+refresco).
+
+Los resultados son los objetos del ORM ya desconectados de la sesión
+(expire_on_commit=False); se devuelve una copia de la lista.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from config.settings import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL
+from .catalog_snapshot import catalog_version
+
+def _estimate_size(key, results):
+    """Bytes aproximados de una entrada (lista, filas y sus atributos)"""
+    size = sys.getsizeof(key) + sys.getsizeof(key[1]) + sys.getsizeof(results)
+    for row in results:
+        size += sys.getsizeof(row)
+        for value in getattr(row, '__dict__', {}).values():
+            size += sys.getsizeof(value)
+    return size
+
+class SearchResultCache:
+    """LRU acotado de resultados de búsqueda, etiquetado con la versión del catálogo"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (tipo, query, limit) -> (versión, vence, resultados, bytes)
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Resultados vigentes para la clave, o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != catalog_version.value or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[2])
+
+    def put(self, key, results, version):
+        """Guarda resultados calculados con la versión `version` del catálogo"""
+        if self.max_entries <= 0 or version != catalog_version.value:
+            # El catálogo cambió mientras se buscaba
+            return
+        results = list(results)
+        size = _estimate_size(key, results)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (version, time.monotonic() + self.ttl, results, size)
+            self.memory_bytes += size
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= entry[3]
+
+    def stats(self):
+        """Contadores para /stats"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits / total) if total else 0.0,
+            'entries': len(self._entries),
+            'memory_bytes': self.memory_bytes,
+        }
+
+# Caché compartida por todas las instancias de DatabaseManager del proceso
+search_cache = SearchResultCache(SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL)
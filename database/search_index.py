@@ -0,0 +1,214 @@
+"""
+Índice invertido en memoria para la búsqueda de películas y series
+
+El índice se construye una sola vez por proceso a partir de las columnas
+<campo>_norm (texto sin acentos y en minúsculas guardado al escribir) y se
+mantiene actualizado de forma incremental desde add_video/update_video/add_tv_show. Los postings son trigramas de cada
+campo, así que una búsqueda solo recorre las listas de los trigramas del
+término y conserva la semántica de subcadena del scoring original
+("spider" encuentra "Spider-Man", "vengadores" encuentra "Los Vengadores").
+"""
+import threading
+import unicodedata
+
+# Palabras muy cortas/comunes que no aportan a la búsqueda
+STOPWORDS = {'de', 'la', 'el', 'y', 'en', 'a', 'los', 'las', 'un', 'una', 'del', 'al'}
+
+def normalize_text(text):
+    """Normaliza texto: quita acentos, convierte a minúsculas"""
+    if not text:
+        return ""
+    # Quitar acentos (á->a, é->e, etc.)
+    text = ''.join(
+        c for c in unicodedata.normalize('NFD', text)
+        if unicodedata.category(c) != 'Mn'
+    )
+    return text.lower()
+
+def split_search_terms(normalized_query):
+    """Separa la query normalizada en términos de búsqueda (sin stopwords)"""
+    search_terms = [term for term in normalized_query.split() if len(term) >= 3 and term not in STOPWORDS]
+
+    # Si no hay términos válidos después de filtrar, usar la query completa
+    if not search_terms:
+        search_terms = normalized_query.split()
+
+    return search_terms
+
+def _trigrams(text):
+    """Conjunto de trigramas de un texto ya normalizado"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    """
+    Índice invertido trigrama -> ids de documentos.
+
+    Cada documento guarda sus campos ya normalizados en el mismo orden que
+    `fields`. El scoring replica el de DatabaseManager.search_videos:
+    +exact_weight si la query completa aparece en el campo, +term_weight por
+    cada término de 3+ caracteres contenido en el campo y +50 si coinciden
+    todos los términos.
+    """
+
+    def __init__(self, fields):
+        """
+        Args:
+            fields: lista de tuplas (nombre_campo, exact_weight, term_weight)
+        """
+        self.fields = fields
+        self.documents = {}  # doc_id -> tupla de campos normalizados
+        self.postings = {}  # trigrama -> set(doc_id)
+        self.max_id = 0
+        self.updated_until = None  # mayor updated_at visto en la BD (lo maneja DatabaseManager)
+        self.loaded = False
+        self.synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def load(self, rows, synced_at):
+        """Reconstruye el índice completo a partir de (doc_id, campos normalizados)"""
+        documents = {}
+        postings = {}
+        max_id = 0
+        for doc_id, normalized in rows:
+            documents[doc_id] = normalized
+            for gram in self._document_trigrams(normalized):
+                postings.setdefault(gram, set()).add(doc_id)
+            max_id = max(max_id, doc_id)
+
+        with self._lock:
+            self.documents = documents
+            self.postings = postings
+            self.max_id = max_id
+            self.loaded = True
+            self.synced_at = synced_at
+
+    def upsert(self, doc_id, normalized):
+        """Agrega o reemplaza un documento; devuelve False si no cambió"""
+        with self._lock:
+            if self.documents.get(doc_id) == normalized:
+                return False
+            self._remove(doc_id)
+            self.documents[doc_id] = normalized
+            for gram in self._document_trigrams(normalized):
+                self.postings.setdefault(gram, set()).add(doc_id)
+            self.max_id = max(self.max_id, doc_id)
+            return True
+
+    def remove(self, doc_id):
+        """Elimina un documento del índice"""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        previous = self.documents.pop(doc_id, None)
+        if previous is None:
+            return
+        for gram in self._document_trigrams(previous):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.postings[gram]
+
+    @staticmethod
+    def _document_trigrams(normalized):
+        grams = set()
+        for value in normalized:
+            if value:
+                grams |= _trigrams(value)
+        return grams
+
+    def _candidates(self, text):
+        """Documentos que contienen todos los trigramas de `text` (o None si es muy corto)"""
+        grams = _trigrams(text)
+        if not grams:
+            return None
+
+        posting_lists = []
+        for gram in grams:
+            ids = self.postings.get(gram)
+            if not ids:
+                return set()
+            posting_lists.append(ids)
+
+        # Intersectar empezando por la lista más corta
+        posting_lists.sort(key=len)
+        result = set(posting_lists[0])
+        for ids in posting_lists[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def search(self, normalized_query, limit=10):
+        """
+        Retorna lista de (score, doc_id) ordenada por relevancia.
+
+        Empates se resuelven por id descendente (más recientes primero).
+        """
+        search_terms = split_search_terms(normalized_query)
+        scoring_terms = [term for term in search_terms if len(term) >= 3]
+
+        with self._lock:
+            # Un documento solo puede puntuar si contiene la query completa
+            # o alguno de los términos de 3+ caracteres
+            candidates = set()
+            full_scan = False
+            for text in scoring_terms + [normalized_query]:
+                ids = self._candidates(text)
+                if ids is None:
+                    full_scan = True
+                    continue
+                candidates |= ids
+
+            if full_scan:
+                # Query de menos de 3 caracteres: no hay trigramas, revisar todo
+                candidates = self.documents.keys()
+
+            scored = []
+            for doc_id in candidates:
+                normalized = self.documents[doc_id]
+                score = 0
+                matches = 0
+
+                for (name, exact_weight, term_weight), value in zip(self.fields, normalized):
+                    if exact_weight and normalized_query in value:
+                        score += exact_weight
+                        matches = len(search_terms)
+
+                for term in scoring_terms:
+                    for (name, exact_weight, term_weight), value in zip(self.fields, normalized):
+                        if term in value:
+                            score += term_weight
+                            matches += 1
+
+                # Bonus si coinciden todos los términos
+                if matches >= len(search_terms) and len(search_terms) > 1:
+                    score += 50
+
+                if score > 0 and matches > 0:
+                    scored.append((score, doc_id))
+
+        scored.sort(reverse=True)
+        return scored[:limit]
+
+# Campos buscables y sus pesos: (campo, exact_weight, term_weight).
+# Cada campo tiene una columna <campo>_norm con el texto ya normalizado.
+VIDEO_SEARCH_FIELDS = [
+    ('title', 100, 10),
+    ('original_title', 80, 8),
+    ('tags', 0, 5),
+]
+
+TV_SHOW_SEARCH_FIELDS = [
+    ('name', 100, 10),
+    ('original_name', 80, 8),
+]
+
+# Índice compartido por todas las instancias de DatabaseManager del proceso
+# (varios handlers crean su propia instancia)
+video_index = SearchIndex(VIDEO_SEARCH_FIELDS)
+tv_show_index = SearchIndex(TV_SHOW_SEARCH_FIELDS)
@@ -0,0 +1,273 @@
+"""
+Búsqueda rankeada directamente en la base de datos (SEARCH_BACKEND='sql')
+
+El score se calcula en SQL con la misma fórmula que SearchIndex.search, sobre
+las columnas <campo>_norm que se llenan al escribir (ver VIDEO_SEARCH_FIELDS y
+TV_SHOW_SEARCH_FIELDS). Solo viajan las `limit` filas ganadoras.
+
+Los filtros son `LIKE '%texto%'` para conservar la semántica de subcadena:
+- PostgreSQL: índices GIN con gin_trgm_ops (pg_trgm) sobre cada columna _norm,
+  que el planner usa para LIKE con comodines a ambos lados.
+- SQLite (desarrollo local): tabla virtual FTS5 con tokenizer trigram que
+  preselecciona los candidatos antes de calcular el score.
+"""
+import logging
+from sqlalchemy import select, case, or_, text, inspect, literal
+
+from .search_index import split_search_terms, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Filas por lote al rellenar las columnas _norm
+BACKFILL_BATCH_SIZE = 500
+
+# Tablas FTS5 listas en este proceso (solo SQLite)
+_fts_tables = set()
+
+def _fts_table_name(table_name):
+    return f"{table_name}_search_fts"
+
+def _norm_column(model, field):
+    return getattr(model, f"{field}_norm")
+
+def _fts_match_query(texts):
+    """Query MATCH de FTS5: cada texto como frase (subcadena con trigram) unida por OR"""
+    phrases = ['"' + value.replace('"', '""') + '"' for value in texts]
+    return " OR ".join(phrases)
+
+def build_ranked_search(model, fields, normalized_query, limit=10, dialect_name=None):
+    """
+    Construye el SELECT rankeado para `model`.
+
+    Args:
+        model: Video o TvShow
+        fields: lista de (campo, exact_weight, term_weight)
+        normalized_query: query ya normalizada con normalize_text
+        limit: máximo de filas
+        dialect_name: nombre del dialecto del engine ('postgresql', 'sqlite')
+    """
+    search_terms = split_search_terms(normalized_query)
+    scoring_terms = [term for term in search_terms if len(term) >= 3]
+
+    exact_conditions = []
+    score_parts = []
+    term_hits = []
+    all_conditions = []
+
+    for field, exact_weight, term_weight in fields:
+        column = _norm_column(model, field)
+        if exact_weight:
+            condition = column.contains(normalized_query, autoescape=True)
+            exact_conditions.append(condition)
+            score_parts.append(case((condition, exact_weight), else_=0))
+            all_conditions.append(condition)
+
+    for term in scoring_terms:
+        for field, exact_weight, term_weight in fields:
+            condition = _norm_column(model, field).contains(term, autoescape=True)
+            score_parts.append(case((condition, term_weight), else_=0))
+            term_hits.append(case((condition, 1), else_=0))
+            all_conditions.append(condition)
+
+    if not all_conditions:
+        return None
+
+    score = sum(score_parts[1:], score_parts[0])
+
+    # Bonus si coinciden todos los términos (la coincidencia exacta cuenta como todos)
+    if len(search_terms) > 1:
+        matches = case((or_(*exact_conditions), len(search_terms)), else_=0) if exact_conditions else literal(0)
+        for hit in term_hits:
+            matches = matches + hit
+        score = score + case((matches >= len(search_terms), 50), else_=0)
+
+    score = score.label('search_score')
+    stmt = (
+        select(model, score)
+        .where(or_(*all_conditions))
+        .order_by(score.desc(), model.id.desc())
+        .limit(limit)
+    )
+
+    # En SQLite, preseleccionar candidatos con FTS5
+    # (con una query de menos de 3 caracteres no hay trigramas: recorrido completo)
+    fts_table = _fts_table_name(model.__tablename__)
+    if dialect_name == 'sqlite' and fts_table in _fts_tables and len(normalized_query) >= 3:
+        texts = scoring_terms + [normalized_query]
+        stmt = stmt.where(
+            text(
+                f"{model.__tablename__}.id IN "
+                f"(SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH :fts_query)"
+            ).bindparams(fts_query=_fts_match_query(texts))
+        )
+
+    return stmt
+
+async def ensure_search_schema(engine, tables, use_sql_backend):
+    """
+    Crea lo necesario para la búsqueda en una base existente.
+
+    Agrega las columnas _norm y updated_at que falten (create_all no altera
+    tablas; updated_at lo usa el refresco de los índices en memoria), rellena
+    las que quedaron en NULL (filas anteriores a las columnas) y, con
+    SEARCH_BACKEND='sql', los índices trigram (PostgreSQL) o las tablas FTS5
+    con sus triggers (SQLite).
+
+    Args:
+        engine: AsyncEngine
+        tables: lista de (model, fields)
+        use_sql_backend: si se usa SEARCH_BACKEND='sql'
+    """
+    async with engine.begin() as conn:
+        for model, fields in tables:
+            table_name = model.__tablename__
+            existing = await conn.run_sync(
+                lambda sync_conn: {col['name'] for col in inspect(sync_conn).get_columns(table_name)}
+            )
+            for field, _, _ in fields:
+                column_name = f"{field}_norm"
+                if column_name not in existing:
+                    await conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} VARCHAR(500)"))
+                    logger.info(f"Columna {table_name}.{column_name} agregada")
+            if 'updated_at' not in existing:
+                await conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN updated_at TIMESTAMP"))
+                logger.info(f"Columna {table_name}.updated_at agregada")
+            await conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table_name}_updated_at ON {table_name} (updated_at)"
+            ))
+
+    # Todas las búsquedas leen solo las columnas _norm: sin rellenar no encuentran nada
+    for model, fields in tables:
+        updated = await backfill_search_columns(engine, model.__tablename__, fields)
+        if updated:
+            logger.info(f"Columnas _norm de {model.__tablename__} rellenadas: {updated} filas")
+
+    if not use_sql_backend:
+        return
+
+    dialect_name = engine.dialect.name
+    if dialect_name == 'postgresql':
+        await _ensure_trigram_indexes(engine, tables)
+    elif dialect_name == 'sqlite':
+        for model, fields in tables:
+            await _ensure_fts_table(engine, model.__tablename__, [f"{field}_norm" for field, _, _ in fields])
+
+async def backfill_search_columns(engine, table_name, fields, only_missing=True, progress=None):
+    """
+    Recorre la tabla por id en lotes y guarda normalize_text de cada campo en su _norm.
+
+    Args:
+        engine: AsyncEngine
+        table_name: tabla de `fields`
+        fields: lista de (campo, exact_weight, term_weight)
+        only_missing: solo las filas con algún campo cargado y su _norm en NULL;
+            con False revisa todas y actualiza las desactualizadas
+        progress: callback opcional (revisadas, actualizadas) por lote
+
+    Returns:
+        cantidad de filas actualizadas
+    """
+    source_columns = [field for field, _, _ in fields]
+    norm_columns = [f"{field}_norm" for field in source_columns]
+    where = "id > :last_id"
+    if only_missing:
+        where += " AND (" + " OR ".join(
+            f"({field}_norm IS NULL AND {field} IS NOT NULL)" for field in source_columns
+        ) + ")"
+    select_sql = text(
+        f"SELECT id, {', '.join(source_columns + norm_columns)} FROM {table_name} "
+        f"WHERE {where} ORDER BY id LIMIT :batch"
+    )
+    update_sql = text(
+        f"UPDATE {table_name} SET "
+        + ", ".join(f"{column} = :{column}" for column in norm_columns)
+        + " WHERE id = :id"
+    )
+
+    last_id = 0
+    scanned = 0
+    updated = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(select_sql, {"last_id": last_id, "batch": BACKFILL_BATCH_SIZE})
+            rows = result.mappings().all()
+            if not rows:
+                break
+
+            changes = []
+            for row in rows:
+                values = {
+                    f"{field}_norm": normalize_text(row[field]) or None
+                    for field in source_columns
+                }
+                if any(row[column] != value for column, value in values.items()):
+                    changes.append({"id": row["id"], **values})
+
+            if changes:
+                await conn.execute(update_sql, changes)
+
+        scanned += len(rows)
+        updated += len(changes)
+        last_id = rows[-1]["id"]
+        if progress:
+            progress(scanned, updated)
+    return updated
+
+async def _ensure_trigram_indexes(engine, tables):
+    """Índices GIN trigram sobre las columnas _norm (requiere la extensión pg_trgm)"""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for model, fields in tables:
+                table_name = model.__tablename__
+                for field, _, _ in fields:
+                    await conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS idx_{table_name}_{field}_norm_trgm "
+                        f"ON {table_name} USING gin ({field}_norm gin_trgm_ops)"
+                    ))
+    except Exception as e:
+        # Sin permisos para crear la extensión la búsqueda funciona igual, sin índice
+        logger.warning(f"No se pudieron crear los índices trigram (ver migration_search_backend.sql): {e}")
+
+async def _ensure_fts_table(engine, table_name, columns):
+    """Tabla FTS5 trigram de contenido externo, sincronizada con triggers"""
+    fts_table = _fts_table_name(table_name)
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": fts_table}
+            )
+            created = result.first() is None
+
+            await conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+                f"{column_list}, content='{table_name}', content_rowid='id', tokenize='trigram')"
+            ))
+            await conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table_name} BEGIN "
+                f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            ))
+            await conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table_name} BEGIN "
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+                f"VALUES ('delete', old.id, {old_values}); END"
+            ))
+            await conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table_name} BEGIN "
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+                f"VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            ))
+
+            if created:
+                # Indexar las filas que ya existían
+                await conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+        _fts_tables.add(fts_table)
+    except Exception as e:
+        # SQLite sin FTS5/trigram (< 3.34): se busca solo con LIKE
+        logger.warning(f"FTS5 no disponible para {table_name}, búsqueda sin índice: {e}")
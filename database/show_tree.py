@@ -0,0 +1,88 @@
+"""
+Árbol de navegación de series: serie -> temporadas -> episodios
+
+Los menús de temporadas y episodios (menu.py y los deep links de start.py)
+leen el árbol completo de una serie desde un LRU acotado: se carga con dos
+consultas la primera vez y después cada toque se responde desde memoria.
+add_episode y add_tv_show invalidan el árbol de su serie; además cada árbol
+vence a los SHOW_TREE_TTL segundos para ver los episodios que agreguen otros
+procesos (scripts de indexación).
+
+Los handlers guardan en `ShowTree.rendered` los teclados ya armados, así
+que se arman una sola vez por versión del árbol.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from config.settings import SHOW_TREE_CACHE_SIZE, SHOW_TREE_TTL
+
+class EpisodeEntry(NamedTuple):
+    id: int
+    season_number: int
+    episode_number: int
+    title: Optional[str]
+
+class ShowTree:
+    """Serie con sus temporadas y episodios (solo lo que muestran los menús)"""
+
+    def __init__(self, show_id, name, year, episodes):
+        """
+        Args:
+            episodes: EpisodeEntry ordenados por temporada y número de episodio
+        """
+        self.show_id = show_id
+        self.name = name
+        self.year = year
+        self.seasons = OrderedDict()  # season_number -> [EpisodeEntry]
+        for episode in episodes:
+            self.seasons.setdefault(episode.season_number, []).append(episode)
+        self.rendered = {}  # teclados/textos ya armados por los handlers
+
+    def season_counts(self):
+        """[(season_number, episode_count)] como get_seasons_for_show"""
+        return [(season, len(episodes)) for season, episodes in self.seasons.items()]
+
+class ShowTreeCache:
+    """LRU de árboles de series con TTL e invalidación por serie"""
+
+    def __init__(self, max_shows=SHOW_TREE_CACHE_SIZE, ttl=SHOW_TREE_TTL):
+        self.max_shows = max_shows
+        self.ttl = ttl
+        self._trees = OrderedDict()  # show_id -> (vence, ShowTree)
+        self._lock = threading.Lock()
+        # Sube con cada invalidación: un árbol cargado mientras tanto no se guarda
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, show_id):
+        with self._lock:
+            entry = self._trees.get(show_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._trees[show_id]
+                self.misses += 1
+                return None
+            self._trees.move_to_end(show_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, tree, generation):
+        """Guarda un árbol cargado cuando `generation` era la vigente"""
+        with self._lock:
+            if generation != self.generation or self.max_shows <= 0:
+                return
+            self._trees[tree.show_id] = (time.monotonic() + self.ttl, tree)
+            self._trees.move_to_end(tree.show_id)
+            while len(self._trees) > self.max_shows:
+                self._trees.popitem(last=False)
+
+    def invalidate(self, show_id):
+        with self._lock:
+            self.generation += 1
+            self._trees.pop(show_id, None)
+
+# Caché compartida por todas las instancias de DatabaseManager del proceso
+show_trees = ShowTreeCache()
@@ -0,0 +1,197 @@
+"""
+Detector de menciones de títulos del catálogo en mensajes de grupo
+
+Un autómata Aho-Corasick sobre los títulos normalizados (title/original_title
+de las películas y name/original_name de las series) decide en una sola
+pasada sobre el mensaje si menciona algo del catálogo. Solo los mensajes que
+mencionan un título llegan a search_videos/search_tv_shows.
+
+- Títulos y mensajes se comparan como secuencias de palabras: se normalizan
+  con normalize_text, todo lo que no es letra o número pasa a un espacio y
+  se rodean de espacios, así "spider man" no coincide dentro de "spidermania".
+- Además del título completo se agrega el título principal (antes de ":" o
+  " - "): "Dune: Parte Dos" también se detecta como "dune".
+- Los títulos nuevos no reconstruyen el autómata: quedan en un grupo
+  pendiente que se revisa con `in` hasta juntar suficientes, y recién ahí se
+  reconstruye. Los títulos eliminados solo bajan su contador de referencias.
+"""
+import re
+import threading
+
+from .search_index import normalize_text, STOPWORDS
+
+# Títulos más cortos que esto (sin espacios) no se detectan: "up", "it"
+MIN_PATTERN_LENGTH = 3
+# Se reconstruye el autómata cuando los pendientes superan esta cantidad o
+# esta fracción de los títulos ya compilados
+REBUILD_MIN_PENDING = 64
+REBUILD_PENDING_RATIO = 0.05
+
+_NON_WORD = re.compile(r'[\W_]+')
+_MAIN_TITLE_SEPARATOR = re.compile(r':| - ')
+
+def _words(normalized):
+    """' palabra palabra ' (con espacios a los lados) o '' si no queda nada"""
+    words = _NON_WORD.sub(' ', normalized).strip()
+    return f" {words} " if words else ""
+
+def title_patterns(normalized_fields):
+    """Patrones a detectar para los campos normalizados de un título"""
+    patterns = set()
+    for value in normalized_fields:
+        if not value:
+            continue
+        for variant in (value, _MAIN_TITLE_SEPARATOR.split(value, 1)[0]):
+            pattern = _words(variant)
+            words = pattern.split()
+            if len(pattern) - 2 < MIN_PATTERN_LENGTH or all(word in STOPWORDS for word in words):
+                continue
+            patterns.add(pattern)
+    return patterns
+
+class TitleMatcher:
+    """
+    Autómata Aho-Corasick de títulos del catálogo, por tipo ('movie', 'series').
+
+    Cada documento (tipo, id) aporta sus patrones; un patrón compartido por
+    varios documentos se mantiene mientras alguno lo tenga.
+    """
+
+    def __init__(self):
+        self.documents = {}  # (tipo, id) -> set de patrones
+        self.refs = {}  # patrón -> {tipo: cantidad de documentos}
+        self.max_ids = {}  # tipo -> mayor id cargado
+        self.updated_until = {}  # tipo -> mayor updated_at visto (lo maneja DatabaseManager)
+        self.loaded = False
+        self.synced_at = 0.0
+        self._pending = set()  # patrones que todavía no están en el autómata
+        self._compiled = 0
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.refs)
+
+    def load(self, rows, synced_at):
+        """Reconstruye todo a partir de (tipo, id, campos normalizados)"""
+        with self._lock:
+            self.documents = {}
+            self.refs = {}
+            self.max_ids = {}
+            for kind, doc_id, normalized in rows:
+                self._upsert(kind, doc_id, normalized)
+            self._build()
+            self.loaded = True
+            self.synced_at = synced_at
+
+    def upsert(self, kind, doc_id, normalized):
+        """Agrega o reemplaza los títulos de un documento; devuelve False si no cambiaron"""
+        with self._lock:
+            if self.documents.get((kind, doc_id)) == title_patterns(normalized):
+                return False
+            self._upsert(kind, doc_id, normalized)
+            return True
+
+    def remove(self, kind, doc_id):
+        """Quita los títulos de un documento"""
+        with self._lock:
+            self._remove(kind, doc_id)
+
+    def _upsert(self, kind, doc_id, normalized):
+        self._remove(kind, doc_id)
+        patterns = title_patterns(normalized)
+        self.documents[(kind, doc_id)] = patterns
+        for pattern in patterns:
+            kinds = self.refs.setdefault(pattern, {})
+            if not kinds:
+                self._pending.add(pattern)
+            kinds[kind] = kinds.get(kind, 0) + 1
+        self.max_ids[kind] = max(self.max_ids.get(kind, 0), doc_id)
+
+    def _remove(self, kind, doc_id):
+        for pattern in self.documents.pop((kind, doc_id), ()):
+            kinds = self.refs[pattern]
+            kinds[kind] -= 1
+            if not kinds[kind]:
+                del kinds[kind]
+            if not kinds:
+                # Sigue en el autómata hasta la próxima reconstrucción, pero
+                # sin referencias ya no cuenta como coincidencia
+                del self.refs[pattern]
+                self._pending.discard(pattern)
+
+    def _build(self):
+        """Compila el autómata con todos los patrones vigentes"""
+        goto = [{}]
+        output = [[]]
+        for pattern in self.refs:
+            node = 0
+            for char in pattern:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    output.append([])
+                node = next_node
+            output[node].append(pattern)
+
+        # Enlaces de falla en BFS; cada nodo hereda las salidas de su enlace
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                state = fail[node]
+                while char not in goto[state] and state:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                output[child].extend(output[fail[child]])
+                queue.append(child)
+
+        self._goto = goto
+        self._fail = fail
+        self._output = [tuple(patterns) for patterns in output]
+        self._compiled = len(self.refs)
+        self._pending = set()
+
+    def _needs_rebuild(self):
+        return len(self._pending) > max(REBUILD_MIN_PENDING, self._compiled * REBUILD_PENDING_RATIO)
+
+    def find(self, text):
+        """
+        Busca títulos del catálogo en un texto (sin normalizar).
+
+        Returns:
+            set con los tipos ('movie', 'series') que tienen algún título
+            mencionado en el texto; vacío si no hay menciones
+        """
+        haystack = _words(normalize_text(text))
+        if not haystack:
+            return set()
+
+        with self._lock:
+            if self._needs_rebuild():
+                self._build()
+
+            found = set()
+            goto, fail, output, refs = self._goto, self._fail, self._output, self.refs
+            state = 0
+            for char in haystack:
+                while char not in goto[state] and state:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                for pattern in output[state]:
+                    kinds = refs.get(pattern)
+                    if kinds:
+                        found.update(kinds)
+
+            for pattern in self._pending:
+                if pattern in haystack:
+                    found.update(self.refs[pattern])
+        return found
+
+# Detector compartido por todas las instancias de DatabaseManager del proceso
+title_matcher = TitleMatcher()
@@ -1,9 +1,10 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from config.settings import ADMIN_IDS, STORAGE_CHANNEL_ID, VERIFICATION_CHANNEL_ID
-from utils.tmdb_api import TMDBApi
+from config.settings import ADMIN_IDS, STORAGE_CHANNEL_ID, VERIFICATION_CHANNEL_ID, BACKFILL_SCRATCH_CHAT_ID
+from utils.tmdb_api import AsyncTMDBApi
 from utils.title_cleaner import clean_title, format_title_with_year
 from handlers.indexing_callbacks import IndexingSession, indexing_sessions, show_search_results, get_or_create_session
+from utils.channel_backfill import ChannelBackfill, CHECKPOINT_KEY as BACKFILL_CHECKPOINT_KEY
 import io
 import requests as req
 import os
@@ -30,119 +31,54 @@ async def indexar_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     last_indexed_str = await db.get_config('last_indexed_message', '812')
     start_id = int(last_indexed_str)
     
+    pending_count = await db.count_pending_videos(after_message_id=start_id - 1)
+    
     # Mensaje inicial
     initial_msg = await update.message.reply_text(
         f"🔄 <b>Iniciando Indexación Mejorada</b>\n\n"
         f"📍 Desde mensaje: {start_id}\n"
+        f"📥 Videos en cola: {pending_count}\n"
         f"🎯 Modo: Interactivo con confirmación\n\n"
-        f"⏳ Escaneando canal...",
+        f"⏳ Revisando cola de videos...",
         parse_mode='HTML'
     )
     
     session.progress_message_id = initial_msg.message_id
     
-    tmdb = TMDBApi()
-    current_id = start_id
-    consecutive_empty = 0
-    max_empty = 10  # Mensajes vacíos consecutivos antes de parar
-    max_scan = 10   # Máximo de mensajes a escanear en total
+    tmdb = AsyncTMDBApi.shared()
+    current_id = start_id - 1
     
     try:
-        for offset in range(max_scan):
-            msg_id = start_id + offset
-            
-            # Actualizar progreso cada 20 mensajes
-            if offset > 0 and offset % 20 == 0:
-                await context.bot.edit_message_text(
-                    chat_id=user.id,
-                    message_id=session.progress_message_id,
-                    text=(
-                        f"📊 <b>Progreso</b>\n\n"
-                        f"🔍 Escaneando: mensaje {msg_id}\n"
-                        f"✅ Indexados: {session.stats['indexed']}\n"
-                        f"⏭️ Saltados: {session.stats['skipped']}\n"
-                        f"❌ Errores: {session.stats['errors']}"
-                    ),
-                    parse_mode='HTML'
-                )
-            
-            # Verificar si la sesión fue detenida
-            if user.id not in indexing_sessions:
+        # Los videos llegan a la cola en cuanto se publican en el canal
+        # (handlers/channel_ingest.py): no hace falta sondear message_ids
+        while user.id in indexing_sessions:
+            pending_videos = await db.get_pending_videos(after_message_id=current_id, limit=50)
+            if not pending_videos:
                 break
             
-            try:
-                # Obtener mensaje sin forward (más eficiente)
-                # Usamos copy_message que es más ligero que forward
-                try:
-                    copied_msg = await context.bot.copy_message(
-                        chat_id=user.id,
-                        from_chat_id=STORAGE_CHANNEL_ID,
-                        message_id=msg_id
-                    )
-                except Exception as copy_error:
-                    # Mensaje no existe o no accesible - continuar al siguiente
-                    print(f"⚠️ Mensaje {msg_id} no accesible: {copy_error}")
-                    consecutive_empty += 1
+            for pending in pending_videos:
+                current_id = pending.message_id
+                
+                # Verificar si ya está indexado (por /indexar_manual o una versión anterior)
+                existing = await db.get_video_by_message_id(pending.message_id)
+                if existing:
+                    session.stats['skipped'] += 1
+                    await db.set_pending_video_status([pending.message_id], 'indexed')
                     continue
                 
-                # Mensaje existe - resetear contador de vacíos
-                consecutive_empty = 0
-                consecutive_empty = 0
-                current_id = msg_id
+                # Procesar con confirmación
+                await process_video_with_confirmation(
+                    update, context, pending.file_id, pending.caption, pending.message_id, tmdb, db, session
+                )
                 
-                # Obtener el mensaje original para ver si tiene video
-                try:
-                    # Intentar forward para obtener el objeto completo
-                    original_msg = await context.bot.forward_message(
-                        chat_id=user.id,
-                        from_chat_id=STORAGE_CHANNEL_ID,
-                        message_id=msg_id
-                    )
-                    
-                    # Borrar mensajes temporales
-                    try:
-                        await context.bot.delete_message(chat_id=user.id, message_id=copied_msg.message_id)
-                        await context.bot.delete_message(chat_id=user.id, message_id=original_msg.message_id)
-                    except:
-                        pass
-                    
-                    # Procesar solo si tiene video
-                    if original_msg.video:
-                        # Verificar si ya está indexado
-                        existing = await db.get_video_by_message_id(msg_id)
-                        if existing:
-                            session.stats['skipped'] += 1
-                            await db.set_config('last_indexed_message', str(msg_id + 1))
-                            continue
-                        
-                        # NUEVO FLUJO: Procesar con confirmación
-                        await process_video_with_confirmation(
-                            update, context, original_msg, msg_id, tmdb, db, session
-                        )
-                        
-                        # Guardar progreso
-                        await db.set_config('last_indexed_message', str(msg_id + 1))
-                        
-                        # Pausa para dar tiempo al admin de confirmar
-                        # El flujo continúa después de la confirmación
-                        return  # Detener aquí, continuar manualmente o en siguiente comando
-                        
-                except Exception as e:
-                    # Error obteniendo mensaje original
-                    try:
-                        await context.bot.delete_message(chat_id=user.id, message_id=copied_msg.message_id)
-                    except:
-                        pass
-                    continue
-            
-            except Exception as e:
-                # Error en el procesamiento del mensaje
-                logger.error(f"Error procesando mensaje {msg_id}: {e}")
-                continue
-
-            # Verificar si hemos alcanzado el límite de mensajes vacíos consecutivos
-            if consecutive_empty >= max_empty:
-                break        # Finalizar sesión
+                # Guardar progreso
+                await db.set_config('last_indexed_message', str(pending.message_id + 1))
+                
+                # Pausa para dar tiempo al admin de confirmar
+                # El flujo continúa después de la confirmación
+                return  # Detener aquí, continuar manualmente o en siguiente comando
+        
+        # Finalizar sesión
         await finalize_indexing(update, context, session, current_id, db)
         
     except Exception as e:
@@ -155,10 +91,105 @@ async def indexar_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             indexing_sessions[user.id].search_results = None
             del indexing_sessions[user.id]
 
-async def process_video_with_confirmation(update, context, msg, msg_id, tmdb, db, session):
+# Backfill en curso (solo uno a la vez: comparte el chat de trabajo y el checkpoint)
+backfill_tasks = set()
+
+async def backfill_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Recupera a la cola de indexación los videos antiguos del canal de almacenamiento
+    
+    Uso: /backfill [desde] [hasta]
+    Sin argumentos continúa desde el último checkpoint hasta el final del canal.
+    """
+    user = update.effective_user
+    
+    if user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ No tienes permisos para usar este comando.")
+        return
+    
+    if backfill_tasks:
+        await update.message.reply_text("⏳ Ya hay un backfill en curso.")
+        return
+    
+    args = context.args or []
+    if any(not arg.isdigit() for arg in args):
+        await update.message.reply_text(
+            "❌ Uso: <code>/backfill [desde] [hasta]</code>\n\n"
+            "Ejemplo: <code>/backfill 1 5000</code>",
+            parse_mode='HTML'
+        )
+        return
+    
+    db = context.bot_data['db']
+    
+    if args:
+        start_id = int(args[0])
+    else:
+        start_id = int(await db.get_config(BACKFILL_CHECKPOINT_KEY, '0')) + 1
+    end_id = int(args[1]) if len(args) > 1 else None
+    scratch_chat_id = BACKFILL_SCRATCH_CHAT_ID or user.id
+    
+    progress_msg = await update.message.reply_text(
+        f"🔄 <b>Backfill del canal</b>\n\n"
+        f"📍 Desde mensaje: {start_id}\n"
+        f"🏁 Hasta: {end_id or 'el final del canal'}\n\n"
+        f"⏳ Iniciando...",
+        parse_mode='HTML'
+    )
+    
+    task = asyncio.create_task(
+        run_backfill(context.bot, db, scratch_chat_id, start_id, end_id, user.id, progress_msg.message_id)
+    )
+    backfill_tasks.add(task)
+    task.add_done_callback(backfill_tasks.discard)
+
+def format_backfill_progress(stats, title="📊 Backfill en curso"):
+    return (
+        f"<b>{title}</b>\n\n"
+        f"📍 Revisado hasta: {stats.last_message_id}\n"
+        f"🪟 Ventanas: {stats.windows} ({stats.empty_windows} vacías)\n"
+        f"📨 Mensajes encontrados: {stats.messages}\n"
+        f"🎬 Videos a la cola: {stats.videos}\n"
+        f"⏭️ Ya conocidos: {stats.skipped_known}\n"
+        f"📡 Llamadas a la API: {stats.api_calls}"
+    )
+
+async def run_backfill(bot, db, scratch_chat_id, start_id, end_id, admin_id, progress_message_id):
+    """Ejecuta el backfill en segundo plano informando el progreso al admin"""
+    backfill = ChannelBackfill(bot, db, scratch_chat_id)
+    
+    async def on_progress(stats):
+        try:
+            await bot.edit_message_text(
+                chat_id=admin_id,
+                message_id=progress_message_id,
+                text=format_backfill_progress(stats),
+                parse_mode='HTML'
+            )
+        except Exception:
+            pass  # "message is not modified" u otro error del mensaje de progreso
+    
+    try:
+        stats = await backfill.run(start_id, end_id, on_progress=on_progress)
+    except Exception as e:
+        logger.error(f"Error durante el backfill: {e}", exc_info=True)
+        await bot.send_message(chat_id=admin_id, text=f"❌ Error durante el backfill: {e}")
+        return
+    
+    pending_count = await db.count_pending_videos()
+    await bot.send_message(
+        chat_id=admin_id,
+        text=(
+            format_backfill_progress(stats, "✅ Backfill completado") +
+            f"\n\n📥 Videos pendientes de indexar: {pending_count}\n"
+            f"Usa /indexar para procesarlos."
+        ),
+        parse_mode='HTML'
+    )
+
+async def process_video_with_confirmation(update, context, file_id, caption, msg_id, tmdb, db, session):
     """Procesa un video con flujo de confirmación interactivo"""
     user_id = update.effective_user.id
-    title = msg.caption or f"Video {msg_id}"
+    title = caption or f"Video {msg_id}"
     
     # Limpiar título
     cleaned, year = clean_title(title)
@@ -166,14 +197,14 @@ async def process_video_with_confirmation(update, context, msg, msg_id, tmdb, db
     # Guardar datos del video en sesión
     session.current_message_id = msg_id
     session.current_video_data = {
-        'file_id': msg.video.file_id,
+        'file_id': file_id,
         'original_caption': title,
         'cleaned_title': cleaned,
         'year': year
     }
     
     # Buscar en TMDB
-    results = tmdb.search_movie(cleaned, year=year, return_multiple=True, limit=5)
+    results = await tmdb.search_movie(cleaned, year=year, return_multiple=True, limit=5)
     
     # Asegurar que results sea lista
     if results is None:
@@ -303,34 +334,37 @@ async def indexar_manual_command(update: Update, context: ContextTypes.DEFAULT_T
     await update.message.reply_text(f"🔍 Obteniendo mensaje {msg_id}...")
     
     try:
-        # Obtener mensaje
-        msg = await context.bot.forward_message(
-            chat_id=user.id,
-            from_chat_id=STORAGE_CHANNEL_ID,
-            message_id=msg_id
-        )
-        
-        if not msg.video:
-            await update.message.reply_text(f"❌ El mensaje {msg_id} no contiene un video.")
+        # Primero la cola de indexación; solo los posts anteriores a la
+        # ingesta por channel_post necesitan un forward para leer el video
+        pending = await db.get_pending_video(msg_id)
+        if pending:
+            file_id, caption = pending.file_id, pending.caption
+        else:
+            msg = await context.bot.forward_message(
+                chat_id=user.id,
+                from_chat_id=STORAGE_CHANNEL_ID,
+                message_id=msg_id
+            )
+            
+            # Borrar forward temporal
             try:
                 await context.bot.delete_message(chat_id=user.id, message_id=msg.message_id)
             except:
                 pass
-            return
-        
-        # Borrar forward temporal
-        try:
-            await context.bot.delete_message(chat_id=user.id, message_id=msg.message_id)
-        except:
-            pass
+            
+            if not msg.video:
+                await update.message.reply_text(f"❌ El mensaje {msg_id} no contiene un video.")
+                return
+            
+            file_id, caption = msg.video.file_id, msg.caption
         
         # Crear o renovar sesión de indexación
         session = get_or_create_session(user.id)
         
         # Procesar con confirmación
-        tmdb = TMDBApi()
+        tmdb = AsyncTMDBApi.shared()
         await process_video_with_confirmation(
-            update, context, msg, msg_id, tmdb, db, session
+            update, context, file_id, caption, msg_id, tmdb, db, session
         )
         
     except Exception as e:
@@ -443,9 +477,9 @@ async def reindex_search_tmdb(update, context, msg_id):
     session.current_video_data = {'file_id': existing.file_id}
     
     # Buscar
-    tmdb = TMDBApi()
+    tmdb = AsyncTMDBApi.shared()
     cleaned, year = clean_title(existing.title)
-    results = tmdb.search_movie(cleaned, year=year, return_multiple=True, limit=5)
+    results = await tmdb.search_movie(cleaned, year=year, return_multiple=True, limit=5)
     
     # Asegurar que results sea lista
     if results is None:
@@ -622,13 +656,37 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     db = context.bot_data['db']
     
-    # Aquí podrías agregar consultas a la BD para estadísticas
+    stats = await db.get_global_stats()
+    tmdb_cache = AsyncTMDBApi.shared().cache.stats()
+    search_cache = db.search_cache_stats()
+    
     await update.message.reply_text(
-        "📊 *Estadísticas del Bot*\n\n"
-        "Funcionalidad en desarrollo...",
-        parse_mode='Markdown'
+        "📊 <b>Estadísticas del Bot</b>\n\n"
+        f"👥 Usuarios: {stats['total_users']} (✅ {stats['verified_users']} verificados)\n"
+        f"🎬 Películas: {stats['total_videos']}\n"
+        f"📺 Series: {stats['total_series']} ({stats['total_episodes']} episodios)\n"
+        f"🎟️ Tickets: {stats['tickets_available']} disponibles, {stats['tickets_used']} usados\n"
+        f"🤝 Referidos: {stats['total_referrals']} ({stats['verified_referrals']} verificados)\n\n"
+        "🗄️ <b>Caché TMDB</b>\n"
+        f"Aciertos: {tmdb_cache['memory_hits']} memoria, {tmdb_cache['db_hits']} BD "
+        f"({tmdb_cache['negative_hits']} negativos)\n"
+        f"Fallos: {tmdb_cache['misses']}\n"
+        f"Tasa de aciertos: {tmdb_cache['hit_ratio']:.0%}\n"
+        f"En memoria: {tmdb_cache['memory_items']} respuestas\n\n"
+        "🔎 <b>Caché de búsquedas</b>\n"
+        f"Aciertos: {search_cache['hits']} | Fallos: {search_cache['misses']}\n"
+        f"Tasa de aciertos: {search_cache['hit_ratio']:.0%}\n"
+        f"En memoria: {search_cache['entries']} búsquedas (~{search_cache['memory_bytes'] / 1024:.0f} KB)",
+        parse_mode='HTML'
     )
 
+async def reconcile_stats_job(context: ContextTypes.DEFAULT_TYPE):
+    """Job periódico: recalcula los contadores de /stats desde las tablas"""
+    try:
+        await context.bot_data['db'].reconcile_global_stats()
+    except Exception as e:
+        logger.error(f"Error recalculando estadísticas: {e}")
+
 async def reindexar_titulos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Actualiza todos los títulos de videos con los captions originales del canal"""
     try:
@@ -670,25 +728,30 @@ async def reindexar_titulos_command(update: Update, context: ContextTypes.DEFAUL
         
         for idx, video in enumerate(videos, 1):
             try:
-                # Obtener mensaje original del canal de almacenamiento
+                # Obtener caption original del canal de almacenamiento
                 try:
-                    msg_from_channel = await context.bot.forward_message(
-                        chat_id=user.id,
-                        from_chat_id=STORAGE_CHANNEL_ID,
-                        message_id=video.message_id
-                    )
-                    
-                    # Borrar mensaje reenviado
-                    try:
-                        await context.bot.delete_message(
+                    # La cola de indexación tiene el caption al día (también
+                    # las ediciones); solo los posts antiguos requieren forward
+                    pending = await db.get_pending_video(video.message_id)
+                    if pending:
+                        original_caption = pending.caption
+                    else:
+                        msg_from_channel = await context.bot.forward_message(
                             chat_id=user.id,
-                            message_id=msg_from_channel.message_id
+                            from_chat_id=STORAGE_CHANNEL_ID,
+                            message_id=video.message_id
                         )
-                    except:
-                        pass
-                    
-                    # Obtener caption original
-                    original_caption = msg_from_channel.caption
+                        
+                        # Borrar mensaje reenviado
+                        try:
+                            await context.bot.delete_message(
+                                chat_id=user.id,
+                                message_id=msg_from_channel.message_id
+                            )
+                        except:
+                            pass
+                        
+                        original_caption = msg_from_channel.caption
                     
                     if not original_caption or original_caption.strip() == "":
                         skipped += 1
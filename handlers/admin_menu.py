@@ -245,11 +245,11 @@ async def process_new_episode(update: Update, context: ContextTypes.DEFAULT_TYPE
     message_id = update.message.forward_from_message_id
     
     # Buscar info en TMDB
-    from utils.tmdb_api import TMDBApi
-    tmdb = TMDBApi()
+    from utils.tmdb_api import AsyncTMDBApi
+    tmdb = AsyncTMDBApi.shared()
     show = await db.get_tv_show_by_id(show_id)
     
-    season_details = tmdb.get_season_details(show.tmdb_id, season_number)
+    season_details = await tmdb.get_season_details(show.tmdb_id, season_number)
     episode_info = None
     if season_details and season_details.get('episodes'):
         for ep in season_details['episodes']:
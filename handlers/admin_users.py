@@ -8,6 +8,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from config.settings import ADMIN_IDS
 from database.db_manager import DatabaseManager
+from utils.dead_chats import record_if_dead
 import logging
 
 db = DatabaseManager()
@@ -138,6 +139,7 @@ async def handle_admin_user_input(update: Update, context: ContextTypes.DEFAULT_
                     )
             except Exception as e:
                 logger.error(f"Error notificando usuario: {e}")
+                await record_if_dead(db, session.target_user_id, e)
             
             await update.message.reply_text(
                 f"✅ <b>Tickets actualizados</b>\n\n"
@@ -178,6 +180,7 @@ async def handle_admin_user_input(update: Update, context: ContextTypes.DEFAULT_
             )
             
         except Exception as e:
+            await record_if_dead(db, session.target_user_id, e)
             await update.message.reply_text(
                 f"❌ Error enviando mensaje: {e}\n\n"
                 f"El usuario puede haber bloqueado el bot."
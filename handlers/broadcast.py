@@ -4,9 +4,12 @@ Sistema de broadcast para enviar mensajes a usuarios
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 from database.db_manager import DatabaseManager
-from config.settings import ADMIN_IDS, VERIFICATION_CHANNEL_ID, VERIFICATION_CHANNEL_USERNAME
+from config.settings import ADMIN_IDS, VERIFICATION_CHANNEL_ID, VERIFICATION_CHANNEL_USERNAME, BROADCAST_BATCH_SIZE
+from utils.broadcast_engine import BroadcastEngine, LedgerWriter
+from utils.dead_chats import dead_chat_reason
 import logging
 import asyncio
+import json
 
 db = DatabaseManager()
 logger = logging.getLogger(__name__)
@@ -30,6 +33,20 @@ class BroadcastSession:
         self.awaiting_button_text = False
         self.awaiting_button_url = False
         self.current_button_text = None
+        self.awaiting_edit = False  # Esperando el texto nuevo para editar un broadcast
+        self.target_broadcast_id = None  # Broadcast a editar/eliminar
+
+def broadcast_menu_markup():
+    """Teclado del menú principal de /broadcast"""
+    keyboard = [
+        [InlineKeyboardButton("👋 Mensaje de Bienvenida", callback_data="broadcast_welcome")],
+        [InlineKeyboardButton("🙏 Mensaje de Agradecimiento", callback_data="broadcast_thanks")],
+        [InlineKeyboardButton("✍️ Mensaje Personalizado", callback_data="broadcast_custom")],
+        [InlineKeyboardButton("✏️ Editar Último Broadcast", callback_data="broadcast_edit")],
+        [InlineKeyboardButton("🗑️ Eliminar Mensajes", callback_data="broadcast_delete")],
+        [InlineKeyboardButton("📊 Ver Estadísticas", callback_data="broadcast_stats")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
 
 async def broadcast_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -42,14 +59,7 @@ async def broadcast_menu_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("❌ No tienes permisos para usar este comando.")
         return
     
-    keyboard = [
-        [InlineKeyboardButton("👋 Mensaje de Bienvenida", callback_data="broadcast_welcome")],
-        [InlineKeyboardButton("🙏 Mensaje de Agradecimiento", callback_data="broadcast_thanks")],
-        [InlineKeyboardButton("✍️ Mensaje Personalizado", callback_data="broadcast_custom")],
-        [InlineKeyboardButton("🗑️ Eliminar Mensajes", callback_data="broadcast_delete")],
-        [InlineKeyboardButton("📊 Ver Estadísticas", callback_data="broadcast_stats")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = broadcast_menu_markup()
     
     await update.message.reply_text(
         "📢 <b>Sistema de Broadcast</b>\n\n"
@@ -77,6 +87,10 @@ async def handle_broadcast_callback(update: Update, context: ContextTypes.DEFAUL
         await request_delete_broadcast(update, context)
     elif data == "broadcast_delete_confirm":
         await confirm_delete_broadcast(update, context)
+    elif data == "broadcast_edit":
+        await request_edit_broadcast(update, context)
+    elif data == "broadcast_edit_confirm":
+        await confirm_edit_broadcast(update, context)
     elif data == "broadcast_stats":
         await show_broadcast_stats(update, context)
     elif data == "broadcast_add_button":
@@ -89,14 +103,7 @@ async def handle_broadcast_callback(update: Update, context: ContextTypes.DEFAUL
         await cancel_broadcast(update, context)
     elif data == "broadcast_back":
         # Volver al menú principal
-        keyboard = [
-            [InlineKeyboardButton("👋 Mensaje de Bienvenida", callback_data="broadcast_welcome")],
-            [InlineKeyboardButton("🙏 Mensaje de Agradecimiento", callback_data="broadcast_thanks")],
-            [InlineKeyboardButton("✍️ Mensaje Personalizado", callback_data="broadcast_custom")],
-            [InlineKeyboardButton("🗑️ Eliminar Mensajes", callback_data="broadcast_delete")],
-            [InlineKeyboardButton("📊 Ver Estadísticas", callback_data="broadcast_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = broadcast_menu_markup()
         
         await query.edit_message_text(
             "📢 <b>Sistema de Broadcast</b>\n\n"
@@ -278,6 +285,28 @@ async def handle_custom_message_input(update: Update, context: ContextTypes.DEFA
             )
         return True
     
+    # Edición de un broadcast ya enviado: esperando el texto nuevo
+    if session.awaiting_edit:
+        new_text = update.message.text if update.message and update.message.text else None
+        if not new_text:
+            await update.message.reply_text("❌ Envía el texto nuevo o /cancelar.")
+            return True
+        
+        session.custom_message = new_text
+        session.awaiting_edit = False
+        
+        keyboard = [
+            [InlineKeyboardButton("✅ Editar en todos los chats", callback_data="broadcast_edit_confirm")],
+            [InlineKeyboardButton("❌ Cancelar", callback_data="broadcast_cancel")]
+        ]
+        await update.message.reply_text(
+            f"📝 <b>Texto nuevo:</b>\n\n{new_text}\n\n"
+            "¿Deseas reemplazar el mensaje en todos los chats donde se entregó?",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='HTML'
+        )
+        return True
+    
     # Estado 2: Esperando mensaje de texto
     if session.awaiting_custom:
         message_text = update.message.text if update.message and update.message.text else None
@@ -467,14 +496,93 @@ async def confirm_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except:
             pass
 
+def build_broadcast_message(session):
+    """Texto y botones del broadcast según el tipo de sesión"""
+    if session.message_type == 'welcome':
+        message_text = (
+            "👋 <b>¡Hola! ¿Estás aburrido?</b>\n\n"
+            "¿Qué quieres ver hoy? Tenemos varias opciones para ti:\n\n"
+            "🔍 Usa /buscar para encontrar películas o series\n"
+            "📺 Visita nuestro canal de verificación para ver el catálogo completo\n"
+            "💡 ¿No encuentras algo? ¡Solicita una nueva película o serie!\n\n"
+            "¡Disfruta! 🍿"
+        )
+        # Botones interactivos
+        keyboard = [
+            [InlineKeyboardButton("🔍 Buscar Ahora", callback_data="menu_main")],
+            [InlineKeyboardButton("📺 Ver Catálogo", url="https://t.me/CineStellar_S")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+    elif session.message_type == 'thanks':
+        message_text = (
+            "🙏 <b>¡Gracias por usar CineStelar!</b>\n\n"
+            "Esperamos que hayas disfrutado tu película o serie. "
+            "Tu apoyo nos motiva a seguir mejorando.\n\n"
+            "Si tienes alguna sugerencia o quieres solicitar contenido, "
+            "¡no dudes en contactarnos!\n\n"
+            "🌟 ¡Hasta la próxima! 🌟"
+        )
+        reply_markup = None
+    else:  # custom
+        message_text = session.custom_message
+        # Crear botones personalizados si existen
+        if session.custom_buttons:
+            keyboard = [[InlineKeyboardButton(btn['text'], url=btn['url'])] for btn in session.custom_buttons]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+        else:
+            reply_markup = None
+    return message_text, reply_markup
+
+def session_media(session):
+    """(media_type, file_id) del multimedia de la sesión, o (None, None)"""
+    if session.custom_video:
+        return 'video', session.custom_video
+    if session.custom_photo:
+        return 'photo', session.custom_photo
+    if session.custom_audio:
+        return 'audio', session.custom_audio
+    if session.custom_document:
+        return 'document', session.custom_document
+    return None, None
+
+def make_broadcast_sender(bot, media_type, media_file_id, message_text, reply_markup):
+    """Corrutina send(chat_id) para el motor: texto solo o multimedia con caption"""
+    caption = message_text or None
+
+    async def send(chat_id):
+        if media_type == 'video':
+            return await bot.send_video(chat_id=chat_id, video=media_file_id, caption=caption,
+                                        parse_mode='HTML', reply_markup=reply_markup)
+        if media_type == 'photo':
+            return await bot.send_photo(chat_id=chat_id, photo=media_file_id, caption=caption,
+                                        parse_mode='HTML', reply_markup=reply_markup)
+        if media_type == 'audio':
+            return await bot.send_audio(chat_id=chat_id, audio=media_file_id, caption=caption,
+                                        parse_mode='HTML', reply_markup=reply_markup)
+        if media_type == 'document':
+            return await bot.send_document(chat_id=chat_id, document=media_file_id, caption=caption,
+                                           parse_mode='HTML', reply_markup=reply_markup)
+        return await bot.send_message(chat_id=chat_id, text=message_text,
+                                      parse_mode='HTML', reply_markup=reply_markup)
+
+    return send
+
+def format_broadcast_progress(stats, title="📤 <b>Enviando mensajes...</b>"):
+    """Texto del mensaje de progreso"""
+    return (
+        f"{title}\n\n"
+        f"👥 Total usuarios: {stats.total}\n"
+        f"📊 Progreso: {stats.processed}/{stats.total} ({stats.percentage}%)\n"
+        f"✅ Enviados: {stats.sent}\n"
+        f"❌ Fallidos: {stats.failed} (🚫 bloqueados: {stats.blocked})\n"
+        f"⚡ {stats.rate:.1f} msg/s · ⏳ faltan ~{int(stats.eta // 60)} min"
+    )
+
 async def execute_broadcast_background(query, context, session, user_id):
-    """Ejecuta el broadcast en background sin bloquear el bot"""
+    """Registra el broadcast como job en la BD y lo ejecuta en background"""
     try:
-        # Obtener todos los usuarios primero
-        logger.info("Obteniendo lista de usuarios...")
-        users = await db.get_all_users()
-        total_users = len(users)
-        logger.info(f"Usuarios encontrados: {total_users}")
+        total_users = await db.count_users(reachable_only=True)
+        logger.info(f"Usuarios alcanzables: {total_users}")
         
         if total_users == 0:
             await context.bot.send_message(
@@ -483,106 +591,24 @@ async def execute_broadcast_background(query, context, session, user_id):
                      "El bot aún no tiene usuarios en la base de datos.",
                 parse_mode='HTML'
             )
-            del broadcast_sessions[user_id]
+            broadcast_sessions.pop(user_id, None)
             return
-            
-        # Determinar mensaje a enviar
-        logger.info(f"Determinando mensaje para tipo: {session.message_type}")
-        if session.message_type == 'welcome':
-            message_text = (
-                "👋 <b>¡Hola! ¿Estás aburrido?</b>\n\n"
-                "¿Qué quieres ver hoy? Tenemos varias opciones para ti:\n\n"
-                "🔍 Usa /buscar para encontrar películas o series\n"
-                "📺 Visita nuestro canal de verificación para ver el catálogo completo\n"
-                "💡 ¿No encuentras algo? ¡Solicita una nueva película o serie!\n\n"
-                "¡Disfruta! 🍿"
-            )
-            # Botones interactivos
-            keyboard = [
-                [InlineKeyboardButton("🔍 Buscar Ahora", callback_data="menu_main")],
-                [InlineKeyboardButton("📺 Ver Catálogo", url="https://t.me/CineStellar_S")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-        elif session.message_type == 'thanks':
-            message_text = (
-                "🙏 <b>¡Gracias por usar CineStelar!</b>\n\n"
-                "Esperamos que hayas disfrutado tu película o serie. "
-                "Tu apoyo nos motiva a seguir mejorando.\n\n"
-                "Si tienes alguna sugerencia o quieres solicitar contenido, "
-                "¡no dudes en contactarnos!\n\n"
-                "🌟 ¡Hasta la próxima! 🌟"
-            )
-            reply_markup = None
-        else:  # custom
-            message_text = session.custom_message
-            # Crear botones personalizados si existen
-            if session.custom_buttons:
-                keyboard = [[InlineKeyboardButton(btn['text'], url=btn['url'])] for btn in session.custom_buttons]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-            else:
-                reply_markup = None
-        
-        # Enviar a todos los usuarios
-        sent_count = 0
-        failed_count = 0
-        
-        # Notificar inicio del envío
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"📤 <b>Iniciando envío...</b>\n\n"
-                 f"👥 Total usuarios: {total_users}\n"
-                 f"📊 Progreso: 0/{total_users} (0%)",
-            parse_mode='HTML'
-        )
-        
-        for index, user in enumerate(users, 1):
-            try:
-                # Enviar mensaje de texto
-                await context.bot.send_message(
-                    chat_id=user.user_id,
-                    text=message_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
-                )
-                sent_count += 1
-                
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Error enviando a usuario {user.user_id}: {e}")
-            
-            # Actualizar progreso cada 25 usuarios o al final
-            if index % 25 == 0 or index == total_users:
-                try:
-                    percentage = int((index / total_users) * 100)
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=f"📤 <b>Progreso del envío...</b>\n\n"
-                             f"👥 Total usuarios: {total_users}\n"
-                             f"📊 Progreso: {index}/{total_users} ({percentage}%)\n"
-                             f"✅ Enviados: {sent_count}\n"
-                             f"❌ Fallidos: {failed_count}",
-                        parse_mode='HTML'
-                    )
-                except Exception as e:
-                    logger.error(f"Error actualizando progreso: {e}")
-            
-            # Pequeña pausa para evitar rate limit
-            await asyncio.sleep(0.05)
         
-        # Limpiar sesión
-        if user_id in broadcast_sessions:
-            del broadcast_sessions[user_id]
+        logger.info(f"Determinando mensaje para tipo: {session.message_type}")
+        message_text, reply_markup = build_broadcast_message(session)
+        media_type, media_file_id = session_media(session)
         
-        # Mostrar resultados finales
-        logger.info(f"Broadcast completado: enviados={sent_count}, fallidos={failed_count}")
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"✅ <b>Broadcast Completado</b>\n\n"
-                 f"📤 Enviados exitosamente: {sent_count}\n"
-                 f"❌ Fallidos: {failed_count}\n"
-                 f"👥 Total usuarios: {total_users}",
-            parse_mode='HTML'
+        # Desde aquí todo el estado vive en la fila de broadcasts, no en la sesión
+        broadcast_id = await db.create_broadcast(
+            admin_id=user_id,
+            message_type=session.message_type,
+            text=message_text,
+            media_type=media_type,
+            media_file_id=media_file_id,
+            reply_markup=reply_markup.to_json() if reply_markup else None,
+            total=total_users
         )
+        broadcast_sessions.pop(user_id, None)
         
     except Exception as e:
         logger.error(f"Error general en execute_broadcast_background: {e}", exc_info=True)
@@ -597,117 +623,167 @@ async def execute_broadcast_background(query, context, session, user_id):
         except:
             pass
         
-        if user_id in broadcast_sessions:
-            del broadcast_sessions[user_id]
+        broadcast_sessions.pop(user_id, None)
+        return
+    
+    await run_broadcast_job(context.bot, broadcast_id)
+
+async def mark_dead_chats(rows):
+    """Marca como no alcanzables los chats muertos de un lote, agrupados por motivo"""
+    by_reason = {}
+    for chat_id, reason in rows:
+        by_reason.setdefault(reason, []).append(chat_id)
+    for reason, chat_ids in by_reason.items():
+        await db.mark_users_unreachable(chat_ids, reason)
+
+# Broadcasts corriendo en este proceso (para no lanzar dos veces el mismo job)
+running_broadcasts = set()
+
+async def run_broadcast_job(bot, broadcast_id, resumed=False):
+    """
+    Envía (o continúa enviando) un broadcast guardado en la BD.
+    
+    Cada lote de usuarios terminado guarda un checkpoint (último users.id y
+    totales) después de escribir su parte del ledger. Al reanudar se sigue
+    desde el checkpoint y se saltan los chats que ya figuran en el ledger
+    (los del lote que quedó a medias).
+    """
+    if broadcast_id in running_broadcasts:
+        return
+    running_broadcasts.add(broadcast_id)
+    
+    admin_id = None
+    try:
+        broadcast = await db.get_broadcast(broadcast_id)
+        if not broadcast or broadcast.status != 'sending':
+            return
+        admin_id = broadcast.admin_id
+        
+        reply_markup = (
+            InlineKeyboardMarkup.de_json(json.loads(broadcast.reply_markup), bot)
+            if broadcast.reply_markup else None
+        )
+        send = make_broadcast_sender(bot, broadcast.media_type, broadcast.media_file_id,
+                                     broadcast.text, reply_markup)
+        
+        after_id = broadcast.last_user_id or 0
+        base_sent = broadcast.sent or 0
+        base_failed = broadcast.failed or 0
+        pending_users = await db.count_users(after_id=after_id, reachable_only=True)
         
-        # Determinar mensaje a enviar
-        logger.info(f"Determinando mensaje para tipo: {session.message_type}")
-        if session.message_type == 'welcome':
-            message_text = (
-                "👋 <b>¡Hola! ¿Estás aburrido?</b>\n\n"
-                "¿Qué quieres ver hoy? Tenemos varias opciones para ti:\n\n"
-                "🔍 Usa /buscar para encontrar películas o series\n"
-                "📺 Visita nuestro canal de verificación para ver el catálogo completo\n"
-                "💡 ¿No encuentras algo? ¡Solicita una nueva película o serie!\n\n"
-                "¡Disfruta! 🍿"
-            )
-            # Botones interactivos
-            keyboard = [
-                [InlineKeyboardButton("🔍 Buscar Ahora", callback_data="menu_main")],
-                [InlineKeyboardButton("📺 Ver Catálogo", url="https://t.me/CineStellar_S")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-        elif session.message_type == 'thanks':
-            message_text = (
-                "🙏 <b>¡Gracias por usar CineStelar!</b>\n\n"
-                "Esperamos que hayas disfrutado tu película o serie. "
-                "Tu apoyo nos motiva a seguir mejorando.\n\n"
-                "Si tienes alguna sugerencia o quieres solicitar contenido, "
-                "¡no dudes en contactarnos!\n\n"
-                "🌟 ¡Hasta la próxima! 🌟"
-            )
-            reply_markup = None
-        else:  # custom o custom_video
-            message_text = session.custom_message
-            # Crear botones personalizados si existen
-            if session.custom_buttons:
-                keyboard = [[InlineKeyboardButton(btn['text'], url=btn['url'])] for btn in session.custom_buttons]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+        # Solo usuarios alcanzables: los que bloquearon el bot no cuestan una llamada
+        async def batches():
+            async for last_id, chat_ids in db.iter_user_id_batches(
+                BROADCAST_BATCH_SIZE, after_id=after_id, reachable_only=True
+            ):
+                if resumed:
+                    # Ya enviados (o ya intentados con sus reintentos) antes del reinicio
+                    done = await db.get_ledger_chat_ids(broadcast_id, chat_ids)
+                    chat_ids = [chat_id for chat_id in chat_ids if chat_id not in done]
+                yield last_id, chat_ids
+        
+        # El ledger guarda el message_id de cada chat para poder editarlo o eliminarlo después
+        ledger = LedgerWriter(db.add_broadcast_deliveries)
+        dead_chats = LedgerWriter(mark_dead_chats)
+        
+        async def on_result(chat_id, message, error):
+            reason = dead_chat_reason(error) if error is not None else None
+            if error is None:
+                status = 'sent'
+            elif reason:
+                status = 'blocked'
+                dead_chats.add((chat_id, reason))
             else:
-                reply_markup = None
+                status = 'failed'
+            ledger.add({
+                'broadcast_id': broadcast_id,
+                'chat_id': chat_id,
+                'message_id': message.message_id if message else None,
+                'status': status
+            })
         
-        # Enviar a todos los usuarios
-        sent_count = 0
-        failed_count = 0
+        async def on_checkpoint(last_id, stats):
+            # Primero el ledger: si se reinicia justo después, los chats del lote ya figuran
+            await ledger.flush()
+            await db.checkpoint_broadcast(
+                broadcast_id, last_id,
+                sent=base_sent + stats.sent,
+                failed=base_failed + stats.failed
+            )
         
-        # Editar mensaje existente para mostrar progreso inicial
-        await query.edit_message_text(
-            f"📤 <b>Enviando mensajes...</b>\n\n"
-            f"👥 Total usuarios: {total_users}\n"
-            f"📊 Progreso: 0/{total_users} (0%)",
+        # Un solo mensaje de progreso que se edita cada BROADCAST_PROGRESS_SECONDS
+        title = "🔄 <b>Reanudando envío...</b>" if resumed else "📤 <b>Enviando mensajes...</b>"
+        progress_message = await bot.send_message(
+            chat_id=admin_id,
+            text=f"{title}\n\n"
+                 f"🆔 Broadcast #{broadcast_id}\n"
+                 f"👥 Usuarios pendientes: {pending_users}\n"
+                 f"📊 Progreso: 0/{pending_users} (0%)",
             parse_mode='HTML'
         )
         
-        for index, user in enumerate(users, 1):
-            try:
-                # Enviar mensaje de texto
-                await context.bot.send_message(
-                    chat_id=user.user_id,
-                    text=message_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
-                )
-                sent_count += 1
-                
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Error enviando a usuario {user.user_id}: {e}")
-            
-            # Actualizar progreso cada 10 usuarios o al final
-            if index % 10 == 0 or index == total_users:
-                try:
-                    percentage = int((index / total_users) * 100)
-                    await query.edit_message_text(
-                        f"📤 <b>Enviando mensajes...</b>\n\n"
-                        f"👥 Total usuarios: {total_users}\n"
-                        f"📊 Progreso: {index}/{total_users} ({percentage}%)\n"
-                        f"✅ Enviados: {sent_count}\n"
-                        f"❌ Fallidos: {failed_count}",
-                        parse_mode='HTML'
-                    )
-                except Exception as e:
-                    logger.error(f"Error actualizando progreso: {e}")
-            
-            # Pequeña pausa para evitar rate limit
-            await asyncio.sleep(0.05)
+        async def on_progress(stats):
+            await progress_message.edit_text(format_broadcast_progress(stats, title), parse_mode='HTML')
         
-        # Limpiar sesión
-        if user_id in broadcast_sessions:
-            del broadcast_sessions[user_id]
+        engine = BroadcastEngine()
+        try:
+            stats = await engine.run(
+                batches(),
+                send,
+                total=pending_users,
+                on_progress=on_progress,
+                on_result=on_result,
+                on_checkpoint=on_checkpoint
+            )
+        finally:
+            await ledger.close()
+            await dead_chats.close()
         
-        # Mostrar resultados finales editando el mismo mensaje
-        logger.info(f"Broadcast completado: enviados={sent_count}, fallidos={failed_count}")
-        await query.edit_message_text(
-            f"✅ <b>Broadcast Completado</b>\n\n"
-            f"📤 Enviados exitosamente: {sent_count}\n"
-            f"❌ Fallidos: {failed_count}\n"
-            f"👥 Total usuarios: {total_users}",
+        sent = base_sent + stats.sent
+        failed = base_failed + stats.failed
+        await db.finish_broadcast(broadcast_id, 'completed', sent=sent, failed=failed)
+        
+        logger.info(f"Broadcast #{broadcast_id} completado: enviados={sent}, fallidos={failed}, "
+                    f"bloqueados={stats.blocked}, {stats.elapsed:.0f}s")
+        await bot.send_message(
+            chat_id=admin_id,
+            text=f"✅ <b>Broadcast Completado</b>\n\n"
+                 f"📤 Enviados exitosamente: {sent}\n"
+                 f"❌ Fallidos: {failed}\n"
+                 f"🚫 Bloquearon el bot: {stats.blocked}\n"
+                 f"👥 Total usuarios: {sent + failed}\n"
+                 f"⏱️ Duración: {int(stats.elapsed // 60)} min {int(stats.elapsed % 60)} s",
             parse_mode='HTML'
         )
         
     except Exception as e:
-        logger.error(f"Error general en confirm_broadcast: {e}", exc_info=True)
-        try:
-            await query.edit_message_text(
-                f"❌ <b>Error ejecutando broadcast</b>\n\n"
-                f"Error: {str(e)}\n\n"
-                f"Por favor revisa los logs del servidor.",
-                parse_mode='HTML'
-            )
-        except:
-            pass
-        if user_id in broadcast_sessions:
-            del broadcast_sessions[user_id]
+        # El job queda en 'sending' y se reanuda desde el último checkpoint al reiniciar
+        logger.error(f"Error en broadcast #{broadcast_id}: {e}", exc_info=True)
+        if admin_id:
+            try:
+                await bot.send_message(
+                    chat_id=admin_id,
+                    text=f"❌ <b>Error ejecutando broadcast #{broadcast_id}</b>\n\n"
+                         f"Error: {str(e)}\n\n"
+                         f"Se reanudará desde el último checkpoint al reiniciar el bot.",
+                    parse_mode='HTML'
+                )
+            except:
+                pass
+    finally:
+        running_broadcasts.discard(broadcast_id)
+
+async def resume_broadcast_jobs(context: ContextTypes.DEFAULT_TYPE):
+    """Job de arranque: reanuda los broadcasts que quedaron a medias"""
+    try:
+        broadcasts = await db.get_unfinished_broadcasts()
+    except Exception as e:
+        logger.error(f"Error buscando broadcasts pendientes: {e}")
+        return
+    
+    for broadcast in broadcasts:
+        logger.info(f"Reanudando broadcast #{broadcast.id} desde users.id > {broadcast.last_user_id}")
+        asyncio.create_task(run_broadcast_job(context.bot, broadcast.id, resumed=True))
 
 async def cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancela el broadcast"""
@@ -719,14 +795,37 @@ async def cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.edit_message_text("❌ Broadcast cancelado.")
 
+def describe_broadcast(broadcast):
+    """Resumen corto de un broadcast para los mensajes de confirmación"""
+    preview = (broadcast.text or '').strip()
+    if len(preview) > 200:
+        preview = preview[:200] + '…'
+    media = f"📎 {broadcast.media_type}\n" if broadcast.media_type else ""
+    created = broadcast.created_at.strftime('%d/%m/%Y %H:%M') if broadcast.created_at else '-'
+    return (
+        f"🆔 Broadcast #{broadcast.id} ({created})\n"
+        f"{media}"
+        f"✅ Entregado a {broadcast.sent} usuarios\n\n"
+        f"{preview}"
+    )
+
 async def request_delete_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Solicita confirmación para eliminar mensajes de broadcast"""
+    """Solicita confirmación para eliminar el último broadcast"""
     query = update.callback_query
     user_id = update.effective_user.id
     
+    broadcast = await db.get_last_broadcast()
+    if not broadcast:
+        await query.edit_message_text(
+            "⚠️ No hay broadcasts registrados para eliminar.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Volver", callback_data="broadcast_back")]])
+        )
+        return
+    
     # Crear sesión
     session = BroadcastSession(user_id)
     session.message_type = 'delete'
+    session.target_broadcast_id = broadcast.id
     broadcast_sessions[user_id] = session
     
     keyboard = [
@@ -736,129 +835,183 @@ async def request_delete_broadcast(update: Update, context: ContextTypes.DEFAULT
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
-        "🗑️ <b>Eliminar Mensajes de Broadcast</b>\n\n"
-        "⚠️ <b>ADVERTENCIA:</b> Esta acción intentará eliminar el último mensaje enviado "
-        "a cada usuario del bot.\n\n"
-        "Esto es útil si enviaste un mensaje con errores.\n\n"
-        "<i>Nota: Solo se pueden eliminar mensajes de las últimas 48 horas.</i>\n\n"
+        "🗑️ <b>Eliminar Último Broadcast</b>\n\n"
+        f"{describe_broadcast(broadcast)}\n\n"
+        "⚠️ <b>ADVERTENCIA:</b> Se eliminará este mensaje de todos los chats donde se entregó.\n\n"
+        "<i>Nota: Telegram solo permite eliminar mensajes de las últimas 48 horas.</i>\n\n"
         "¿Deseas continuar?",
         reply_markup=reply_markup,
         parse_mode='HTML'
     )
 
+async def request_edit_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pide el texto nuevo para editar el último broadcast"""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    
+    broadcast = await db.get_last_broadcast()
+    if not broadcast:
+        await query.edit_message_text(
+            "⚠️ No hay broadcasts registrados para editar.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Volver", callback_data="broadcast_back")]])
+        )
+        return
+    
+    session = BroadcastSession(user_id)
+    session.message_type = 'edit'
+    session.target_broadcast_id = broadcast.id
+    session.awaiting_edit = True
+    broadcast_sessions[user_id] = session
+    
+    await query.edit_message_text(
+        "✏️ <b>Editar Último Broadcast</b>\n\n"
+        f"{describe_broadcast(broadcast)}\n\n"
+        "Envía el texto nuevo (admite HTML).\n"
+        + ("Como tiene multimedia, se reemplazará el caption.\n" if broadcast.media_type else "")
+        + "\nEnvía /cancelar para cancelar.",
+        parse_mode='HTML'
+    )
+
 async def confirm_delete_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Elimina el último mensaje enviado a todos los usuarios"""
+    """Elimina el último broadcast de todos los chats, usando el ledger"""
+    await start_ledger_job(update, context, 'delete')
+
+async def confirm_edit_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reemplaza el texto del último broadcast en todos los chats, usando el ledger"""
+    await start_ledger_job(update, context, 'edit')
+
+async def start_ledger_job(update: Update, context: ContextTypes.DEFAULT_TYPE, action):
+    """Lanza en background la eliminación/edición masiva"""
     query = update.callback_query
     user_id = update.effective_user.id
     
+    session = broadcast_sessions.get(user_id)
+    if not session or not session.target_broadcast_id:
+        await query.edit_message_text("❌ Sesión expirada. Usa /broadcast nuevamente.")
+        return
+    
+    asyncio.create_task(execute_ledger_job(context, session, user_id, action))
+    
+    await query.edit_message_text(
+        ("🗑️ <b>Eliminación iniciada</b>" if action == 'delete' else "✏️ <b>Edición iniciada</b>") +
+        "\n\n⏳ Se procesa en segundo plano.\n📊 Te notificaré cuando termine.",
+        parse_mode='HTML'
+    )
+
+async def execute_ledger_job(context, session, user_id, action):
+    """
+    Elimina o edita un broadcast en todos los chats del ledger.
+    
+    Recorre solo las entregas exitosas (chat_id, message_id), con el mismo
+    motor y límite de tasa que el envío, sin llamadas extra por usuario.
+    """
+    broadcast_id = session.target_broadcast_id
+    title = "🗑️ <b>Eliminando mensajes...</b>" if action == 'delete' else "✏️ <b>Editando mensajes...</b>"
+    
     try:
-        logger.info(f"Iniciando eliminación de mensajes broadcast para admin {user_id}")
-        
-        session = broadcast_sessions.get(user_id)
-        if not session:
-            await query.edit_message_text("❌ Sesión expirada. Usa /broadcast nuevamente.")
-            return
-        
-        # Obtener todos los usuarios
-        users = await db.get_all_users()
-        total_users = len(users)
-        
-        if total_users == 0:
-            await query.edit_message_text(
-                "⚠️ No hay usuarios registrados.",
+        total = await db.count_broadcast_deliveries(broadcast_id)
+        if total == 0:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="⚠️ Ese broadcast no tiene entregas registradas.",
                 parse_mode='HTML'
             )
-            del broadcast_sessions[user_id]
             return
         
-        # Actualizar mensaje
-        await query.edit_message_text(
-            f"🗑️ <b>Eliminando mensajes...</b>\n\n"
-            f"👥 Total usuarios: {total_users}\n"
-            f"📊 Progreso: 0/{total_users} (0%)",
+        bot = context.bot
+        if action == 'delete':
+            async def send(delivery):
+                chat_id, message_id = delivery
+                return await bot.delete_message(chat_id=chat_id, message_id=message_id)
+            new_status = 'deleted'
+        else:
+            broadcast = await db.get_last_broadcast()
+            if not broadcast or broadcast.id != broadcast_id:
+                raise RuntimeError("El broadcast ya no está disponible")
+            new_text = session.custom_message
+            reply_markup = (
+                InlineKeyboardMarkup.de_json(json.loads(broadcast.reply_markup), bot)
+                if broadcast.reply_markup else None
+            )
+            
+            async def send(delivery):
+                chat_id, message_id = delivery
+                if broadcast.media_type:
+                    return await bot.edit_message_caption(
+                        chat_id=chat_id, message_id=message_id, caption=new_text,
+                        parse_mode='HTML', reply_markup=reply_markup
+                    )
+                return await bot.edit_message_text(
+                    chat_id=chat_id, message_id=message_id, text=new_text,
+                    parse_mode='HTML', reply_markup=reply_markup
+                )
+            new_status = 'edited'
+        
+        # Los cambios de estado del ledger se escriben por lotes
+        ledger = LedgerWriter(lambda chat_ids: db.set_broadcast_delivery_status(broadcast_id, chat_ids, new_status))
+        
+        async def on_result(delivery, result, error):
+            if error is None:
+                ledger.add(delivery[0])
+        
+        progress_message = await context.bot.send_message(
+            chat_id=user_id,
+            text=f"{title}\n\n📊 Progreso: 0/{total} (0%)",
             parse_mode='HTML'
         )
         
-        deleted_count = 0
-        failed_count = 0
+        async def on_progress(stats):
+            await progress_message.edit_text(format_broadcast_progress(stats, title), parse_mode='HTML')
         
-        # Intentar eliminar el último mensaje del bot en cada chat
-        for index, user in enumerate(users, 1):
-            try:
-                # Obtener los últimos mensajes del chat
-                # Nota: Telegram no permite obtener historial directo, así que
-                # intentaremos eliminar usando el message_id almacenado en contexto
-                # Si no hay message_id, fallará silenciosamente
-                
-                # Intentar obtener el último message_id del contexto del usuario
-                user_data = await context.bot.get_chat(user.user_id)
-                
-                # Como no podemos obtener el message_id directamente,
-                # esta funcionalidad requeriría almacenar los message_ids
-                # de los broadcasts en la base de datos
-                logger.warning(f"No se puede eliminar mensaje para user {user.user_id} - message_id no disponible")
-                failed_count += 1
-                
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Error eliminando mensaje de usuario {user.user_id}: {e}")
-            
-            # Actualizar progreso cada 10 usuarios
-            if index % 10 == 0 or index == total_users:
-                try:
-                    percentage = int((index / total_users) * 100)
-                    await query.edit_message_text(
-                        f"🗑️ <b>Eliminando mensajes...</b>\n\n"
-                        f"👥 Total usuarios: {total_users}\n"
-                        f"📊 Progreso: {index}/{total_users} ({percentage}%)\n"
-                        f"✅ Eliminados: {deleted_count}\n"
-                        f"❌ No eliminados: {failed_count}",
-                        parse_mode='HTML'
-                    )
-                except Exception as e:
-                    logger.error(f"Error actualizando progreso: {e}")
-            
-            await asyncio.sleep(0.05)
+        engine = BroadcastEngine()
+        try:
+            stats = await engine.run(
+                db.iter_broadcast_deliveries(broadcast_id, batch_size=BROADCAST_BATCH_SIZE),
+                send,
+                total=total,
+                on_progress=on_progress,
+                on_result=on_result
+            )
+        finally:
+            await ledger.close()
         
-        # Limpiar sesión
-        if user_id in broadcast_sessions:
-            del broadcast_sessions[user_id]
+        if action == 'delete':
+            await db.finish_broadcast(broadcast_id, 'deleted')
+        elif stats.sent:
+            # Los mensajes ya muestran el texto nuevo: una edición o reanudación posterior parte de él
+            await db.update_broadcast_text(broadcast_id, new_text)
         
-        # Mostrar resultados
-        await query.edit_message_text(
-            f"🗑️ <b>Proceso Completado</b>\n\n"
-            f"⚠️ <b>Limitación Técnica:</b>\n"
-            f"Telegram no permite eliminar mensajes sin conocer sus IDs.\n\n"
-            f"💡 <b>Solución:</b>\n"
-            f"Para implementar esta función completamente, necesitamos:\n"
-            f"1. Almacenar los message_ids cuando enviamos broadcasts\n"
-            f"2. Crear una tabla en la BD para rastrear mensajes\n\n"
-            f"📊 Usuarios procesados: {total_users}\n"
-            f"❌ No se pudieron eliminar: {failed_count}\n\n"
-            f"<i>Si deseas implementar esta función, avísame.</i>",
+        done = "Eliminados" if action == 'delete' else "Editados"
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=f"✅ <b>Proceso Completado</b>\n\n"
+                 f"✔️ {done}: {stats.sent}\n"
+                 f"❌ No se pudo: {stats.failed}\n"
+                 f"👥 Total: {stats.total}",
             parse_mode='HTML'
         )
         
     except Exception as e:
-        logger.error(f"Error general en confirm_delete_broadcast: {e}", exc_info=True)
+        logger.error(f"Error general en execute_ledger_job ({action}): {e}", exc_info=True)
         try:
-            await query.edit_message_text(
-                f"❌ <b>Error eliminando mensajes</b>\n\n"
-                f"Error: {str(e)}",
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=f"❌ <b>Error procesando el broadcast</b>\n\n"
+                     f"Error: {str(e)}",
                 parse_mode='HTML'
             )
         except:
             pass
-        if user_id in broadcast_sessions:
-            del broadcast_sessions[user_id]
+    finally:
+        broadcast_sessions.pop(user_id, None)
 
 async def show_broadcast_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Muestra estadísticas de usuarios para broadcast"""
     query = update.callback_query
     
     try:
-        users = await db.get_all_users()
-        total_users = len(users)
+        reach = await db.get_user_reach_stats()
+        total_users = reach['total']
         
         if total_users == 0:
             await query.edit_message_text(
@@ -868,11 +1021,8 @@ async def show_broadcast_stats(update: Update, context: ContextTypes.DEFAULT_TYP
             )
             return
         
-        # Contar usuarios activos (últimos 7 días)
-        from datetime import datetime, timedelta, timezone
-        week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-        
-        active_users = sum(1 for user in users if user.last_active and user.last_active > week_ago)
+        reachable = reach['reachable']
+        active_users = reach['active']
         
         keyboard = [[InlineKeyboardButton("⬅️ Volver", callback_data="broadcast_back")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -880,9 +1030,11 @@ async def show_broadcast_stats(update: Update, context: ContextTypes.DEFAULT_TYP
         await query.edit_message_text(
             f"📊 <b>Estadísticas de Usuarios</b>\n\n"
             f"👥 Total de usuarios: {total_users}\n"
+            f"📬 Alcanzables: {reachable}\n"
+            f"🚫 Bloquearon el bot / cuenta borrada: {total_users - reachable}\n"
             f"🟢 Activos (últimos 7 días): {active_users}\n"
-            f"📉 Inactivos: {total_users - active_users}\n\n"
-            f"El mensaje se enviará a todos los {total_users} usuarios.",
+            f"📉 Inactivos: {reachable - active_users}\n\n"
+            f"El mensaje se enviará a los {reachable} usuarios alcanzables.",
             reply_markup=reply_markup,
             parse_mode='HTML'
         )
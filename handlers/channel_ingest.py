@@ -0,0 +1,37 @@
+"""
+Ingesta de videos del canal de almacenamiento
+
+Cada video publicado (o editado) en STORAGE_CHANNEL_ID llega como
+channel_post / edited_channel_post y se guarda en la cola de indexación
+(pending_videos) con su file_id, caption, tamaño y duración. /indexar,
+la indexación de series e index_videos.py leen esa cola en vez de sondear
+el canal con forward/copy/delete por cada message_id.
+
+El bot tiene que ser administrador del canal para recibir sus posts. Los
+videos publicados antes se recuperan con /backfill (utils/channel_backfill.py).
+"""
+from telegram import Update
+from telegram.ext import ContextTypes
+from utils.channel_backfill import pending_video_fields
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def storage_channel_post_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Guarda en la cola de indexación el video de un post del canal de almacenamiento"""
+    message = update.channel_post or update.edited_channel_post
+    if not message or not message.video:
+        return
+
+    db = context.bot_data['db']
+
+    try:
+        await db.upsert_pending_video(
+            message_id=message.message_id,
+            edited_at=message.edit_date.replace(tzinfo=None) if message.edit_date else None,
+            **pending_video_fields(message)
+        )
+        action = "editado" if update.edited_channel_post else "nuevo"
+        logger.info(f"Video {action} en canal de almacenamiento: mensaje {message.message_id}")
+    except Exception as e:
+        logger.error(f"Error guardando video {message.message_id} en la cola de indexación: {e}")
@@ -0,0 +1,33 @@
+"""
+Actualizaciones my_chat_member: el usuario bloqueó o desbloqueó el bot
+"""
+from telegram import Update, ChatMember
+from telegram.ext import ContextTypes
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def my_chat_member_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Mantiene users.is_reachable al día sin esperar a que falle un envío.
+
+    En chats privados Telegram avisa con estado 'kicked' cuando el usuario
+    bloquea el bot y 'member' cuando lo desbloquea o vuelve a iniciarlo.
+    """
+    member_update = update.my_chat_member
+    if not member_update or member_update.chat.type != 'private':
+        return
+    
+    db = context.bot_data['db']
+    user_id = member_update.chat.id
+    status = member_update.new_chat_member.status
+    
+    try:
+        if status == ChatMember.BANNED:
+            await db.mark_users_unreachable([user_id], 'blocked')
+            logger.info(f"Usuario {user_id} bloqueó el bot")
+        elif status == ChatMember.MEMBER:
+            await db.mark_user_reachable(user_id)
+            logger.info(f"Usuario {user_id} desbloqueó el bot")
+    except Exception as e:
+        logger.error(f"Error actualizando estado del chat {user_id}: {e}")
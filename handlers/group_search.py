@@ -5,8 +5,11 @@ Detecta automáticamente cuando alguien menciona nombres de películas/series
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import re
+import time
 from datetime import datetime
 import logging
+from database.search_index import normalize_text
+from utils.group_throttle import GroupResponseCache, GroupReplyLimiter
 
 # Importar configuración (con fallback a valores por defecto)
 try:
@@ -23,9 +26,25 @@ except ImportError:
         'sin', 'sobre', 'pero', 'mas', 'menos', 'muy', 'mucho', 'poco',
         'bien', 'mal', 'bueno', 'malo', 'grande', 'pequeño', 'nuevo', 'viejo'
     }
+    MIN_TIME_BETWEEN_RESPONSES = 3
+    MAX_RESPONSES_PER_HOUR = 50
+    GROUP_RESPONSE_BURST = 3
+    GLOBAL_GROUP_RESPONSES_PER_MINUTE = 20
+    GLOBAL_GROUP_RESPONSE_BURST = 5
+    GROUP_CACHE_TTL = 600
+    GROUP_CACHE_MAX_QUERIES = 50
+    GROUP_CACHE_MAX_CHATS = 1000
+    GROUP_REPEAT_SUPPRESS_SECONDS = 120
 
 logger = logging.getLogger(__name__)
 
+# Respuestas recientes por grupo y límites de respuestas automáticas
+group_cache = GroupResponseCache(GROUP_CACHE_TTL, GROUP_CACHE_MAX_QUERIES, GROUP_CACHE_MAX_CHATS)
+reply_limiter = GroupReplyLimiter(
+    MAX_RESPONSES_PER_HOUR, GROUP_RESPONSE_BURST, MIN_TIME_BETWEEN_RESPONSES,
+    GLOBAL_GROUP_RESPONSES_PER_MINUTE, GLOBAL_GROUP_RESPONSE_BURST, GROUP_CACHE_MAX_CHATS
+)
+
 async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Maneja mensajes en grupos para detectar búsquedas de películas/series
@@ -74,11 +93,37 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
         logger.debug("⏭️ Query vacío después de limpiar")
         return
     
+    chat_id = update.message.chat.id
+    # Con @ el score de confianza es otro, así que se cachea aparte
+    cache_key = (starts_with_at, normalize_text(clean_query))
+    
+    # La misma búsqueda hace poco en este grupo: reutilizar la decisión
+    cached = group_cache.get(chat_id, cache_key)
+    if cached is not None:
+        await send_cached_results(update, cached)
+        return
+    
+    # Sin cupo de respuestas no tiene sentido consultar la BD
+    if not reply_limiter.can_reply(chat_id):
+        logger.info(f"⏭️ Límite de respuestas alcanzado en el grupo {chat_id}")
+        return
+    
+    # Sin @ solo se consulta la BD si el mensaje menciona un título del
+    # catálogo (detector en memoria), y solo en el tipo mencionado
+    if starts_with_at:
+        mentioned = {'movie', 'series'}
+    else:
+        mentioned = await db.find_title_mentions(message_text)
+        if not mentioned:
+            logger.debug(f"⏭️ No menciona ningún título del catálogo: '{message_text[:30]}...'")
+            group_cache.put(chat_id, cache_key, None)
+            return
+    
     # Buscar películas
-    movies = await db.search_videos(clean_query, limit=5)
+    movies = await db.search_videos(clean_query, limit=5) if 'movie' in mentioned else []
     
     # Buscar series
-    series = await db.search_tv_shows(clean_query, limit=5)
+    series = await db.search_tv_shows(clean_query, limit=5) if 'series' in mentioned else []
     
     # Combinar resultados
     total_results = (len(movies) if movies else 0) + (len(series) if series else 0)
@@ -87,6 +132,7 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     
     if total_results == 0:
         logger.info("⏭️ No hay resultados, no se responde")
+        group_cache.put(chat_id, cache_key, None)
         return  # No responder si no hay resultados
     
     # Calcular score de confianza
@@ -97,12 +143,44 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     # Solo responder si el score es alto
     if confidence < MIN_CONFIDENCE_SCORE:
         logger.info(f"⏭️ Score insuficiente ({confidence:.2f} < {MIN_CONFIDENCE_SCORE}), no se responde")
+        group_cache.put(chat_id, cache_key, None)
+        return
+    
+    if not reply_limiter.consume(chat_id):
+        logger.info(f"⏭️ Límite de respuestas alcanzado en el grupo {chat_id}")
         return
     
     logger.info(f"✅ Enviando respuesta al grupo con {total_results} resultados")
     
     # Preparar respuesta
-    await send_group_results(update, context, movies, series, clean_query)
+    card = build_group_results(context.bot.username, movies, series, clean_query)
+    entry = group_cache.put(chat_id, cache_key, card)
+    await send_group_results(update, context, movies, series, clean_query, card=card)
+    entry.sent_at = time.monotonic()
+
+async def send_cached_results(update: Update, cached):
+    """
+    Responde con la decisión cacheada para la misma búsqueda en el grupo:
+    sin consultar la BD ni volver a registrar la búsqueda
+    """
+    chat_id = update.message.chat.id
+    if cached.card is None:
+        logger.debug("⏭️ Búsqueda reciente sin respuesta (caché)")
+        return
+    
+    # La tarjeta acaba de enviarse en este grupo: no repetirla
+    if cached.sent_at is not None and time.monotonic() - cached.sent_at < GROUP_REPEAT_SUPPRESS_SECONDS:
+        logger.info(f"⏭️ Tarjeta enviada hace poco en el grupo {chat_id}, no se repite")
+        return
+    
+    if not reply_limiter.consume(chat_id):
+        logger.info(f"⏭️ Límite de respuestas alcanzado en el grupo {chat_id}")
+        return
+    
+    text, reply_markup = cached.card
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    cached.sent_at = time.monotonic()
+    logger.info(f"✅ Respuesta reutilizada en el grupo {chat_id} (caché)")
 
 def is_potential_search_query(text: str) -> bool:
     """
@@ -196,25 +274,15 @@ def clean_search_query(text: str) -> str:
     
     return text.strip()
 
-def normalize_text(text: str) -> str:
+def _stored_norm(obj, field: str) -> str:
     """
-    Normaliza texto para comparación, removiendo acentos y caracteres especiales
+    Texto normalizado guardado en la columna <campo>_norm del resultado
+    (se calcula solo si el objeto no la tiene)
     """
-    # Mapeo de caracteres con acentos a sin acentos
-    accent_map = {
-        'á': 'a', 'à': 'a', 'ä': 'a', 'â': 'a', 'ā': 'a', 'ă': 'a', 'ą': 'a',
-        'é': 'e', 'è': 'e', 'ë': 'e', 'ê': 'e', 'ē': 'e', 'ĕ': 'e', 'ę': 'e',
-        'í': 'i', 'ì': 'i', 'ï': 'i', 'î': 'i', 'ī': 'i', 'ĭ': 'i', 'į': 'i',
-        'ó': 'o', 'ò': 'o', 'ö': 'o', 'ô': 'o', 'ō': 'o', 'ŏ': 'o', 'ő': 'o',
-        'ú': 'u', 'ù': 'u', 'ü': 'u', 'û': 'u', 'ū': 'u', 'ŭ': 'u', 'ů': 'u',
-        'ñ': 'n', 'ç': 'c'
-    }
-    
-    text = text.lower()
-    for accented, unaccented in accent_map.items():
-        text = text.replace(accented, unaccented)
-    
-    return text
+    value = getattr(obj, f"{field}_norm", None)
+    if value is None:
+        value = normalize_text(getattr(obj, field, None))
+    return value
 
 def calculate_confidence(original_text: str, query: str, movies: list, series: list) -> float:
     """
@@ -250,7 +318,7 @@ def calculate_confidence(original_text: str, query: str, movies: list, series: l
     
     if movies:
         for movie in movies[:3]:
-            title_normalized = normalize_text(movie.title)
+            title_normalized = _stored_norm(movie, 'title')
             # Coincidencia exacta
             if query_normalized == title_normalized:
                 best_match_score = max(best_match_score, 0.5)
@@ -267,7 +335,7 @@ def calculate_confidence(original_text: str, query: str, movies: list, series: l
     
     if series:
         for show in series[:3]:
-            name_normalized = normalize_text(show.name)
+            name_normalized = _stored_norm(show, 'name')
             # Coincidencia exacta
             if query_normalized == name_normalized:
                 best_match_score = max(best_match_score, 0.5)
@@ -293,16 +361,15 @@ def calculate_confidence(original_text: str, query: str, movies: list, series: l
     
     return min(score, 1.0)  # Cap at 1.0
 
-async def send_group_results(update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                             movies: list, series: list, query: str):
+def build_group_results(bot_username: str, movies: list, series: list, query: str):
     """
-    Envía los resultados en el grupo
+    Arma la tarjeta de resultados para el grupo
+    
+    Returns: (texto, reply_markup)
     """
     keyboard = []
     text = f"🎬 Encontré esto para: *{query}*\n\n"
     
-    bot_username = context.bot.username
-    
     # Agregar películas
     if movies:
         text += "📽️ *Películas:*\n"
@@ -346,7 +413,14 @@ async def send_group_results(update: Update, context: ContextTypes.DEFAULT_TYPE,
         )
     ])
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def send_group_results(update: Update, context: ContextTypes.DEFAULT_TYPE, 
+                             movies: list, series: list, query: str, card=None):
+    """
+    Envía los resultados en el grupo (card: tarjeta ya armada con build_group_results)
+    """
+    text, reply_markup = card or build_group_results(context.bot.username, movies, series, query)
     
     # Responder al mensaje original
     await update.message.reply_text(
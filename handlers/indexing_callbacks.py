@@ -4,7 +4,7 @@ Handler de callbacks para el sistema de indexación mejorado
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from database.db_manager import DatabaseManager
-from utils.tmdb_api import TMDBApi
+from utils.tmdb_api import AsyncTMDBApi
 from utils.title_cleaner import clean_title, format_title_with_year
 from config.settings import VERIFICATION_CHANNEL_ID
 import io
@@ -12,7 +12,7 @@ import requests as req
 import time
 
 db = DatabaseManager()
-tmdb = TMDBApi()
+tmdb = AsyncTMDBApi.shared()
 
 # Storage temporal de datos de indexación por usuario
 indexing_sessions = {}
@@ -316,6 +316,9 @@ async def cancel_save(update: Update, context: ContextTypes.DEFAULT_TYPE, callba
     session = get_or_create_session(user_id)
     session.stats['skipped'] += 1
     
+    # Sacarlo de la cola de indexación para que no vuelva a aparecer
+    await db.set_pending_video_status([msg_id], 'skipped')
+    
     await query.edit_message_text(
         f"⏭️ Video {msg_id} saltado.\n\n"
         f"Continuando con el siguiente..."
@@ -376,7 +379,7 @@ async def handle_title_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await update.message.reply_text(f"🔍 Buscando: <b>{new_title}</b>...", parse_mode='HTML')
     
     cleaned, year = clean_title(new_title)
-    results = tmdb.search_movie(cleaned, year=year, return_multiple=True, limit=5)
+    results = await tmdb.search_movie(cleaned, year=year, return_multiple=True, limit=5)
     
     # Asegurar que results sea lista
     if results is None:
@@ -485,6 +488,9 @@ async def skip_video(update: Update, context: ContextTypes.DEFAULT_TYPE, callbac
     session = get_or_create_session(user_id)
     session.stats['skipped'] += 1
     
+    # Sacarlo de la cola de indexación para que no vuelva a aparecer
+    await db.set_pending_video_status([msg_id], 'skipped')
+    
     await query.edit_message_text(
         f"⏭️ Video {msg_id} saltado.\n\n"
         f"📊 Saltados: {session.stats['skipped']}"
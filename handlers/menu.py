@@ -3,6 +3,9 @@ Módulo de menús interactivos para películas y series
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menú principal: Películas o Series"""
@@ -184,27 +187,86 @@ async def show_series_results(update: Update, context: ContextTypes.DEFAULT_TYPE
         parse_mode='HTML'
     )
 
+def seasons_view(tree, back_text, back_callback):
+    """
+    Texto y teclado del menú de temporadas de una serie, armados una sola vez
+    por árbol (ShowTree.rendered)
+    """
+    key = ('seasons', back_callback)
+    view = tree.rendered.get(key)
+    if view is None:
+        keyboard = []
+        for season_number, episode_count in tree.season_counts():
+            keyboard.append([
+                InlineKeyboardButton(
+                    f"Temporada {season_number} ({episode_count} episodios)",
+                    callback_data=f"season_{tree.show_id}_{season_number}"
+                )
+            ])
+        
+        keyboard.append([InlineKeyboardButton(back_text, callback_data=back_callback)])
+        
+        message_text = f"📺 <b>{tree.name}</b>"
+        if tree.year:
+            message_text += f" ({tree.year})"
+        message_text += f"\n\n🎬 <b>Temporadas disponibles:</b>"
+        
+        view = tree.rendered[key] = (message_text, InlineKeyboardMarkup(keyboard))
+    return view
+
+def episodes_view(tree, season_number):
+    """Texto y teclado del menú de episodios de una temporada (None si no tiene episodios)"""
+    key = ('episodes', season_number)
+    view = tree.rendered.get(key)
+    if view is None:
+        episodes = tree.seasons.get(season_number)
+        if not episodes:
+            return None
+        
+        keyboard = []
+        for episode in episodes:
+            episode_title = f"{episode.season_number}x{episode.episode_number:02d}"
+            if episode.title:
+                episode_title += f" - {episode.title}"
+            
+            keyboard.append([
+                InlineKeyboardButton(
+                    episode_title,
+                    callback_data=f"episode_{episode.id}"
+                )
+            ])
+        
+        keyboard.append([InlineKeyboardButton("⬅️ Volver a temporadas", callback_data=f"series_{tree.show_id}")])
+        
+        message_text = (
+            f"📺 <b>{tree.name}</b>\n"
+            f"🎬 <b>Temporada {season_number}</b>\n\n"
+            f"Selecciona un episodio:"
+        )
+        
+        view = tree.rendered[key] = (message_text, InlineKeyboardMarkup(keyboard))
+    return view
+
 async def show_seasons_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, show_id: int):
     """Muestra menú de temporadas disponibles para una serie"""
     db = context.bot_data['db']
     query = update.callback_query
     await query.answer()
     
-    # Obtener serie y temporadas
-    show = await db.get_tv_show_by_id(show_id)
-    if not show:
+    # Serie y temporadas desde el árbol en memoria
+    tree = await db.get_show_tree(show_id)
+    if not tree:
         await query.edit_message_text("❌ Serie no encontrada.")
         return
     
-    seasons = await db.get_seasons_for_show(show_id)
-    if not seasons:
+    if not tree.seasons:
         keyboard = [
             [InlineKeyboardButton("⬅️ Volver al menú", callback_data="menu_main")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(
-            f"❌ No hay episodios disponibles para <b>{show.name}</b>",
+            f"❌ No hay episodios disponibles para <b>{tree.name}</b>",
             reply_markup=reply_markup,
             parse_mode='HTML'
         )
@@ -214,26 +276,7 @@ async def show_seasons_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
     user_id = update.effective_user.id
     await db.set_user_state(user_id, "series_seasons", show_id)
     
-    # Construir botones de temporadas
-    keyboard = []
-    for season_number, episode_count in seasons:
-        keyboard.append([
-            InlineKeyboardButton(
-                f"Temporada {season_number} ({episode_count} episodios)",
-                callback_data=f"season_{show_id}_{season_number}"
-            )
-        ])
-    
-    keyboard.append([InlineKeyboardButton("⬅️ Volver a series", callback_data="menu_series")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    message_text = (
-        f"📺 <b>{show.name}</b>"
-    )
-    if show.year:
-        message_text += f" ({show.year})"
-    
-    message_text += f"\n\n🎬 <b>Temporadas disponibles:</b>"
+    message_text, reply_markup = seasons_view(tree, "⬅️ Volver a series", "menu_series")
     
     await query.edit_message_text(
         text=message_text,
@@ -247,14 +290,14 @@ async def show_episodes_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
     query = update.callback_query
     await query.answer()
     
-    # Obtener serie y episodios
-    show = await db.get_tv_show_by_id(show_id)
-    if not show:
+    # Serie y episodios desde el árbol en memoria
+    tree = await db.get_show_tree(show_id)
+    if not tree:
         await query.edit_message_text("❌ Serie no encontrada.")
         return
     
-    episodes = await db.get_episodes_by_season(show_id, season_number)
-    if not episodes:
+    view = episodes_view(tree, season_number)
+    if view is None:
         keyboard = [
             [InlineKeyboardButton("⬅️ Volver a temporadas", callback_data=f"series_{show_id}")]
         ]
@@ -267,31 +310,22 @@ async def show_episodes_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
         )
         return
     
-    # Construir botones de episodios
-    keyboard = []
-    for episode in episodes:
-        episode_title = f"{episode.season_number}x{episode.episode_number:02d}"
-        if episode.title:
-            episode_title += f" - {episode.title}"
-        
-        keyboard.append([
-            InlineKeyboardButton(
-                episode_title,
-                callback_data=f"episode_{episode.id}"
-            )
-        ])
-    
-    keyboard.append([InlineKeyboardButton("⬅️ Volver a temporadas", callback_data=f"series_{show_id}")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    message_text = (
-        f"📺 <b>{show.name}</b>\n"
-        f"🎬 <b>Temporada {season_number}</b>\n\n"
-        f"Selecciona un episodio:"
-    )
+    message_text, reply_markup = view
     
     await query.edit_message_text(
         text=message_text,
         reply_markup=reply_markup,
         parse_mode='HTML'
     )
+
+async def flush_navigation_states_job(context: ContextTypes.DEFAULT_TYPE):
+    """Job periódico: escribe en la BD los estados de navegación pendientes"""
+    try:
+        await context.bot_data['db'].flush_navigation_states()
+    except Exception as e:
+        logger.error(f"Error guardando estados de navegación: {e}")
+
+async def flush_navigation_states_on_shutdown(application):
+    """post_shutdown: guarda los estados pendientes antes de apagar el bot"""
+    written = await application.bot_data['db'].flush_navigation_states()
+    logger.info(f"Estados de navegación guardados al apagar: {written}")
@@ -4,13 +4,13 @@ Comandos de administración para indexar series
 from telegram import Update
 from telegram.ext import ContextTypes
 from database.db_manager import DatabaseManager
-from utils.tmdb_api import TMDBApi
-from config.settings import STORAGE_CHANNEL_ID, ADMIN_IDS, VERIFICATION_CHANNEL_ID
-import re
+from utils.tmdb_api import AsyncTMDBApi
+from config.settings import ADMIN_IDS, VERIFICATION_CHANNEL_ID
+from utils.episode_parser import parse_episode
 import logging
 
 db = DatabaseManager()
-tmdb = TMDBApi()
+tmdb = AsyncTMDBApi.shared()
 logger = logging.getLogger(__name__)
 
 async def auto_index_episodes(update: Update, context: ContextTypes.DEFAULT_TYPE, show):
@@ -71,104 +71,56 @@ async def scan_channel_for_episodes(update: Update, context: ContextTypes.DEFAUL
     - Temporada 2 - Capítulo 14 (formato español)
     - Temporada 1 - Capítulo 20 (formato español)
     """
-    # Patrones para detectar episodios
-    # Formato: 1x1, 2x14, etc.
-    pattern_short = re.compile(r'(\d+)[xX](\d+)')
-    # Formato: Temporada 2 - Capítulo 14, Temporada 1 - Capítulo 20
-    pattern_spanish = re.compile(r'[Tt]emporada\s*(\d+)\s*[-–—]\s*[Cc]ap[ií]tulo\s*(\d+)', re.IGNORECASE)
-    # Formato: 🔻Lucifer — 02x01 — Audio Latino (con emoji y guión largo)
-    pattern_emoji_dash = re.compile(r'(\d+)[xX](\d+)\s*[—–-]')
-    # Formato: Breaking Bad - S01E01 - 1080p.mp4
-    pattern_se_format = re.compile(r'[Ss](\d+)[Ee](\d+)')
-    
     indexed_count = 0
     empty_count = 0
     MAX_EMPTY = 5
-    current_message_id = start_message_id
+    current_message_id = start_message_id - 1
     last_indexed_message_id = 0  # Se actualizará con cada episodio indexado
     
     try:
+        # Los videos del canal ya están en la cola de indexación
+        # (handlers/channel_ingest.py): se leen de la BD sin forward/delete
         while empty_count < MAX_EMPTY:
-            try:
-                # Intentar obtener el mensaje del canal
-                message = await context.bot.forward_message(
-                    chat_id=update.effective_chat.id,
-                    from_chat_id=STORAGE_CHANNEL_ID,
-                    message_id=current_message_id
-                )
-                
-                # Eliminar el mensaje reenviado inmediatamente
-                await message.delete()
-                
-                # Verificar si el mensaje tiene video
-                if not message.video:
-                    empty_count += 1
-                    current_message_id += 1
-                    continue
+            pending_videos = await db.get_pending_videos(after_message_id=current_message_id, limit=50)
+            if not pending_videos:
+                break
+            
+            for pending in pending_videos:
+                current_message_id = pending.message_id
                 
                 # Obtener caption del mensaje
-                caption = message.caption or ""
+                caption = pending.caption or ""
                 
-                # Intentar encontrar el episodio con cualquiera de los patrones
+                # Detectar el episodio (formato español, S##E## o #x#) en una sola pasada
                 # NOTA: Ya no verificamos si el caption contiene el nombre de la serie
                 # Esto permite indexar episodios con formato solo "1x1", "1x2", etc.
-                match = None
-                episode_title = None
-                season_num = None
-                episode_num = None
-                
-                # Primero intentar formato español "Temporada X - Capítulo Y"
-                match_spanish = pattern_spanish.search(caption)
-                if match_spanish:
-                    match = match_spanish
-                    season_num = int(match.group(1))
-                    episode_num = int(match.group(2))
-                    # Extraer título después del patrón
-                    title_match = re.search(r'[Cc]ap[ií]tulo\s*\d+\s*[-–—]?\s*(.+)', caption)
-                    episode_title = title_match.group(1).strip() if title_match else f"Episodio {episode_num}"
-                
-                # Si no se encontró, intentar formato S##E## (ej: S01E01)
-                if not match:
-                    match_se = pattern_se_format.search(caption)
-                    if match_se:
-                        match = match_se
-                        season_num = int(match.group(1))
-                        episode_num = int(match.group(2))
-                        # Extraer título después del patrón
-                        title_match = re.search(r'[Ss]\d+[Ee]\d+\s*[-–—]?\s*(.+)', caption)
-                        episode_title = title_match.group(1).strip() if title_match else f"Episodio {episode_num}"
-                
-                # Si no se encontró, intentar formato corto "#x#" (incluyendo emoji-dash)
-                if not match:
-                    match_short = pattern_short.search(caption)
-                    if match_short:
-                        match = match_short
-                        season_num = int(match.group(1))
-                        episode_num = int(match.group(2))
-                        # Extraer título después del patrón
-                        title_match = re.search(r'\d+[xX]\d+\s*[-–—]?\s*(.+)', caption)
-                        episode_title = title_match.group(1).strip() if title_match else f"Episodio {episode_num}"
-                
-                if not match:
+                parsed = parse_episode(caption)
+                if not parsed:
+                    # Otro video (no es episodio): cuenta como fin del bloque de la serie
                     empty_count += 1
-                    current_message_id += 1
+                    if empty_count >= MAX_EMPTY:
+                        break
                     continue
                 
+                season_num = parsed.season
+                episode_num = parsed.episode
+                episode_title = parsed.title or f"Episodio {episode_num}"
+                
                 # Resetear contador de vacíos
                 empty_count = 0
                 
-                # Guardar en la base de datos
+                # Guardar en la base de datos (también lo marca como indexado en la cola)
                 await db.add_episode(
                     tv_show_id=show_id,
                     season_number=season_num,
                     episode_number=episode_num,
-                    file_id=message.video.file_id,
-                    message_id=current_message_id,
+                    file_id=pending.file_id,
+                    message_id=pending.message_id,
                     title=episode_title
                 )
                 
                 indexed_count += 1
-                last_indexed_message_id = current_message_id
+                last_indexed_message_id = pending.message_id
                 
                 # Actualizar progreso cada 5 episodios
                 if indexed_count % 5 == 0:
@@ -177,20 +129,14 @@ async def scan_channel_for_episodes(update: Update, context: ContextTypes.DEFAUL
                         text=f"📊 Progreso: {indexed_count} episodios indexados...",
                         parse_mode='HTML'
                     )
-                
-            except Exception as e:
-                # Si no se puede obtener el mensaje (probablemente no existe)
-                empty_count += 1
-            
-            current_message_id += 1
         
         # Guardar el último mensaje procesado (si se indexó algo, guardar el último indexado;
-        # si no, guardar el último mensaje revisado menos 1 para no saltar mensajes)
+        # si no, guardar el último mensaje revisado de la cola)
         if indexed_count > 0:
             await db.set_config('last_indexed_message', str(last_indexed_message_id))
         else:
             # Si no se indexó nada, guardar el último mensaje revisado
-            await db.set_config('last_indexed_message', str(current_message_id - 1))
+            await db.set_config('last_indexed_message', str(current_message_id))
         
         if indexed_count > 0:
             # Enviar resumen
@@ -303,7 +249,7 @@ async def index_series_command(update: Update, context: ContextTypes.DEFAULT_TYP
     # Buscar serie en TMDB
     await update.message.reply_text(f"🔍 Buscando serie: <b>{series_name}</b>...", parse_mode='HTML')
     
-    series_data = tmdb.search_tv_show(series_name)
+    series_data = await tmdb.search_tv_show(series_name)
     
     if not series_data:
         await update.message.reply_text(
@@ -326,7 +272,7 @@ async def index_series_command(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     
     # Obtener detalles completos de la serie
-    details = tmdb.get_tv_show_details(series_data['tmdb_id'])
+    details = await tmdb.get_tv_show_details(series_data['tmdb_id'])
     
     if not details:
         await update.message.reply_text("❌ Error al obtener detalles de la serie.")
@@ -422,35 +368,13 @@ async def index_episode_reply(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     # Parsear formatos
-    text = update.message.text.strip()
-    
-    # Formato corto: 1x1, 2x10
-    pattern_short = r'(\d+)[xX](\d+)'
-    # Formato español: Temporada 2 - Capítulo 14
-    pattern_spanish = r'[Tt]emporada\s*(\d+)\s*[-–—]\s*[Cc]ap[ií]tulo\s*(\d+)'
-    # Formato S##E##: S01E01, S02E05
-    pattern_se_format = r'[Ss](\d+)[Ee](\d+)'
-    
-    match_short = re.search(pattern_short, text)
-    match_spanish = re.search(pattern_spanish, text, re.IGNORECASE)
-    match_se = re.search(pattern_se_format, text)
-    
-    season_number = None
-    episode_number = None
-    
-    # Priorizar formato español si está presente
-    if match_spanish:
-        season_number = int(match_spanish.group(1))
-        episode_number = int(match_spanish.group(2))
-    elif match_se:
-        season_number = int(match_se.group(1))
-        episode_number = int(match_se.group(2))
-    elif match_short:
-        season_number = int(match_short.group(1))
-        episode_number = int(match_short.group(2))
-    else:
+    parsed = parse_episode(update.message.text.strip())
+    if not parsed:
         return  # No es un formato válido, ignorar
     
+    season_number = parsed.season
+    episode_number = parsed.episode
+    
     show_id = context.user_data['indexing_show_id']
     show_name = context.user_data['indexing_show_name']
     
@@ -467,7 +391,7 @@ async def index_episode_reply(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Buscar detalles del episodio en TMDB
     show = await db.get_tv_show_by_id(show_id)
-    season_details = tmdb.get_season_details(show.tmdb_id, season_number)
+    season_details = await tmdb.get_season_details(show.tmdb_id, season_number)
     
     episode_info = None
     if season_details and season_details.get('episodes'):
@@ -1,8 +1,10 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from utils.verification import is_user_member
+from utils.dead_chats import record_if_dead
 from config.settings import VERIFICATION_CHANNEL_USERNAME
 from handlers.tickets import process_referral_start, check_and_reward_referral
+from handlers.menu import seasons_view
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -88,16 +90,15 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 series_id = int(arg.split("_")[1])
                 print(f"📺 Procesando serie con ID: {series_id}")
                 
-                # Obtener serie y temporadas
-                show = await db.get_tv_show_by_id(series_id)
-                if not show:
+                # Serie y temporadas desde el árbol en memoria
+                tree = await db.get_show_tree(series_id)
+                if not tree:
                     await update.message.reply_text("❌ Serie no encontrada.")
                     return
                 
-                seasons = await db.get_seasons_for_show(series_id)
-                if not seasons:
+                if not tree.seasons:
                     await update.message.reply_text(
-                        f"❌ No hay episodios disponibles para <b>{show.name}</b>",
+                        f"❌ No hay episodios disponibles para <b>{tree.name}</b>",
                         parse_mode='HTML'
                     )
                     return
@@ -105,25 +106,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # Guardar estado del usuario
                 await db.set_user_state(user.id, "series_seasons", series_id)
                 
-                # Construir botones de temporadas
-                keyboard = []
-                for season_number, episode_count in seasons:
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            f"Temporada {season_number} ({episode_count} episodios)",
-                            callback_data=f"season_{series_id}_{season_number}"
-                        )
-                    ])
+                message_text, reply_markup = seasons_view(tree, "⬅️ Volver al menú", "menu_main")
                 
-                keyboard.append([InlineKeyboardButton("⬅️ Volver al menú", callback_data="menu_main")])
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                message_text = f"📺 <b>{show.name}</b>"
-                if show.year:
-                    message_text += f" ({show.year})"
-                message_text += f"\n\n🎬 <b>Temporadas disponibles:</b>"
-                
-                print(f"✅ Enviando menú de temporadas para {show.name}")
+                print(f"✅ Enviando menú de temporadas para {tree.name}")
                 await update.message.reply_text(
                     text=message_text,
                     reply_markup=reply_markup,
@@ -529,6 +514,7 @@ async def verify_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     )
                 except Exception as e:
                     print(f"Error notificando referrer: {e}")
+                    await record_if_dead(db, referrer_id, e)
             
             # Enviar el video
             await send_video_by_message_id(query, context, video_msg_id, user.id)
@@ -2,10 +2,11 @@ import asyncio
 import os
 from telegram import Bot
 from database.db_manager import DatabaseManager
-from config.settings import BOT_TOKEN, STORAGE_CHANNEL_ID
+from config.settings import BOT_TOKEN, STORAGE_CHANNEL_ID, ADMIN_IDS, BACKFILL_SCRATCH_CHAT_ID
+from utils.channel_backfill import ChannelBackfill, CHECKPOINT_KEY as BACKFILL_CHECKPOINT_KEY
 
 LAST_INDEX_FILE = "last_indexed_message.txt"
-MAX_EMPTY_MESSAGES = 10  # Detener después de 10 mensajes vacíos consecutivos
+BATCH_SIZE = 100  # Videos de la cola leídos por consulta
 
 async def get_last_indexed(db):
     """Obtiene el último mensaje indexado desde la base de datos primero, luego archivo, o comienza desde 812."""
@@ -43,105 +44,80 @@ async def save_last_indexed(db, msg_id):
         except Exception as e2:
             print(f"Error al guardar en archivo también: {e2}")
 
-async def index_channel_videos():
+async def backfill_channel(db):
+    """Trae a la cola de indexación los videos antiguos del canal (forward_messages por ventanas de 100)"""
+    scratch_chat_id = BACKFILL_SCRATCH_CHAT_ID or (ADMIN_IDS[0] if ADMIN_IDS else None)
+    if not scratch_chat_id:
+        print("⚠️ Sin BACKFILL_SCRATCH_CHAT_ID ni ADMIN_IDS: se omite el backfill")
+        return
+    
+    start_id = int(await db.get_config(BACKFILL_CHECKPOINT_KEY, '0')) + 1
+    print(f"📥 Backfill del canal desde mensaje {start_id} (chat de trabajo: {scratch_chat_id})")
+    
+    async def on_progress(stats):
+        print(f"   Revisado hasta {stats.last_message_id}: {stats.videos} videos, {stats.api_calls} llamadas")
+    
     bot = Bot(token=BOT_TOKEN)
+    async with bot:
+        stats = await ChannelBackfill(bot, db, scratch_chat_id).run(start_id, on_progress=on_progress)
+    print(f"✅ Backfill: {stats.videos} videos nuevos en cola ({stats.messages} mensajes, {stats.api_calls} llamadas)")
+
+async def index_channel_videos():
     db = DatabaseManager()
     await db.init_db()
     
-    # Obtener información del bot para usar su chat ID personal
-    bot_info = await bot.get_me()
-    bot_chat_id = f"@{bot_info.username}"
-    
     start_from = await get_last_indexed(db)
     
+    await backfill_channel(db)
+    
+    # Los videos del canal llegan a la cola de indexación (pending_videos) en
+    # cuanto se publican: no hace falta reenviar cada mensaje para verlo
     print("Iniciando indexación de videos...")
     print(f"Canal de almacén: {STORAGE_CHANNEL_ID}")
-    print(f"Chat del bot: {bot_chat_id}")
     print(f"Comenzando desde mensaje: {start_from}")
-    print(f"Se detendrá después de {MAX_EMPTY_MESSAGES} mensajes vacíos consecutivos")
+    print(f"Videos en cola: {await db.count_pending_videos(after_message_id=start_from - 1)}")
     print("-" * 50)
     
     indexed = 0
-    empty_count = 0
-    current_msg_id = start_from
     last_video_msg_id = start_from - 1  # Último mensaje que tuvo video
     
-    # Iterar hasta encontrar MAX_EMPTY_MESSAGES mensajes vacíos consecutivos
-    while empty_count < MAX_EMPTY_MESSAGES:
-        try:
-            # Verificar si el video ya existe en la base de datos
-            existing_video = await db.get_video_by_message_id(current_msg_id)
-            if existing_video:
-                print(f"⚠️ Video ya indexado: {current_msg_id}")
-                last_video_msg_id = current_msg_id  # Actualizar último mensaje con video
-                await save_last_indexed(db, current_msg_id + 1)
-                current_msg_id += 1
-                continue
-
-            # Intentar obtener el mensaje del canal
+    while True:
+        pending_videos = await db.get_pending_videos(after_message_id=last_video_msg_id, limit=BATCH_SIZE)
+        if not pending_videos:
+            break
+        
+        for pending in pending_videos:
+            current_msg_id = pending.message_id
+            last_video_msg_id = current_msg_id
             try:
-                print(f"🔍 Intentando acceder al mensaje {current_msg_id}...")
-                if current_msg_id == 859:
-                    print(f"🎯 Buscando específicamente el mensaje 859 que mencionaste...")
-
-                message = await bot.forward_message(
-                    chat_id=bot_chat_id,
-                    from_chat_id=STORAGE_CHANNEL_ID,
-                    message_id=current_msg_id
+                # Verificar si el video ya existe en la base de datos
+                existing_video = await db.get_video_by_message_id(current_msg_id)
+                if existing_video:
+                    print(f"⚠️ Video ya indexado: {current_msg_id}")
+                    await db.set_pending_video_status([current_msg_id], 'indexed')
+                    continue
+                
+                title = pending.caption or f"Video {current_msg_id}"
+                
+                # add_video también lo marca como indexado en la cola
+                await db.add_video(
+                    file_id=pending.file_id,
+                    message_id=current_msg_id,
+                    title=title,
+                    description="",
+                    tags=""
                 )
-
-                if current_msg_id == 859:
-                    print(f"✅ ¡Mensaje 859 encontrado! Contenido: {message.caption if message.caption else 'Sin título'}")
-                    print(f"📹 ¿Tiene video?: {message.video is not None}")
-
-                print(f"✅ Mensaje {current_msg_id} reenviado exitosamente")
-
-                if message.video:
-                    title = message.caption or f"Video {current_msg_id}"
-
-                    # Verificar nuevamente si el video ya existe antes de agregarlo
-                    existing_video = await db.get_video_by_message_id(current_msg_id)
-                    if existing_video:
-                        print(f"⚠️ Video duplicado detectado al agregar: {current_msg_id}")
-                        last_video_msg_id = current_msg_id  # Actualizar último mensaje con video
-                        await save_last_indexed(db, current_msg_id + 1)
-                        current_msg_id += 1
-                        continue
-
-                    await db.add_video(
-                        file_id=message.video.file_id,
-                        message_id=current_msg_id,
-                        title=title,
-                        description="",
-                        tags=""
-                    )
-                    indexed += 1
-                    last_video_msg_id = current_msg_id  # Actualizar último mensaje con video
-                    print(f"✅ [{current_msg_id}] Indexado: {title}")
-
-                    # Guardar progreso después de cada video indexado
-                    await save_last_indexed(db, current_msg_id + 1)
-                else:
-                    empty_count += 1
-                    print(f"⏭️  [{current_msg_id}] Sin video ({empty_count}/{MAX_EMPTY_MESSAGES})")
+                indexed += 1
+                print(f"✅ [{current_msg_id}] Indexado: {title}")
             except Exception as e:
-                empty_count += 1
-                print(f"⏭️  [{current_msg_id}] No encontrado o error ({empty_count}/{MAX_EMPTY_MESSAGES}): {e}")
-            finally:
-                current_msg_id += 1
-        except Exception as e:
-            print(f"Error general en la verificación de video {current_msg_id}: {e}")
-            empty_count += 1
-            current_msg_id += 1
-            continue
-    
-    # Guardar el último mensaje procesado (último video + 1)
-    await save_last_indexed(db, last_video_msg_id + 1)
+                print(f"Error indexando video {current_msg_id}: {e}")
+        
+        # Guardar progreso después de cada lote
+        await save_last_indexed(db, last_video_msg_id + 1)
     
     print("-" * 50)
     print(f"\n✅ Indexación completa: {indexed} videos indexados")
     print(f"📍 Último mensaje procesado: {last_video_msg_id}")
-    print(f"🛑 Detenido después de {MAX_EMPTY_MESSAGES} mensajes vacíos consecutivos")
 
 if __name__ == "__main__":
     asyncio.run(index_channel_videos())
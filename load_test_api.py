@@ -0,0 +1,88 @@
+"""
+Prueba de carga de la API del servidor (server.py)
+
+Mide la latencia (media, p50, p95, p99) y el throughput de los endpoints de la
+Mini App con varias peticiones concurrentes. Sirve para comparar antes/después
+de cambios en el servidor.
+
+Uso:
+    python load_test_api.py
+    python load_test_api.py --url https://tu-app.onrender.com --requests 200 --concurrency 10
+    python load_test_api.py --endpoints /api/movies /api/movie/1
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_ENDPOINTS = ['/api/movies', '/api/series', '/api/catalog/page', '/api/movie/1', '/health']
+
+def percentile(values, pct):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+def run_endpoint(base_url, endpoint, total_requests, concurrency):
+    """Lanza `total_requests` GET contra un endpoint y retorna las estadísticas"""
+    session = requests.Session()
+    url = f"{base_url.rstrip('/')}{endpoint}"
+
+    def do_request(_):
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=60)
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    # Calentamiento: la primera petición no cuenta
+    do_request(0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(do_request, range(total_requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(ms for ms, ok in results)
+    errors = sum(1 for ms, ok in results if not ok)
+    return {
+        'endpoint': endpoint,
+        'requests': total_requests,
+        'errors': errors,
+        'mean': statistics.mean(latencies),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'rps': total_requests / elapsed if elapsed else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API")
+    parser.add_argument('--url', default='http://localhost:5000', help="URL base del servidor")
+    parser.add_argument('--requests', type=int, default=100, help="Peticiones por endpoint")
+    parser.add_argument('--concurrency', type=int, default=10, help="Peticiones simultáneas")
+    parser.add_argument('--endpoints', nargs='+', default=DEFAULT_ENDPOINTS)
+    args = parser.parse_args()
+
+    print(f"\n🚀 Prueba de carga: {args.url}")
+    print(f"   {args.requests} peticiones por endpoint, concurrencia {args.concurrency}\n")
+    print(f"{'Endpoint':<22}{'media':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}{'errores':>9}")
+    print("-" * 81)
+
+    for endpoint in args.endpoints:
+        stats = run_endpoint(args.url, endpoint, args.requests, args.concurrency)
+        print(
+            f"{stats['endpoint']:<22}"
+            f"{stats['mean']:>8.1f}ms{stats['p50']:>8.1f}ms{stats['p95']:>8.1f}ms{stats['p99']:>8.1f}ms"
+            f"{stats['rps']:>10.1f}{stats['errors']:>9}"
+        )
+
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,17 @@ from telegram.ext import (
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    ChatMemberHandler,
     filters
 )
-from config.settings import BOT_TOKEN
+from config.settings import BOT_TOKEN, STORAGE_CHANNEL_ID, NAV_STATE_FLUSH_SECONDS, STATS_RECONCILE_SECONDS
 from database.db_manager import DatabaseManager
 from handlers.start import start_command, verify_callback
 from handlers.search import search_command, video_callback
 from handlers.admin import (
-    indexar_command, stats_command, indexar_manual_command, 
-    reindexar_command, handle_reindex_callback, reindexar_titulos_command
+    indexar_command, stats_command, indexar_manual_command, backfill_command,
+    reindexar_command, handle_reindex_callback, reindexar_titulos_command,
+    reconcile_stats_job
 )
 from handlers.repost import (
     repost_command, handle_repost_callback, handle_repost_channel_input
@@ -22,9 +24,14 @@ from handlers.repost import (
 from handlers.text_handler import handle_text_message
 from handlers.callbacks import handle_callback
 from handlers.series_admin import index_series_command, index_episode_reply, finish_indexing_command
+from utils.episode_parser import SHORT_EPISODE_PATTERN
 from handlers.admin_menu import admin_menu_command, admin_callback_handler, process_new_episode
 from handlers.indexing_callbacks import handle_title_input, handle_indexing_callback, clean_expired_sessions
-from handlers.broadcast import broadcast_menu_command, handle_broadcast_callback, handle_custom_message_input
+from handlers.broadcast import broadcast_menu_command, handle_broadcast_callback, handle_custom_message_input, resume_broadcast_jobs
+from handlers.chat_member import my_chat_member_handler
+from utils.tmdb_api import AsyncTMDBApi
+from handlers.channel_ingest import storage_channel_post_handler
+from handlers.menu import flush_navigation_states_job, flush_navigation_states_on_shutdown
 from handlers.tickets import (
     mis_tickets_command, invitar_command, mis_referidos_command,
     handle_tickets_callback
@@ -89,6 +96,14 @@ async def session_cleanup_job(context):
         expired_count = clean_expired_sessions()
         if expired_count > 0:
             logger.info(f"🧹 Limpiadas {expired_count} sesiones expiradas")
+        
+        purged = await context.bot_data['db'].purge_expired_tmdb_cache()
+        if purged > 0:
+            logger.info(f"🧹 Borradas {purged} respuestas vencidas del caché de TMDB")
+        
+        purged_rollups = await context.bot_data['db'].purge_old_channel_hourly_rollups()
+        if purged_rollups > 0:
+            logger.info(f"🧹 Borrados {purged_rollups} buckets por hora viejos de visitas por canal")
     except Exception as e:
         logger.error(f"Error en limpieza de sesiones: {e}")
 
@@ -105,10 +120,17 @@ def main():
     asyncio.run(db.init_db())
     
     # Crear aplicación
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_shutdown(flush_navigation_states_on_shutdown)
+        .build()
+    )
     
     # Guardar en bot_data
     application.bot_data['db'] = db
+    # El caché persistente de TMDB usa la misma BD (sin otro engine)
+    AsyncTMDBApi.shared(db)
     
     # Configurar job para limpieza de sesiones (cada hora)
     application.job_queue.run_repeating(
@@ -117,6 +139,23 @@ def main():
         first=60  # Primera ejecución tras 1 minuto
     )
     
+    # Reanudar broadcasts que quedaron a medias por un reinicio/redeploy
+    application.job_queue.run_once(resume_broadcast_jobs, when=10)
+    
+    # Escribir en lote los estados de navegación pendientes
+    application.job_queue.run_repeating(
+        flush_navigation_states_job,
+        interval=NAV_STATE_FLUSH_SECONDS,
+        first=NAV_STATE_FLUSH_SECONDS
+    )
+    
+    # Recalcular los contadores de /stats (corrige desvíos de stats_rollup)
+    application.job_queue.run_repeating(
+        reconcile_stats_job,
+        interval=STATS_RECONCILE_SECONDS,
+        first=30
+    )
+    
     # Handlers de comandos
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler(["buscar", "search"], search_command))
@@ -125,6 +164,7 @@ def main():
     application.add_handler(CommandHandler("broadcast", broadcast_menu_command))
     application.add_handler(CommandHandler("indexar", indexar_command))
     application.add_handler(CommandHandler("indexar_manual", indexar_manual_command))
+    application.add_handler(CommandHandler("backfill", backfill_command))
     application.add_handler(CommandHandler("reindexar", reindexar_command))
     application.add_handler(CommandHandler("reindexar_titulos", reindexar_titulos_command))
     application.add_handler(CommandHandler("repost", repost_command))
@@ -148,6 +188,15 @@ def main():
     # Handlers de callbacks (nuevo sistema unificado tiene prioridad)
     application.add_handler(CallbackQueryHandler(admin_callback_handler, pattern="^admin_"))
     application.add_handler(CallbackQueryHandler(handle_broadcast_callback, pattern="^broadcast_"))
+    
+    # Bloqueos/desbloqueos del bot (mantiene users.is_reachable)
+    application.add_handler(ChatMemberHandler(my_chat_member_handler, ChatMemberHandler.MY_CHAT_MEMBER))
+    
+    # Videos nuevos/editados del canal de almacenamiento -> cola de indexación
+    application.add_handler(MessageHandler(
+        filters.Chat(chat_id=STORAGE_CHANNEL_ID) & filters.UpdateType.CHANNEL_POSTS & filters.VIDEO,
+        storage_channel_post_handler
+    ))
     application.add_handler(CallbackQueryHandler(handle_indexing_callback, pattern="^idx_"))
     application.add_handler(CallbackQueryHandler(handle_reindex_callback, pattern="^ridx_"))
     application.add_handler(CallbackQueryHandler(handle_repost_callback, pattern="^repost_"))
@@ -188,7 +237,7 @@ def main():
     
     # Handler para respuestas con formato #x# (puede contener texto adicional)
     application.add_handler(MessageHandler(
-        filters.TEXT & ~filters.COMMAND & filters.Regex(r'\d+[xX]\d+'),
+        filters.TEXT & ~filters.COMMAND & filters.Regex(SHORT_EPISODE_PATTERN),
         index_episode_reply
     ))
     application.add_handler(MessageHandler(
@@ -0,0 +1,51 @@
+"""
+Script de migración para las columnas normalizadas de búsqueda
+(videos.title_norm/original_title_norm/tags_norm y tv_shows.name_norm/original_name_norm)
+
+Agrega las columnas si no existen y las rellena con normalize_text, la misma
+normalización que usa el bot al guardar. init_db ya rellena las columnas en
+NULL; este script además revisa todas las filas (por ejemplo si cambia
+normalize_text). Se puede ejecutar varias veces: solo actualiza las filas
+cuyo valor cambió.
+"""
+import asyncio
+from database.db_manager import DatabaseManager
+from database.models import Video, TvShow
+from database.search_index import VIDEO_SEARCH_FIELDS, TV_SHOW_SEARCH_FIELDS
+from database.search_sql import ensure_search_schema, backfill_search_columns
+
+async def backfill_table(db, table_name, fields):
+    """Revisa toda la tabla y actualiza las columnas _norm desactualizadas"""
+    def progress(scanned, updated):
+        print(f"   {table_name}: {scanned} revisadas, {updated} actualizadas...")
+
+    updated = await backfill_search_columns(
+        db.engine, table_name, fields, only_missing=False, progress=progress
+    )
+    print(f"✅ {table_name}: {updated} filas actualizadas")
+
+async def migrate():
+    """Agrega y rellena las columnas normalizadas de búsqueda"""
+    db = DatabaseManager()
+
+    try:
+        print("Verificando columnas normalizadas...")
+        await ensure_search_schema(
+            db.engine,
+            [(Video, VIDEO_SEARCH_FIELDS), (TvShow, TV_SHOW_SEARCH_FIELDS)],
+            use_sql_backend=False
+        )
+        print("✓ Columnas listas")
+
+        await backfill_table(db, Video.__tablename__, VIDEO_SEARCH_FIELDS)
+        await backfill_table(db, TvShow.__tablename__, TV_SHOW_SEARCH_FIELDS)
+
+        print("\n✅ Migración completada exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+    finally:
+        await db.engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
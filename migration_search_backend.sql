@@ -0,0 +1,59 @@
+-- =====================================================
+-- MIGRACIÓN SUPABASE: Búsqueda en base de datos (SEARCH_BACKEND=sql)
+-- =====================================================
+-- Ejecutar en: Supabase SQL Editor
+-- Fecha: Octubre 2026
+--
+-- Columnas normalizadas (sin acentos, minúsculas) para videos y series
+-- e índices trigram para buscar con LIKE '%texto%' sin recorrer la tabla.
+-- El bot llena las columnas al guardar; este script rellena las existentes.
+-- (migrate_search_columns.py hace el relleno con la normalización exacta del bot)
+-- =====================================================
+
+-- =====================================================
+-- 1. EXTENSIONES
+-- =====================================================
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- =====================================================
+-- 2. COLUMNAS NORMALIZADAS
+-- =====================================================
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS title_norm VARCHAR(500);
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS original_title_norm VARCHAR(500);
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS tags_norm VARCHAR(500);
+
+ALTER TABLE tv_shows ADD COLUMN IF NOT EXISTS name_norm VARCHAR(500);
+ALTER TABLE tv_shows ADD COLUMN IF NOT EXISTS original_name_norm VARCHAR(500);
+
+-- =====================================================
+-- 3. RELLENAR FILAS EXISTENTES
+-- =====================================================
+UPDATE videos SET
+    title_norm = lower(unaccent(title)),
+    original_title_norm = lower(unaccent(original_title)),
+    tags_norm = lower(unaccent(tags))
+WHERE title_norm IS NULL;
+
+UPDATE tv_shows SET
+    name_norm = lower(unaccent(name)),
+    original_name_norm = lower(unaccent(original_name))
+WHERE name_norm IS NULL;
+
+-- =====================================================
+-- 4. ÍNDICES TRIGRAM (GIN)
+-- =====================================================
+CREATE INDEX IF NOT EXISTS idx_videos_title_norm_trgm ON videos USING gin (title_norm gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_videos_original_title_norm_trgm ON videos USING gin (original_title_norm gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_videos_tags_norm_trgm ON videos USING gin (tags_norm gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_tv_shows_name_norm_trgm ON tv_shows USING gin (name_norm gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tv_shows_original_name_norm_trgm ON tv_shows USING gin (original_name_norm gin_trgm_ops);
+
+-- =====================================================
+-- VERIFICACIÓN
+-- =====================================================
+-- EXPLAIN ANALYZE
+-- SELECT id, title FROM videos
+-- WHERE title_norm LIKE '%vengadores%' OR original_title_norm LIKE '%vengadores%';
+-- Debe aparecer "Bitmap Index Scan on idx_videos_title_norm_trgm"
@@ -0,0 +1,122 @@
+const { createClient } = require('@supabase/supabase-js');
+
+// Columnas permitidas en ?fields= (igual que CATALOG_FIELDS en database/catalog_snapshot.py)
+const CATALOG_FIELDS = {
+  movie: ['id', 'title', 'original_title', 'year', 'overview', 'poster_url',
+          'backdrop_url', 'vote_average', 'runtime', 'genres', 'message_id'],
+  series: ['id', 'name', 'original_name', 'year', 'overview', 'poster_url',
+           'backdrop_url', 'vote_average', 'genres', 'number_of_seasons', 'status']
+};
+
+// Lo mínimo que necesita la grilla
+const GRID_FIELDS = {
+  movie: ['id', 'title', 'original_title', 'year', 'poster_url', 'vote_average', 'message_id'],
+  series: ['id', 'name', 'original_name', 'year', 'poster_url', 'vote_average', 'number_of_seasons']
+};
+
+const TABLES = {
+  movie: { table: 'videos', titleFields: ['title_norm', 'original_title_norm'] },
+  series: { table: 'tv_shows', titleFields: ['name_norm', 'original_name_norm'] }
+};
+
+// Misma normalización que normalize_text (sin tildes, minúsculas)
+function normalizeText(text) {
+  return text.normalize('NFD').replace(/\p{Mn}/gu, '').toLowerCase();
+}
+
+// Escapa comodines de LIKE y quita los caracteres que rompen el filtro or() de PostgREST
+function likePattern(text) {
+  return '%' + text.replace(/[,()]/g, ' ').replace(/[\\%_]/g, c => '\\' + c) + '%';
+}
+
+function toInt(value) {
+  const number = parseInt(value, 10);
+  return Number.isFinite(number) ? number : null;
+}
+
+exports.handler = async (event, context) => {
+  const headers = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Content-Type': 'application/json'
+  };
+
+  if (event.httpMethod === 'OPTIONS') {
+    return { statusCode: 200, headers, body: '' };
+  }
+
+  try {
+    const supabaseUrl = process.env.SUPABASE_URL;
+    const supabaseKey = process.env.SUPABASE_KEY;
+    const botUsername = process.env.BOT_USERNAME || 'CineStelar_bot';
+
+    if (!supabaseUrl || !supabaseKey) {
+      return {
+        statusCode: 500,
+        headers,
+        body: JSON.stringify({ error: 'Supabase credentials not configured' })
+      };
+    }
+
+    const params = event.queryStringParameters || {};
+    const type = params.type === 'series' ? 'series' : 'movie';
+    const cursor = toInt(params.cursor);
+    const limit = Math.max(1, Math.min(toInt(params.limit) || 40, 100));
+    const year = toInt(params.year);
+    const itemId = toInt(params.id);
+
+    let fields = (params.fields || '').split(',').map(f => f.trim()).filter(f => CATALOG_FIELDS[type].includes(f));
+    if (!fields.length) fields = [...GRID_FIELDS[type]];
+    if (!fields.includes('id')) fields.unshift('id');
+
+    const supabase = createClient(supabaseUrl, supabaseKey);
+    const { table, titleFields } = TABLES[type];
+
+    // El total solo se cuenta en la primera página
+    let query = supabase
+      .from(table)
+      .select(fields.join(','), cursor === null ? { count: 'exact' } : undefined)
+      .order('id', { ascending: false })
+      .limit(limit + 1);
+
+    if (cursor !== null) query = query.lt('id', cursor);
+    if (itemId !== null) query = query.eq('id', itemId);
+    if (params.genre) query = query.ilike('genres', likePattern(params.genre.trim()));
+    if (year !== null) query = query.eq('year', type === 'movie' ? String(year) : year);
+    if (params.q && params.q.trim()) {
+      const pattern = likePattern(normalizeText(params.q.trim()));
+      query = query.or(titleFields.map(field => `${field}.ilike.${pattern}`).join(','));
+    }
+
+    const { data, count, error } = await query;
+    if (error) throw error;
+
+    const rows = data || [];
+    const hasMore = rows.length > limit;
+    const items = rows.slice(0, limit);
+
+    const page = {
+      type,
+      items,
+      next_cursor: hasMore ? items[items.length - 1].id : null,
+      has_more: hasMore,
+      total: cursor === null ? count : null
+    };
+    if (cursor === null) page.bot_username = botUsername;
+
+    return {
+      statusCode: 200,
+      headers,
+      body: JSON.stringify(page)
+    };
+
+  } catch (error) {
+    console.error('Error:', error);
+    return {
+      statusCode: 500,
+      headers,
+      body: JSON.stringify({ error: error.message, items: [], next_cursor: null, has_more: false })
+    };
+  }
+};
@@ -37,7 +37,7 @@ exports.handler = async (event, context) => {
     // Consultar películas
     const { data: movies, error } = await supabase
       .from('videos')
-      .select('*')
+      .select('id, title, year, overview, poster_url, backdrop_url, vote_average, genres, message_id')
       .order('id', { ascending: false })
       .limit(500);
 
@@ -61,7 +61,7 @@ exports.handler = async (event, context) => {
       overview: movie.overview || '',
       poster_url: movie.poster_url || '',
       backdrop_url: movie.backdrop_url || '',
-      rating: movie.rating ? parseFloat(movie.rating) : null,
+      rating: movie.vote_average ? parseFloat(movie.vote_average) : null,
       genres: movie.genres ? movie.genres.split(',') : [],
       type: 'movie',
       message_id: movie.message_id
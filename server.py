@@ -2,22 +2,48 @@
 Servidor unificado que ejecuta Flask (API) y Bot de Telegram simultáneamente.
 Diseñado para correr en Render.com
 """
-from flask import Flask, send_file, request, jsonify
+from flask import Flask, send_file, request, jsonify, Response
 from flask_cors import CORS
 import asyncio
 import threading
 from database.db_manager import DatabaseManager
+from database.catalog_snapshot import CatalogSnapshot
+from utils.delivery_queue import DeliveryQueue
 from telegram import Bot
 from config.settings import BOT_TOKEN, STORAGE_CHANNEL_ID, FLASK_PORT, BOT_USERNAME
-from sqlalchemy import text
 import os
 import sys
+import atexit
+import signal
 
 app = Flask(__name__)
 CORS(app, origins=['https://bottm.netlify.app', 'http://localhost:5000', '*'])
 # Inicializar base de datos
 db = None
 
+# Event loop de larga vida para la API: todas las consultas de los endpoints
+# corren aquí y comparten un solo engine/pool de conexiones (el de `db`)
+api_loop = asyncio.new_event_loop()
+API_TIMEOUT = 30  # segundos
+
+# Catálogo precalculado para /api/catalog, /api/movies y /api/series (se reconstruye al cambiar el contenido)
+catalog_snapshot = CatalogSnapshot()
+
+# Entregas de /api/ad-completed: workers en el loop de la API con un solo Bot y el `db` compartido
+delivery_queue = DeliveryQueue()
+
+def _run_api_loop():
+    asyncio.set_event_loop(api_loop)
+    api_loop.run_forever()
+
+def start_api_loop():
+    """Inicia el hilo del event loop de la API"""
+    threading.Thread(target=_run_api_loop, name="api-loop", daemon=True).start()
+
+def run_async(coro, timeout=API_TIMEOUT):
+    """Ejecuta una corrutina en el loop de la API y espera el resultado (desde Flask)"""
+    return asyncio.run_coroutine_threadsafe(coro, api_loop).result(timeout=timeout)
+
 @app.route('/api/config')
 def get_config():
     """Obtiene la configuración de Supabase para el cliente"""
@@ -45,43 +71,6 @@ def get_config():
         'api_url': 'http://localhost:5000'
     })
 
-async def run_migration():
-    """Ejecuta la migración de base de datos si es necesaria"""
-    try:
-        async with db.engine.begin() as conn:
-            # Verificar si las columnas ya existen
-            result = await conn.execute(text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'ad_tokens' 
-                AND column_name IN ('expires_at', 'ip_address')
-            """))
-            
-            existing_columns = [row[0] for row in result]
-            
-            # Agregar expires_at si no existe
-            if 'expires_at' not in existing_columns:
-                print("🔧 Agregando columna expires_at...")
-                await conn.execute(text("""
-                    ALTER TABLE ad_tokens 
-                    ADD COLUMN expires_at TIMESTAMP WITHOUT TIME ZONE
-                """))
-                print("✅ Columna expires_at agregada")
-            
-            # Agregar ip_address si no existe
-            if 'ip_address' not in existing_columns:
-                print("🔧 Agregando columna ip_address...")
-                await conn.execute(text("""
-                    ALTER TABLE ad_tokens 
-                    ADD COLUMN ip_address VARCHAR(50)
-                """))
-                print("✅ Columna ip_address agregada")
-        
-        if 'expires_at' not in existing_columns or 'ip_address' not in existing_columns:
-            print("✅ Migración completada")
-    except Exception as e:
-        print(f"⚠️ Error en migración (puede ser normal si ya existe): {e}")
-
 async def init_db():
     """Inicializar base de datos de forma asíncrona"""
     global db
@@ -89,9 +78,6 @@ async def init_db():
         db = DatabaseManager()
         await db.init_db()
         print("✅ Base de datos inicializada")
-        
-        # Ejecutar migración automática
-        await run_migration()
 
 @app.route('/ad_viewer.html')
 def serve_webapp():
@@ -109,120 +95,109 @@ def serve_catalog():
     """Sirve la Mini App del catálogo de películas"""
     return send_file('webapp/index.html')
 
+def snapshot_response(view):
+    """
+    Responde una vista del snapshot del catálogo con ETag: si el cliente manda
+    If-None-Match con el ETag vigente se responde 304 sin cuerpo.
+    """
+    bot_username = BOT_USERNAME.replace('@', '') if BOT_USERNAME else 'CineStelar_bot'
+    # Un solo CatalogBody inmutable: ETag y cuerpo son siempre de la misma versión
+    snapshot = run_async(catalog_snapshot.get(db, bot_username, view))
+    
+    headers = {
+        'ETag': snapshot.etag,
+        'Cache-Control': 'no-cache',  # el navegador siempre revalida con el ETag
+        'Vary': 'Accept-Encoding'
+    }
+    
+    if CatalogSnapshot.etag_matches(request.headers.get('If-None-Match'), snapshot.etag):
+        return Response(status=304, headers=headers)
+    
+    body, encoding = snapshot.select_body(request.headers.get('Accept-Encoding'))
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, status=200, headers=headers, mimetype='application/json')
+
+@app.route('/api/catalog')
+def get_catalog():
+    """Catálogo completo (películas + series) para la Mini App, desde el snapshot"""
+    try:
+        return snapshot_response('catalog')
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error getting catalog: {e}")
+        return jsonify({'error': str(e), 'movies': [], 'series': []}), 500
+
+@app.route('/api/catalog/page')
+def get_catalog_page():
+    """
+    Página del catálogo con cursor, para que la Mini App cargue a medida que se hace scroll.
+
+    Parámetros (query string):
+        type: movie | series (por defecto movie)
+        cursor: next_cursor de la página anterior (vacío = primera página)
+        limit: elementos por página (máximo 100)
+        fields: columnas separadas por coma (por defecto las de la grilla)
+        genre, year, q: filtros aplicados en SQL
+        id: devolver solo ese elemento (detalle del modal)
+    """
+    try:
+        content_type = 'series' if request.args.get('type') == 'series' else 'movie'
+        cursor = request.args.get('cursor', type=int)
+        limit = max(1, min(request.args.get('limit', 40, type=int), 100))
+        fields_param = request.args.get('fields', '')
+        fields = [f.strip() for f in fields_param.split(',') if f.strip()] or None
+
+        page = run_async(db.get_catalog_page(
+            content_type,
+            fields=fields,
+            cursor=cursor,
+            limit=limit,
+            genre=request.args.get('genre') or None,
+            year=request.args.get('year', type=int),
+            query=request.args.get('q') or None,
+            item_id=request.args.get('id', type=int)
+        ))
+
+        page['type'] = content_type
+        page['has_more'] = page['next_cursor'] is not None
+        if cursor is None:
+            page['bot_username'] = BOT_USERNAME.replace('@', '') if BOT_USERNAME else 'CineStelar_bot'
+        return jsonify(page)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error getting catalog page: {e}")
+        return jsonify({'error': str(e), 'items': [], 'next_cursor': None, 'has_more': False}), 500
+
 @app.route('/api/movies')
 def get_movies():
-    """Obtiene todas las películas indexadas para la Mini App"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    local_db = None
-    
+    """Obtiene todas las películas indexadas para la Mini App (desde el snapshot)"""
     try:
-        local_db = DatabaseManager()
-        loop.run_until_complete(local_db.init_db())
-        
-        # Obtener películas
-        movies = loop.run_until_complete(local_db.get_all_videos())
-        
-        movies_list = []
-        for movie in movies:
-            try:
-                movies_list.append({
-                    'id': movie.id,
-                    'title': movie.title or 'Sin título',
-                    'year': movie.year,
-                    'overview': movie.overview or '',
-                    'poster_url': movie.poster_url or '',
-                    'backdrop_url': getattr(movie, 'backdrop_url', '') or '',
-                    'rating': float(movie.rating) if movie.rating else None,
-                    'genres': movie.genres.split(',') if movie.genres else [],
-                    'type': 'movie',
-                    'message_id': movie.message_id
-                })
-            except Exception as movie_err:
-                print(f"Error procesando película {movie.id}: {movie_err}")
-                continue
-        
-        return jsonify({
-            'movies': movies_list,
-            'total': len(movies_list),
-            'bot_username': BOT_USERNAME.replace('@', '') if BOT_USERNAME else 'CineStelar_bot'
-        })
+        return snapshot_response('movies')
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"Error getting movies: {e}")
         return jsonify({'error': str(e), 'movies': []}), 500
-    finally:
-        try:
-            if local_db:
-                loop.run_until_complete(local_db.engine.dispose())
-        except:
-            pass
-        loop.close()
 
 @app.route('/api/series')
 def get_series():
-    """Obtiene todas las series indexadas"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    local_db = None
-    
+    """Obtiene todas las series indexadas (desde el snapshot)"""
     try:
-        local_db = DatabaseManager()
-        loop.run_until_complete(local_db.init_db())
-        
-        # Usar search_tv_shows con query vacío para obtener todas
-        series_list = loop.run_until_complete(local_db.search_tv_shows("", limit=1000))
-        
-        series_data = []
-        for show in series_list:
-            try:
-                series_data.append({
-                    'id': show.id,
-                    'name': show.name or 'Sin título',
-                    'original_name': show.original_name,
-                    'year': show.year,
-                    'overview': show.overview or '',
-                    'poster_url': show.poster_url or '',
-                    'backdrop_url': show.backdrop_url or '',
-                    'vote_average': float(show.vote_average) if show.vote_average else None,
-                    'genres': show.genres,
-                    'number_of_seasons': show.number_of_seasons,
-                    'status': show.status,
-                    'type': 'series'
-                })
-            except Exception as series_err:
-                print(f"Error procesando serie {show.id}: {series_err}")
-                continue
-        
-        return jsonify({
-            'series': series_data,
-            'total': len(series_data)
-        })
+        return snapshot_response('series')
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"Error getting series: {e}")
         return jsonify({'error': str(e), 'series': []}), 500
-    finally:
-        try:
-            if local_db:
-                loop.run_until_complete(local_db.engine.dispose())
-        except:
-            pass
-        loop.close()
 
 @app.route('/api/movie/<int:movie_id>')
 def get_movie_details(movie_id):
     """Obtiene los detalles de una película específica"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
     try:
-        local_db = DatabaseManager()
-        loop.run_until_complete(local_db.init_db())
-        
-        movie = loop.run_until_complete(local_db.get_video_by_id(movie_id))
+        movie = run_async(db.get_video_by_id(movie_id))
         
         if not movie:
             return jsonify({'error': 'Película no encontrada'}), 404
@@ -234,7 +209,7 @@ def get_movie_details(movie_id):
             'overview': movie.overview,
             'poster_url': movie.poster_url,
             'backdrop_url': movie.backdrop_url,
-            'rating': float(movie.rating) if movie.rating else None,
+            'rating': float(movie.vote_average) if movie.vote_average else None,
             'genres': movie.genres.split(',') if movie.genres else [],
             'type': 'movie',
             'message_id': movie.message_id,
@@ -243,203 +218,6 @@ def get_movie_details(movie_id):
     except Exception as e:
         print(f"Error getting movie: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        try:
-            loop.run_until_complete(local_db.engine.dispose())
-        except:
-            pass
-        loop.close()
-
-def process_video_delivery(user_id, content_id, content_type='movie'):
-    """Procesa el envío del video/episodio en segundo plano"""
-    print(f"🔄 Iniciando proceso de envío en background para user_id={user_id}, content_type={content_type}")
-    
-    # Crear nuevo loop para este hilo
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    # Crear instancia de DB local
-    local_db = DatabaseManager()
-
-    try:
-        # Inicializar DB
-        loop.run_until_complete(local_db.init_db())
-
-        if content_type == 'episode':
-            # Es un episodio de serie
-            episode = loop.run_until_complete(local_db.get_episode_by_id(content_id))
-            if not episode:
-                print(f"❌ Episodio no encontrado en background: {content_id}")
-                return
-            
-            show = loop.run_until_complete(local_db.get_tv_show_by_id(episode.tv_show_id))
-            if not show:
-                print(f"❌ Serie no encontrada en background: {episode.tv_show_id}")
-                return
-            
-            print(f"📺 Enviando episodio: {show.name} S{episode.season_number}x{episode.episode_number:02d} a user_id={user_id}")
-            
-            # Enviar episodio
-            bot = Bot(token=BOT_TOKEN)
-            
-            # Preparar caption
-            caption = f"📺 <b>{show.name}</b>\n"
-            caption += f"🎬 Temporada {episode.season_number}, Episodio {episode.episode_number}\n"
-            if episode.title:
-                caption += f"📝 {episode.title}\n"
-            if episode.air_date:
-                caption += f"📅 {episode.air_date}\n"
-            if episode.overview:
-                caption += f"\n{episode.overview}\n"
-            
-            try:
-                loop.run_until_complete(
-                    bot.send_video(
-                        chat_id=user_id,
-                        video=episode.file_id,
-                        caption=caption,
-                        parse_mode='HTML',
-                        protect_content=True,
-                        read_timeout=60,
-                        write_timeout=60,
-                        connect_timeout=60
-                    )
-                )
-                print("✅ Episodio enviado exitosamente")
-            except Exception as e:
-                print(f"❌ Error enviando episodio: {e}")
-                try:
-                    loop.run_until_complete(
-                        bot.send_message(
-                            chat_id=user_id,
-                            text="❌ Hubo un error al enviar el episodio. Por favor intenta de nuevo más tarde."
-                        )
-                    )
-                except:
-                    pass
-                return
-            
-            # Mensaje de confirmación
-            loop.run_until_complete(
-                bot.send_message(
-                    chat_id=user_id,
-                    text="✅ ¡Disfruta el episodio!\n\nUsa /start para continuar navegando."
-                )
-            )
-            
-        else:
-            # Es una película (código existente)
-            video = loop.run_until_complete(local_db.get_video_by_id(content_id))
-
-            if not video:
-                print(f"❌ Video no encontrado en background: {content_id}")
-                return
-
-            print(f"🎬 Enviando video: {video.title} a user_id={user_id}")
-
-            # Enviar el video al usuario
-            bot = Bot(token=BOT_TOKEN)
-
-        # Si tiene poster, enviarlo primero
-        if video.poster_url:
-            try:
-                import io
-                import requests as req
-
-                response = req.get(video.poster_url, timeout=10)
-                response.raise_for_status()
-                photo = io.BytesIO(response.content)
-                photo.name = "poster.jpg"
-
-                caption = f"🎬 <b>{video.title}</b>\n"
-                if video.year:
-                    caption += f"📅 {video.year}\n"
-                if video.vote_average:
-                    caption += f"⭐ {video.vote_average/10:.1f}/10\n"
-                if video.runtime:
-                    caption += f"⏱️ {video.runtime} min\n"
-                if video.genres:
-                    caption += f"🎭 {video.genres}\n"
-                if video.overview:
-                    caption += f"\n📝 {video.overview}\n"
-
-                loop.run_until_complete(
-                    bot.send_photo(
-                        chat_id=user_id,
-                        photo=photo,
-                        caption=caption,
-                        parse_mode="HTML"
-                    )
-                )
-                print("📸 Poster enviado")
-            except Exception as e:
-                print(f"⚠️ Error enviando poster: {e}")
-
-        # Enviar video
-        print(f"🎥 Intentando enviar video file_id: {video.file_id}")
-        caption_text = f"📹 *{video.title}*"
-        if video.description:
-            caption_text += f"\n\n{video.description}"
-
-        try:
-            loop.run_until_complete(
-                bot.send_video(
-                    chat_id=user_id,
-                    video=video.file_id,
-                    caption=caption_text,
-                    parse_mode='Markdown',
-                    protect_content=True,
-                    read_timeout=60,
-                    write_timeout=60,
-                    connect_timeout=60
-                )
-            )
-            print("✅ Video enviado exitosamente")
-        except Exception as e:
-            print(f"❌ Error enviando video: {e}")
-            # Intentar enviar mensaje de error al usuario
-            try:
-                loop.run_until_complete(
-                    bot.send_message(
-                        chat_id=user_id,
-                        text="❌ Hubo un error al enviar el archivo de video. Por favor intenta de nuevo más tarde."
-                    )
-                )
-            except:
-                pass
-            return # Salir si falla el video
-
-        # Enviar menú principal
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        keyboard = [
-            [
-                InlineKeyboardButton("🎬 Películas", callback_data="menu_movies"),
-                InlineKeyboardButton("📺 Series", callback_data="menu_series")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        loop.run_until_complete(
-            bot.send_message(
-                chat_id=user_id,
-                text="🍿 <b>¿Qué quieres ver?</b>\n\nSelecciona una opción:",
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-        )
-        print("💬 Menú principal enviado")
-
-    except Exception as e:
-        print(f"❌ Error en background process: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        # Cerrar conexión a DB y Loop
-        try:
-            loop.run_until_complete(local_db.engine.dispose())
-        except:
-            pass
-        loop.close()
 
 @app.route('/api/ad-completed', methods=['POST'])
 def ad_completed():
@@ -465,9 +243,16 @@ def ad_completed():
             print(f"❌ Error convirtiendo IDs: {e}")
             return jsonify({'success': False, 'error': 'IDs inválidos'}), 400
 
-        # Iniciar proceso en background
-        print(f"🚀 Lanzando thread para procesar {content_type}...")
-        threading.Thread(target=process_video_delivery, args=(user_id, content_id, content_type), daemon=True).start()
+        # Encolar la entrega (los workers la procesan en el loop de la API)
+        status = run_async(delivery_queue.submit(user_id, content_id, content_type), timeout=5)
+        
+        if status == 'full':
+            print("⚠️ Cola de entregas llena, se pide reintentar")
+            return jsonify({'success': False, 'error': 'Servidor ocupado, intenta de nuevo'}), 503, {'Retry-After': '5'}
+        
+        if status == 'duplicate':
+            print(f"↩️ Entrega repetida ignorada: user_id={user_id}, content_id={content_id}")
+            return jsonify({'success': True, 'message': f'El envío de {content_type} ya está en proceso'})
         
         # Responder inmediatamente
         print(f"✅ Respondiendo OK al cliente")
@@ -482,7 +267,22 @@ def ad_completed():
 @app.route('/health')
 def health():
     """Endpoint de salud para verificar que el servidor está corriendo"""
-    return jsonify({'status': 'ok', 'service': 'CineStelar WebApp Server'})
+    try:
+        # En el loop de la API, que es el único que modifica la cola
+        queue_stats = run_async(delivery_queue.async_stats(), timeout=5)
+    except Exception as e:
+        # Loop trabado: las entregas no avanzan
+        print(f"❌ /health sin métricas de la cola de entregas: {e!r}")
+        return jsonify({
+            'status': 'error',
+            'service': 'CineStelar WebApp Server',
+            'error': 'delivery_queue no responde'
+        }), 503
+    return jsonify({
+        'status': 'ok',
+        'service': 'CineStelar WebApp Server',
+        'delivery_queue': queue_stats
+    })
 
 def run_telegram_bot():
     """Ejecuta el bot de Telegram en un thread con su propio event loop"""
@@ -503,8 +303,9 @@ def run_telegram_bot():
         from handlers.start import start_command, verify_callback
         from handlers.search import search_command, video_callback
         from handlers.admin import (
-            indexar_command, stats_command, indexar_manual_command, 
-            reindexar_command, handle_reindex_callback, reindexar_titulos_command
+            indexar_command, stats_command, indexar_manual_command, backfill_command,
+            reindexar_command, handle_reindex_callback, reindexar_titulos_command,
+            reconcile_stats_job
         )
         from handlers.repost import (
             repost_command, handle_repost_callback, handle_repost_channel_input
@@ -512,9 +313,15 @@ def run_telegram_bot():
         from handlers.text_handler import handle_text_message
         from handlers.callbacks import handle_callback
         from handlers.series_admin import index_series_command, index_episode_reply, finish_indexing_command
+        from utils.episode_parser import SHORT_EPISODE_PATTERN
         from handlers.admin_menu import admin_menu_command, admin_callback_handler, process_new_episode
         from handlers.indexing_callbacks import handle_title_input, handle_indexing_callback, clean_expired_sessions
-        from handlers.broadcast import broadcast_menu_command, handle_broadcast_callback, handle_custom_message_input
+        from handlers.broadcast import broadcast_menu_command, handle_broadcast_callback, handle_custom_message_input, resume_broadcast_jobs
+        from handlers.chat_member import my_chat_member_handler
+        from handlers.channel_ingest import storage_channel_post_handler
+        from handlers.menu import flush_navigation_states_job
+        from utils.tmdb_api import AsyncTMDBApi
+        from config.settings import NAV_STATE_FLUSH_SECONDS, STATS_RECONCILE_SECONDS
         from handlers.tickets import (
             mis_tickets_command, invitar_command, mis_referidos_command,
             handle_tickets_callback
@@ -527,7 +334,7 @@ def run_telegram_bot():
             stats_canales_command, add_canal_command, list_canales_command,
             handle_stats_callback
         )
-        from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters
+        from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, ChatMemberHandler, filters
         
         # Inicializar base de datos
         db = DatabaseManager()
@@ -549,6 +356,8 @@ def run_telegram_bot():
         
         # Guardar en bot_data
         application.bot_data['db'] = db
+        # El caché persistente de TMDB usa la misma BD (sin otro engine)
+        AsyncTMDBApi.shared(db)
         
         # Configurar job para limpieza de sesiones (cada hora)
         async def session_cleanup_job(context):
@@ -557,6 +366,14 @@ def run_telegram_bot():
                 expired_count = clean_expired_sessions()
                 if expired_count > 0:
                     print(f"🧹 Limpiadas {expired_count} sesiones expiradas")
+                
+                purged = await context.bot_data['db'].purge_expired_tmdb_cache()
+                if purged > 0:
+                    print(f"🧹 Borradas {purged} respuestas vencidas del caché de TMDB")
+                
+                purged_rollups = await context.bot_data['db'].purge_old_channel_hourly_rollups()
+                if purged_rollups > 0:
+                    print(f"🧹 Borrados {purged_rollups} buckets por hora viejos de visitas por canal")
             except Exception as e:
                 print(f"Error en limpieza de sesiones: {e}")
         
@@ -566,6 +383,34 @@ def run_telegram_bot():
             first=60  # Primera ejecución tras 1 minuto
         )
         
+        # Reanudar broadcasts que quedaron a medias por un reinicio/redeploy
+        application.job_queue.run_once(resume_broadcast_jobs, when=10)
+        
+        # Escribir en lote los estados de navegación pendientes
+        application.job_queue.run_repeating(
+            flush_navigation_states_job,
+            interval=NAV_STATE_FLUSH_SECONDS,
+            first=NAV_STATE_FLUSH_SECONDS
+        )
+        
+        # Recalcular los contadores de /stats (corrige desvíos de stats_rollup)
+        application.job_queue.run_repeating(
+            reconcile_stats_job,
+            interval=STATS_RECONCILE_SECONDS,
+            first=30
+        )
+        
+        # Este loop no tiene signal handlers ni shutdown: los estados
+        # pendientes se guardan al salir del proceso
+        def flush_navigation_states_at_exit():
+            if loop.is_running():
+                try:
+                    written = asyncio.run_coroutine_threadsafe(db.flush_navigation_states(), loop).result(timeout=10)
+                    print(f"💾 Estados de navegación guardados al salir: {written}")
+                except Exception as e:
+                    print(f"⚠️ No se pudieron guardar los estados de navegación: {e}")
+        atexit.register(flush_navigation_states_at_exit)
+        
         # Registrar handlers de comandos
         application.add_handler(CommandHandler("start", start_command))
         application.add_handler(CommandHandler(["buscar", "search"], search_command))
@@ -587,6 +432,7 @@ def run_telegram_bot():
         application.add_handler(CommandHandler("broadcast", broadcast_menu_command))
         application.add_handler(CommandHandler("indexar", indexar_command))
         application.add_handler(CommandHandler("indexar_manual", indexar_manual_command))
+        application.add_handler(CommandHandler("backfill", backfill_command))
         application.add_handler(CommandHandler("reindexar", reindexar_command))
         application.add_handler(CommandHandler("reindexar_titulos", reindexar_titulos_command))
         application.add_handler(CommandHandler("repost", repost_command))
@@ -610,6 +456,15 @@ def run_telegram_bot():
         # Handlers de callbacks
         application.add_handler(CallbackQueryHandler(admin_callback_handler, pattern="^admin_"))
         application.add_handler(CallbackQueryHandler(handle_broadcast_callback, pattern="^broadcast_"))
+        
+        # Bloqueos/desbloqueos del bot (mantiene users.is_reachable)
+        application.add_handler(ChatMemberHandler(my_chat_member_handler, ChatMemberHandler.MY_CHAT_MEMBER))
+        
+        # Videos nuevos/editados del canal de almacenamiento -> cola de indexación
+        application.add_handler(MessageHandler(
+            filters.Chat(chat_id=STORAGE_CHANNEL_ID) & filters.UpdateType.CHANNEL_POSTS & filters.VIDEO,
+            storage_channel_post_handler
+        ))
         application.add_handler(CallbackQueryHandler(handle_indexing_callback, pattern="^idx_"))
         application.add_handler(CallbackQueryHandler(handle_reindex_callback, pattern="^ridx_"))
         application.add_handler(CallbackQueryHandler(handle_repost_callback, pattern="^repost_"))
@@ -639,7 +494,7 @@ def run_telegram_bot():
                 await handle_text_message(update, context)
         
         application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND & filters.Regex(r'\d+[xX]\d+'),
+            filters.TEXT & ~filters.COMMAND & filters.Regex(SHORT_EPISODE_PATTERN),
             index_episode_reply
         ))
         application.add_handler(MessageHandler(
@@ -691,10 +546,13 @@ def run_telegram_bot():
         traceback.print_exc()
 
 if __name__ == '__main__':
-    # Inicializar base de datos
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(init_db())
+    # Inicializar base de datos una sola vez, en el loop que usará la API
+    start_api_loop()
+    run_async(init_db(), timeout=None)
+    run_async(delivery_queue.start(db), timeout=None)
+
+    # SIGTERM (redeploy) sale por sys.exit para que corran los atexit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     # Iniciar bot en hilo separado
     bot_thread = threading.Thread(target=run_telegram_bot, daemon=True)
@@ -0,0 +1,100 @@
+"""
+Script de prueba y benchmark del parser de episodios (utils/episode_parser.py)
+
+Compara el parser de una sola pasada con la detección anterior (tres
+patrones por separado + un re.search extra para el título) sobre los casos
+de test_episode_patterns.py, y mide el tiempo de ambos.
+
+Uso: python test_episode_parser.py [repeticiones]
+"""
+import re
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.episode_parser import parse_episode, EpisodeMatch
+from test_episode_patterns import test_cases
+
+# Detección anterior (series_admin.scan_channel_for_episodes)
+pattern_short = re.compile(r'(\d+)[xX](\d+)')
+pattern_spanish = re.compile(r'[Tt]emporada\s*(\d+)\s*[-–—]\s*[Cc]ap[ií]tulo\s*(\d+)', re.IGNORECASE)
+pattern_se_format = re.compile(r'[Ss](\d+)[Ee](\d+)')
+
+LEGACY_FORMATS = (
+    ('spanish', pattern_spanish, r'[Cc]ap[ií]tulo\s*\d+\s*[-–—]?\s*(.+)'),
+    ('se', pattern_se_format, r'[Ss]\d+[Ee]\d+\s*[-–—]?\s*(.+)'),
+    ('short', pattern_short, r'\d+[xX]\d+\s*[-–—]?\s*(.+)'),
+)
+
+def legacy_parse(caption):
+    for name, pattern, title_pattern in LEGACY_FORMATS:
+        match = pattern.search(caption)
+        if match:
+            title_match = re.search(title_pattern, caption)
+            title = title_match.group(1).strip() if title_match else None
+            return EpisodeMatch(int(match.group(1)), int(match.group(2)), title, name)
+    return None
+
+# Casos extra: prioridad entre formatos, varias líneas y captions de películas
+# (la mayoría de los posts del canal no son episodios)
+EXTRA_CASES = [
+    "Loki 1x2 - Repack S03E04",
+    "Temporada 1 - Capítulo 2\nSegunda línea",
+    "Canal @peliculas\nLoki 1x3 - La variante",
+    "Avatar: El camino del agua (2022) 1080p Latino",
+    "Oppenheimer (2023) [1080p] Dual Latino",
+    "Spider-Man: Across the Spider-Verse 2023 HD Latino",
+    "Dune: Parte Dos (2024) 4K HDR",
+    "Avatar: El camino del agua (2022) 1080p Latino " * 3,
+]
+
+# Diferencias esperadas: el título anterior se quedaba con el último dígito del
+# episodio cuando no había título ("5X10" -> "0"); el parser devuelve None
+def same_result(parsed, legacy):
+    if parsed is None or legacy is None:
+        return parsed is None and legacy is None
+    if (parsed.season, parsed.episode, parsed.format) != (legacy.season, legacy.episode, legacy.format):
+        return False
+    if parsed.title is None and legacy.title is not None:
+        return str(legacy.episode).endswith(legacy.title)
+    return parsed.title == legacy.title
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    corpus = list(test_cases) + EXTRA_CASES
+
+    print("=" * 60)
+    print("PARSER DE EPISODIOS: RESULTADOS")
+    print("=" * 60)
+    failures = 0
+    for caption in corpus:
+        parsed = parse_episode(caption)
+        legacy = legacy_parse(caption)
+        ok = same_result(parsed, legacy)
+        failures += not ok
+        summary = f"{parsed.season}x{parsed.episode} {parsed.title!r}" if parsed else "sin episodio"
+        print(f"{'✅' if ok else '❌'} {caption[:50]!r:55} {summary}")
+
+    print("\n" + "=" * 60)
+    print(f"BENCHMARK ({len(corpus)} captions x {repeat})")
+    print("=" * 60)
+    timings = {}
+    for name, parse in (("anterior", legacy_parse), ("una pasada", parse_episode)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for caption in corpus:
+                parse(caption)
+        elapsed = time.perf_counter() - start
+        timings[name] = elapsed
+        per_caption = elapsed / (repeat * len(corpus)) * 1e6
+        print(f"{name:12} {elapsed * 1000:8.1f} ms  ({per_caption:.2f} µs/caption)")
+    print(f"Aceleración: {timings['anterior'] / timings['una pasada']:.2f}x")
+
+    if failures:
+        print(f"\n❌ {failures} casos con resultado distinto")
+        sys.exit(1)
+    print("\n✅ Mismos resultados que la detección anterior")
+
+if __name__ == "__main__":
+    main()
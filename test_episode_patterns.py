@@ -1,12 +1,18 @@
 """
 Script de prueba para validar los patrones de detección de episodios
+(utils/episode_parser.py)
 """
-import re
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Patrones para detectar episodios
-pattern_short = re.compile(r'(\d+)[xX](\d+)')
-pattern_spanish = re.compile(r'[Tt]emporada\s*(\d+)\s*[-–—]\s*[Cc]ap[ií]tulo\s*(\d+)', re.IGNORECASE)
-pattern_se_format = re.compile(r'[Ss](\d+)[Ee](\d+)')
+from utils.episode_parser import parse_episode
+
+FORMAT_NAMES = {
+    'spanish': 'Formato Español',
+    'se': 'Formato S##E##',
+    'short': 'Formato Corto',
+}
 
 # Casos de prueba
 test_cases = [
@@ -49,65 +55,30 @@ test_cases = [
     "Serie sin formato",
 ]
 
-print("=" * 60)
-print("PRUEBAS DE PATRONES DE DETECCIÓN DE EPISODIOS")
-print("=" * 60)
-
-for i, caption in enumerate(test_cases, 1):
-    print(f"\n📝 Caso {i}: {caption}")
-    print("-" * 60)
+def main():
+    print("=" * 60)
+    print("PRUEBAS DE PATRONES DE DETECCIÓN DE EPISODIOS")
+    print("=" * 60)
     
-    # Intentar con formato español primero
-    match_spanish = pattern_spanish.search(caption)
-    if match_spanish:
-        season = int(match_spanish.group(1))
-        episode = int(match_spanish.group(2))
-        print(f"✅ DETECTADO (Formato Español)")
-        print(f"   Temporada: {season}")
-        print(f"   Episodio: {episode}")
+    for i, caption in enumerate(test_cases, 1):
+        print(f"\n📝 Caso {i}: {caption}")
+        print("-" * 60)
         
-        # Extraer título
-        title_match = re.search(r'[Cc]ap[ií]tulo\s*\d+\s*[-–—]?\s*(.+)', caption)
-        if title_match:
-            title = title_match.group(1).strip()
-            print(f"   Título: {title}")
-        continue
-    
-    # Intentar con formato S##E##
-    match_se = pattern_se_format.search(caption)
-    if match_se:
-        season = int(match_se.group(1))
-        episode = int(match_se.group(2))
-        print(f"✅ DETECTADO (Formato S##E##)")
-        print(f"   Temporada: {season}")
-        print(f"   Episodio: {episode}")
-        
-        # Extraer título
-        title_match = re.search(r'[Ss]\d+[Ee]\d+\s*[-–—]?\s*(.+)', caption)
-        if title_match:
-            title = title_match.group(1).strip()
-            print(f"   Título: {title}")
-        continue
-    
-    # Intentar con formato corto
-    match_short = pattern_short.search(caption)
-    if match_short:
-        season = int(match_short.group(1))
-        episode = int(match_short.group(2))
-        print(f"✅ DETECTADO (Formato Corto)")
-        print(f"   Temporada: {season}")
-        print(f"   Episodio: {episode}")
+        parsed = parse_episode(caption)
+        if not parsed:
+            # No se detectó
+            print("❌ NO DETECTADO (Formato no válido)")
+            continue
         
-        # Extraer título
-        title_match = re.search(r'\d+[xX]\d+\s*[-–—]?\s*(.+)', caption)
-        if title_match:
-            title = title_match.group(1).strip()
-            print(f"   Título: {title}")
-        continue
+        print(f"✅ DETECTADO ({FORMAT_NAMES[parsed.format]})")
+        print(f"   Temporada: {parsed.season}")
+        print(f"   Episodio: {parsed.episode}")
+        if parsed.title:
+            print(f"   Título: {parsed.title}")
     
-    # No se detectó
-    print("❌ NO DETECTADO (Formato no válido)")
+    print("\n" + "=" * 60)
+    print("PRUEBAS COMPLETADAS")
+    print("=" * 60)
 
-print("\n" + "=" * 60)
-print("PRUEBAS COMPLETADAS")
-print("=" * 60)
+if __name__ == "__main__":
+    main()
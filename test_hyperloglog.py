@@ -0,0 +1,107 @@
+"""
+Script de prueba para el sketch HyperLogLog de /stats_canales
+Compara las estimaciones con el conteo exacto, la unión de sketches y los
+buckets que lee cada período
+"""
+import sys
+import os
+import random
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.hyperloglog import HyperLogLog
+from database.channel_rollups import period_ranges, visit_buckets, BucketTotals, HOUR, DAY, ALL
+
+# Error relativo aceptado (el típico con precisión 11 es ~2.3%)
+MAX_ERROR = 0.08
+
+def check_accuracy():
+    print("=" * 70)
+    print("PRECISIÓN DE LA ESTIMACIÓN")
+    print("=" * 70)
+    rng = random.Random(25)
+    failures = 0
+    for cardinality in (0, 1, 10, 100, 1000, 10000, 100000):
+        users = rng.sample(range(10 ** 9), cardinality)
+        sketch = HyperLogLog()
+        for user_id in users:
+            sketch.add(user_id)
+            sketch.add(user_id)  # Repetidos no cuentan
+        estimate = sketch.count()
+        error = abs(estimate - cardinality) / cardinality if cardinality else estimate
+        ok = error <= MAX_ERROR
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {cardinality:>7} únicos -> {estimate:>7} ({error:.1%})")
+    return failures
+
+def check_merge():
+    print("\n" + "=" * 70)
+    print("UNIÓN DE SKETCHES")
+    print("=" * 70)
+    rng = random.Random(7)
+    days = [rng.sample(range(50000), 3000) for _ in range(7)]
+    merged = HyperLogLog()
+    for day in days:
+        sketch = HyperLogLog()
+        for user_id in day:
+            sketch.add(user_id)
+        # Ida y vuelta por bytes, como en la columna users_sketch
+        merged.merge(HyperLogLog.from_bytes(sketch.to_bytes()))
+    exact = len(set().union(*days))
+    direct = HyperLogLog()
+    for day in days:
+        for user_id in day:
+            direct.add(user_id)
+    error = abs(merged.count() - exact) / exact
+    ok = merged.registers == direct.registers and error <= MAX_ERROR
+    print(f"{'✅' if ok else '❌'} 7 días: {exact} únicos -> {merged.count()} ({error:.1%})")
+    return 0 if ok else 1
+
+def check_periods():
+    print("\n" + "=" * 70)
+    print("BUCKETS POR PERÍODO")
+    print("=" * 70)
+    now = datetime(2026, 10, 17, 15, 42)
+    cases = [
+        ('today', [(DAY, datetime(2026, 10, 17), datetime(2026, 10, 18))]),
+        ('week', [(HOUR, datetime(2026, 10, 10, 15), datetime(2026, 10, 11)),
+                  (DAY, datetime(2026, 10, 11), datetime(2026, 10, 18))]),
+        ('month', [(HOUR, datetime(2026, 9, 17, 15), datetime(2026, 9, 18)),
+                   (DAY, datetime(2026, 9, 18), datetime(2026, 10, 18))]),
+        ('total', [(ALL, datetime(2020, 1, 1), datetime(2020, 1, 2))]),
+    ]
+    failures = 0
+    for period, expected in cases:
+        ok = period_ranges(period, now) == expected
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {period}")
+
+    # Cada visita de la última semana cae en exactamente un bucket de 'week'
+    rng = random.Random(3)
+    ranges = period_ranges('week', now)
+    for _ in range(2000):
+        visited_at = datetime(2026, 10, 10, 15) + (now - datetime(2026, 10, 10, 15)) * rng.random()
+        hits = sum(
+            1 for granularity, bucket_start in visit_buckets(visited_at)
+            for g, since, until in ranges
+            if g == granularity and since <= bucket_start < until
+        )
+        if hits != 1:
+            failures += 1
+            print(f"❌ visita {visited_at} cae en {hits} buckets")
+            break
+    else:
+        print("✅ visitas de la semana en un solo bucket")
+
+    totals = BucketTotals()
+    totals.add_visit(1, True, now)
+    totals.add_visit(1, False, now)
+    ok = (totals.visits, totals.new_users, totals.unique_users()) == (2, 1, 1)
+    failures += not ok
+    print(f"{'✅' if ok else '❌'} totales de un bucket")
+    return failures
+
+if __name__ == "__main__":
+    failures = check_accuracy() + check_merge() + check_periods()
+    print("\n" + ("✅ Todo OK" if not failures else f"❌ {failures} fallos"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,101 @@
+"""
+Script de prueba para el índice invertido de búsqueda de videos
+Compara el ranking del índice con el scoring lineal original
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.search_index import SearchIndex, normalize_text, split_search_terms
+
+# (id, título, título original)
+VIDEOS = [
+    (1, "Los Vengadores", "The Avengers"),
+    (2, "Spider-Man: Lejos de casa", "Spider-Man: Far from Home"),
+    (3, "Thor: Amor y Trueno", "Thor: Love and Thunder"),
+    (4, "El Señor de los Anillos", "The Lord of the Rings"),
+    (5, "Up", "Up"),
+    (6, "It", "It"),
+    (7, "Agentes de S.H.I.E.L.D.", "Agents of S.H.I.E.L.D."),
+    (8, "Avengers: Endgame", "Avengers: Endgame"),
+    (9, "Hulk", None),
+    (10, "Rápidos y Furiosos 7", "Furious 7"),
+]
+
+QUERIES = [
+    "vengadores", "spider", "up", "it", "thor amor", "de", "los",
+    "el señor", "s.h.i.e.l.d", "avengers end", "rapidos", "furious 7", "x",
+]
+
+def linear_search(query, limit=10):
+    """Scoring original de DatabaseManager.search_videos (recorrido lineal)"""
+    normalized_query = normalize_text(query)
+    search_terms = split_search_terms(normalized_query)
+
+    matching = []
+    for video_id, title, original in sorted(VIDEOS, reverse=True):
+        norm_title = normalize_text(title)
+        norm_original = normalize_text(original)
+        score = 0
+        matches = 0
+        if normalized_query in norm_title:
+            score += 100
+            matches = len(search_terms)
+        if normalized_query in norm_original:
+            score += 80
+            matches = len(search_terms)
+        for term in search_terms:
+            if len(term) >= 3:
+                if term in norm_title:
+                    score += 10
+                    matches += 1
+                if term in norm_original:
+                    score += 8
+                    matches += 1
+        if matches >= len(search_terms) and len(search_terms) > 1:
+            score += 50
+        if score > 0 and matches > 0:
+            matching.append((score, video_id))
+
+    matching.sort(reverse=True, key=lambda x: x[0])
+    return matching[:limit]
+
+def build_index():
+    index = SearchIndex([('title', 100, 10), ('original_title', 80, 8), ('tags', 0, 5)])
+    index.load(
+        ((video_id, (normalize_text(title), normalize_text(original), "")) for video_id, title, original in VIDEOS),
+        synced_at=0
+    )
+    return index
+
+def test_same_ranking_as_linear_scan():
+    """El índice debe dar exactamente el mismo ranking que el recorrido lineal"""
+    index = build_index()
+    for query in QUERIES:
+        expected = linear_search(query)
+        result = index.search(normalize_text(query))
+        status = "✅ PASS" if result == expected else "❌ FAIL"
+        print(f"{status} '{query}' → {result}")
+        assert result == expected
+
+def test_incremental_updates():
+    """upsert/remove deben reflejarse sin reconstruir el índice"""
+    index = build_index()
+
+    index.upsert(11, (normalize_text("Oppenheimer"), "", ""))
+    assert index.search("oppen") == [(110, 11)]
+
+    # Cambiar el título reemplaza los postings anteriores
+    index.upsert(11, (normalize_text("Barbie"), "", ""))
+    assert index.search("oppen") == []
+    assert index.search("barbie")[0][1] == 11
+
+    index.remove(11)
+    assert index.search("barbie") == []
+    print("✅ PASS actualizaciones incrementales")
+
+if __name__ == "__main__":
+    print("\n🧪 TESTING: Índice de búsqueda de videos\n")
+    test_same_ranking_as_linear_scan()
+    test_incremental_updates()
+    print("\n✅ Pruebas completadas\n")
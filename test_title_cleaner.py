@@ -0,0 +1,189 @@
+"""
+Script de prueba y benchmark del limpiador de títulos (utils/title_cleaner.py)
+
+Compara clean_title con la versión anterior (36 re.sub sin compilar, uno por
+patrón) sobre un corpus dorado: captions reales del canal más miles de
+combinaciones generadas de títulos, calidad, codecs, idioma y separadores.
+Después mide cuánto tarda cada versión en volver a limpiar un catálogo
+sintético de 10k+ títulos (lo que hace /reindexar_titulos).
+
+Uso: python test_title_cleaner.py [combinaciones] [tamaño del catálogo]
+"""
+import re
+import sys
+import os
+import time
+import random
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.title_cleaner import clean_title, NOISE_TOKENS
+
+# Versión anterior de clean_title
+LEGACY_PATTERNS = [
+    r'\[.*?\]',
+    r'\(.*?p\)',
+    r'\b\d{3,4}p\b',
+    r'\b4K\b',
+    r'\bUHD\b',
+    r'\bHD\b',
+    r'\bFHD\b',
+    r'\bBluRay\b',
+    r'\bBRRip\b',
+    r'\bWEBRip\b',
+    r'\bWEB-DL\b',
+    r'\bHDRip\b',
+    r'\bDVDRip\b',
+    r'\bx264\b',
+    r'\bx265\b',
+    r'\bHEVC\b',
+    r'\bh264\b',
+    r'\bh265\b',
+    r'\b10bit\b',
+    r'\bAAC\b',
+    r'\bAC3\b',
+    r'\bDTS\b',
+    r'\bLatino\b',
+    r'\bEspañol\b',
+    r'\bSpanish\b',
+    r'\bEnglish\b',
+    r'\bSubtitulado\b',
+    r'\bSubs\b',
+    r'\bDual\b',
+    r'\bExtended\b',
+    r'\bUnrated\b',
+    r'\bDirector\'?s? Cut\b',
+    r'\bREMAST(ER|ERED)\b',
+    r'\bIMAX\b',
+    r'\b-\s*\w+$',
+    r'\s+-\s+',
+]
+
+def legacy_year(text):
+    match = re.search(r'\((\d{4})\)', text)
+    if match:
+        return int(match.group(1))
+    match = re.search(r'\b(19\d{2}|20\d{2})\b', text)
+    if match:
+        return int(match.group(1))
+    return None
+
+def legacy_clean_title(text):
+    if not text:
+        return ""
+    year = legacy_year(text)
+    cleaned = re.sub(r'\(\d{4}\)', '', text)
+    for pattern in LEGACY_PATTERNS:
+        cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+    cleaned = re.sub(r'[_\.]', ' ', cleaned)
+    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+    cleaned = re.sub(r'^[^\w\s]+|[^\w\s]+$', '', cleaned)
+    return cleaned, year
+
+# Captions reales (y casos borde) del canal de almacenamiento
+GOLDEN_CAPTIONS = [
+    "",
+    "Avengers Endgame (2019) [1080p] [Latino] BluRay",
+    "Matrix.1999.1080p.BluRay.x264-YIFY",
+    "El Padrino (1972) (1080p) Dual Latino",
+    "Dune Parte Dos 2024 HDR RARBG",
+    "Oppenheimer (2023) [1080p] Dual Latino",
+    "Spider-Man: Across the Spider-Verse 2023 HD Latino",
+    "Avatar: El camino del agua (2022) 1080p Latino",
+    "Interstellar (2014) IMAX 2160p UHD HEVC 10bit",
+    "Blade Runner Director's Cut 1982 REMASTERED",
+    "Blade Runner Directors Cut (1982)",
+    "Aliens Director'HD Cut 1986",
+    "Aliens Director'IMAX Cut 1986",
+    "Gladiator Extended Unrated WEB-DL AAC",
+    "Gladiator.2000.WEB-DL.AC3.DTS.Subtitulado",
+    "Amélie (2001) Español Subs",
+    "Shrek_2_2004_DVDRip_Spanish_English",
+    "Titanic - 1997 - BRRip - x265 - h264",
+    "Toy Story 4 (2019) WEBRip - Latino",
+    "🎬 Coco (2017) 1080p 🍿",
+    "[Canal] Up: Una aventura de altura (2009)",
+    "Mad Max: Fury Road - Black & Chrome",
+    "Se7en (1995) FHD h265",
+    "1917 (2019) 4K",
+    "2001: Odisea del espacio (1968) REMASTER",
+    "Kill Bill Vol. 1 (2003) HDRip",
+    "Misión Imposible - Sentencia Mortal Parte 1 (2023)",
+    "WEB-DL",
+    "HD",
+    "- YIFY",
+    "...",
+]
+
+TITLES = [
+    "Avengers Endgame", "Matrix", "El Padrino", "Dune Parte Dos", "Coco",
+    "Spider-Man: No Way Home", "Amélie", "Se7en", "Kill Bill Vol. 1",
+    "Mad Max: Fury Road", "2001: Odisea del espacio", "Up", "Hd Hd",
+    "Director", "La La Land", "X-Men 2", "Remaster", "Shrek 2",
+]
+NOISE = [
+    "1080p", "720p", "2160p", "4K", "UHD", "HD", "hd", "FHD", "BluRay",
+    "BRRip", "WEBRip", "WEB-DL", "web-dl", "HDRip", "DVDRip", "x264", "X265",
+    "HEVC", "h264", "h265", "10bit", "AAC", "AC3", "DTS", "Latino",
+    "Español", "Spanish", "English", "Subtitulado", "Subs", "Dual",
+    "Extended", "Unrated", "Director's Cut", "Directors Cut", "Director Cut",
+    "REMASTER", "Remastered", "IMAX", "[1080p]", "[Latino]", "(720p)",
+    "(2019)", "2019", "1999", "- YIFY", "-RARBG", "Director'", "Cut",
+]
+SEPARATORS = [" ", ".", "_", " - ", "-", "  ", "'", " ."]
+
+def random_caption(rng):
+    parts = [rng.choice(NOISE) for _ in range(rng.randint(0, 6))]
+    # A veces el ruido va también antes del título
+    parts.insert(rng.randint(0, len(parts)) if rng.random() < 0.3 else 0, rng.choice(TITLES))
+    caption = parts[0]
+    for part in parts[1:]:
+        caption += rng.choice(SEPARATORS) + part
+    return caption
+
+def build_corpus(size, seed):
+    rng = random.Random(seed)
+    return GOLDEN_CAPTIONS + [random_caption(rng) for _ in range(size)]
+
+def main():
+    combinations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    catalog_size = int(sys.argv[2]) if len(sys.argv) > 2 else 12000
+
+    print("=" * 60)
+    print("LIMPIADOR DE TÍTULOS: RESULTADOS")
+    print("=" * 60)
+    print(f"{len(NOISE_TOKENS)} palabras de ruido compiladas al importar")
+    for caption in GOLDEN_CAPTIONS[:12]:
+        print(f"{caption[:50]!r:55} {clean_title(caption)!r}")
+
+    corpus = build_corpus(combinations, seed=17)
+    failures = 0
+    for caption in corpus:
+        new, old = clean_title(caption), legacy_clean_title(caption)
+        if new != old:
+            failures += 1
+            if failures <= 10:
+                print(f"❌ {caption!r}: {new!r} != {old!r}")
+    print(f"\n{len(corpus)} captions comparados, {failures} distintos")
+
+    print("\n" + "=" * 60)
+    print(f"BENCHMARK (catálogo de {catalog_size} títulos)")
+    print("=" * 60)
+    catalog = build_corpus(catalog_size, seed=2024)
+    timings = {}
+    for name, clean in (("anterior", legacy_clean_title), ("compilado", clean_title)):
+        start = time.perf_counter()
+        for caption in catalog:
+            clean(caption)
+        elapsed = time.perf_counter() - start
+        timings[name] = elapsed
+        per_title = elapsed / len(catalog) * 1e6
+        print(f"{name:12} {elapsed * 1000:8.1f} ms  ({per_title:.2f} µs/título)")
+    print(f"Aceleración: {timings['anterior'] / timings['compilado']:.2f}x")
+
+    if failures:
+        print(f"\n❌ {failures} captions con resultado distinto")
+        sys.exit(1)
+    print("\n✅ Mismos resultados que la versión anterior")
+
+if __name__ == "__main__":
+    main()
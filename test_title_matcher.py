@@ -0,0 +1,83 @@
+"""
+Script de prueba para el detector de títulos en mensajes de grupo
+Compara el autómata con una búsqueda lineal de cada título en el mensaje
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.search_index import normalize_text
+from database.title_matcher import TitleMatcher, title_patterns, _words
+
+# (tipo, id, título, título original)
+TITLES = [
+    ('movie', 1, "Los Vengadores", "The Avengers"),
+    ('movie', 2, "Spider-Man: Lejos de casa", "Spider-Man: Far from Home"),
+    ('movie', 3, "Thor: Amor y Trueno", "Thor: Love and Thunder"),
+    ('movie', 4, "Up", "Up"),
+    ('movie', 5, "Amélie", None),
+    ('movie', 6, "Rápidos y Furiosos 7", "Furious 7"),
+    ('series', 1, "La Casa de Papel", "Money Heist"),
+    ('series', 2, "Dark", None),
+    ('series', 3, "Thor", None),
+]
+
+# (mensaje, tipos esperados)
+MESSAGES = [
+    ("Alguien tiene Los Vengadores?", {'movie'}),
+    ("busco spider-man", {'movie'}),
+    ("spidermania en el cine", set()),
+    ("Donde veo Money Heist temporada 2", {'series'}),
+    ("Hola, up", set()),
+    ("AMELIE 2001", {'movie'}),
+    ("Thor: Love and Thunder", {'movie', 'series'}),
+    ("la casa", set()),
+    ("Dark temporada 1", {'series'}),
+    ("darkness", set()),
+]
+
+def build_matcher():
+    matcher = TitleMatcher()
+    matcher.load(
+        [(kind, doc_id, (normalize_text(title), normalize_text(original))) for kind, doc_id, title, original in TITLES],
+        synced_at=0
+    )
+    return matcher
+
+def linear_find(text):
+    haystack = _words(normalize_text(text))
+    found = set()
+    for kind, doc_id, title, original in TITLES:
+        if any(pattern in haystack for pattern in title_patterns((normalize_text(title), normalize_text(original)))):
+            found.add(kind)
+    return found
+
+def test_same_result_as_linear_scan():
+    matcher = build_matcher()
+    for message, expected in MESSAGES:
+        found = matcher.find(message)
+        assert found == expected == linear_find(message), (message, found, expected)
+    print(f"✅ PASS {len(MESSAGES)} mensajes iguales a la búsqueda lineal")
+
+def test_incremental_updates():
+    """upsert/remove se ven sin reconstruir el autómata"""
+    matcher = build_matcher()
+
+    matcher.upsert('movie', 7, (normalize_text("Oppenheimer"), ""))
+    assert matcher.find("alguien tiene oppenheimer") == {'movie'}
+
+    # Cambiar el título quita el anterior
+    matcher.upsert('movie', 7, (normalize_text("Barbie"), ""))
+    assert matcher.find("alguien tiene oppenheimer") == set()
+    assert matcher.find("Barbie 2023") == {'movie'}
+
+    # Un título compilado que se elimina deja de contar
+    matcher.remove('series', 2)
+    assert matcher.find("Dark temporada 1") == set()
+    print("✅ PASS actualizaciones incrementales")
+
+if __name__ == "__main__":
+    print("\n🧪 TESTING: Detector de títulos en grupos\n")
+    test_same_result_as_linear_scan()
+    test_incremental_updates()
+    print("\n✅ Pruebas completadas\n")
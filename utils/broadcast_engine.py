@@ -0,0 +1,255 @@
+"""
+Motor de envío masivo (broadcast) respetando los límites de Telegram
+
+- Un token bucket global (BROADCAST_RATE mensajes/s) reparte el ritmo entre
+  BROADCAST_CONCURRENCY envíos simultáneos.
+- Si un chat responde RetryAfter se espera lo indicado y se reintenta ese
+  chat; el bucket global también se frena ese tiempo, porque el flood
+  control de Telegram es por bot.
+- Los destinatarios llegan por lotes (por ejemplo desde
+  DatabaseManager.iter_user_id_batches) y nunca se cargan todos juntos.
+- El progreso se informa cada BROADCAST_PROGRESS_SECONDS, no cada N envíos.
+- LedgerWriter acumula los resultados y los escribe en la BD por lotes en
+  segundo plano, sin frenar los envíos.
+
+Los lotes llevan un checkpoint (por ejemplo el último users.id del lote);
+on_checkpoint se llama en orden cuando un lote y todos los anteriores
+terminaron, para poder reanudar un broadcast después de un reinicio.
+
+El mismo motor se usa para borrar o editar un broadcast: los destinatarios
+son entonces tuplas (chat_id, message_id) leídas del ledger.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config.settings import (
+    BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_SECONDS,
+    BROADCAST_LEDGER_BATCH_SIZE
+)
+from utils.rate_limit import TokenBucket, retry_after_seconds
+from utils.dead_chats import dead_chat_reason
+
+logger = logging.getLogger(__name__)
+
+# Reintentos por chat ante RetryAfter o errores de red
+MAX_ATTEMPTS = 3
+
+class BroadcastStats:
+    """Contadores de un broadcast en curso"""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.processed = 0
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0   # Chats muertos: bloquearon el bot, cuenta borrada o chat inexistente
+        self.retries = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def percentage(self):
+        return int(self.processed * 100 / self.total) if self.total else 100
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self):
+        """Mensajes procesados por segundo"""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Segundos estimados para terminar"""
+        remaining = max(self.total - self.processed, 0)
+        return remaining / self.rate if self.rate > 0 else 0.0
+
+class BroadcastEngine:
+    """Envía a muchos chats con concurrencia acotada bajo un token bucket global"""
+
+    def __init__(self, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY,
+                 progress_seconds=BROADCAST_PROGRESS_SECONDS):
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.progress_seconds = progress_seconds
+
+    async def run(self, batches, send, total=0, on_progress=None, on_result=None, on_checkpoint=None):
+        """
+        Ejecuta el broadcast.
+
+        Args:
+            batches: iterable asíncrono de (checkpoint, destinatarios); los
+                destinatarios son chat_id o cualquier valor que entienda `send`
+            send: corrutina send(destinatario) que envía el mensaje a un chat
+            total: cantidad esperada de chats (solo para el progreso)
+            on_progress: corrutina on_progress(stats), llamada como mucho
+                cada progress_seconds y una vez al final
+            on_result: corrutina on_result(destinatario, result, error) por
+                cada chat (result es lo que retornó send, o None si falló)
+            on_checkpoint: corrutina on_checkpoint(checkpoint, stats), llamada
+                en orden cuando terminó un lote y todos los anteriores
+
+        Returns:
+            BroadcastStats con los totales
+        """
+        stats = BroadcastStats(total)
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        # Lotes en curso: índice -> destinatarios sin terminar, en orden de llegada
+        remaining = {}
+        open_batches = deque()
+        checkpoint_lock = asyncio.Lock()
+
+        async def producer():
+            try:
+                index = 0
+                async for checkpoint, batch in batches:
+                    if not batch:
+                        continue
+                    remaining[index] = len(batch)
+                    open_batches.append((index, checkpoint))
+                    for chat_id in batch:
+                        await queue.put((index, chat_id))
+                    index += 1
+            finally:
+                # Aunque falle la lectura de la BD, los workers tienen que terminar
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def finish_item(index):
+            remaining[index] -= 1
+            async with checkpoint_lock:
+                while open_batches and remaining[open_batches[0][0]] == 0:
+                    done_index, checkpoint = open_batches.popleft()
+                    del remaining[done_index]
+                    if on_checkpoint is not None:
+                        try:
+                            await on_checkpoint(checkpoint, stats)
+                        except Exception as e:
+                            logger.error(f"Error guardando checkpoint {checkpoint}: {e}")
+
+        async def worker():
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                index, chat_id = entry
+                result, error = await self._send_one(chat_id, send, stats)
+                stats.processed += 1
+                if error is None:
+                    stats.sent += 1
+                else:
+                    stats.failed += 1
+                    if dead_chat_reason(error):
+                        stats.blocked += 1
+                if on_result is not None:
+                    try:
+                        await on_result(chat_id, result, error)
+                    except Exception as e:
+                        logger.error(f"Error registrando resultado de {chat_id}: {e}")
+                await finish_item(index)
+
+        async def reporter():
+            last_processed = -1
+            while True:
+                await asyncio.sleep(self.progress_seconds)
+                if stats.processed != last_processed:
+                    last_processed = stats.processed
+                    await self._report(on_progress, stats)
+
+        reporter_task = asyncio.create_task(reporter()) if on_progress else None
+        try:
+            await asyncio.gather(producer(), *[worker() for _ in range(self.concurrency)])
+        finally:
+            if reporter_task:
+                reporter_task.cancel()
+                await asyncio.gather(reporter_task, return_exceptions=True)
+
+        if stats.total < stats.processed:
+            stats.total = stats.processed
+        await self._report(on_progress, stats)
+        return stats
+
+    async def _send_one(self, chat_id, send, stats):
+        """Envía a un chat con reintentos. Retorna (resultado, error)"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await self.bucket.acquire()
+            try:
+                return await send(chat_id), None
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                # El flood control es por bot: frenar a todos, no solo a este chat
+                self.bucket.penalize(delay)
+                error = e
+            except (Forbidden, BadRequest) as e:
+                return None, e
+            except NetworkError as e:
+                delay = 2 ** attempt
+                error = e
+            except Exception as e:
+                logger.error(f"Error enviando a {chat_id}: {e}")
+                return None, e
+
+            if attempt < MAX_ATTEMPTS:
+                stats.retries += 1
+                await asyncio.sleep(delay)
+
+        logger.warning(f"Sin éxito enviando a {chat_id} tras {MAX_ATTEMPTS} intentos: {error}")
+        return None, error
+
+    @staticmethod
+    async def _report(on_progress, stats):
+        if on_progress is None:
+            return
+        try:
+            await on_progress(stats)
+        except Exception as e:
+            logger.error(f"Error actualizando progreso: {e}")
+
+class LedgerWriter:
+    """Acumula filas y las escribe por lotes en segundo plano"""
+
+    def __init__(self, write, batch_size=BROADCAST_LEDGER_BATCH_SIZE):
+        """
+        Args:
+            write: corrutina write(rows) que persiste un lote
+            batch_size: filas por lote
+        """
+        self._write_batch = write
+        self.batch_size = batch_size
+        self._rows = []
+        self._tasks = set()
+        self._lock = asyncio.Lock()
+
+    def add(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._schedule()
+
+    def _schedule(self):
+        rows, self._rows = self._rows, []
+        task = asyncio.create_task(self._write(rows))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, rows):
+        # Un lote a la vez: no ocupa más de una conexión del pool
+        async with self._lock:
+            try:
+                await self._write_batch(rows)
+            except Exception as e:
+                logger.error(f"Error escribiendo {len(rows)} filas del ledger: {e}")
+
+    async def flush(self):
+        """Escribe lo pendiente y espera a que terminen todos los lotes"""
+        if self._rows:
+            self._schedule()
+        await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
@@ -0,0 +1,290 @@
+"""
+Backfill histórico del canal de almacenamiento
+
+Los videos nuevos entran a la cola de indexación (pending_videos) por
+channel_post; los publicados antes de eso se recuperan con este backfill:
+
+- El canal se recorre en ventanas de hasta 100 message_ids.
+- forward_messages/copy_messages solo devuelven los MessageId creados, no el
+  contenido. Para leer file_id y caption hay que hacer un forward_message
+  por id hacia un chat privado de trabajo.
+- Mientras el canal es denso (la tanda anterior no tuvo ventanas vacías) cada
+  ventana cuesta un forward_message por id: N llamadas y un mensaje en el
+  chat de trabajo por cada mensaje existente. Si aparecen PROBE_AFTER_MISSES
+  ids seguidos sin mensaje, el resto de la ventana se sondea como abajo.
+- Al empezar y después de una ventana vacía, cada ventana se sondea primero
+  con una sola llamada a forward_messages: si no devuelve nada, la ventana
+  está vacía y cuesta 1 llamada. Si tiene k mensajes, cuesta además los
+  forward_message por id hasta encontrar los k (los mensajes se reenvían dos
+  veces: 2k mensajes en el chat de trabajo).
+- Los ids que ya están en la cola, en videos o en episodios no se sondean.
+- BACKFILL_CONCURRENCY ventanas a la vez, bajo un token bucket (BACKFILL_RATE)
+  y respetando los RetryAfter de Telegram.
+- El progreso se guarda en BotConfig ('backfill_last_message') después de
+  cada tanda de ventanas, para poder reanudar.
+- Al final se borran todos los mensajes del chat de trabajo con
+  delete_messages (100 por llamada).
+"""
+import asyncio
+import logging
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config.settings import (
+    STORAGE_CHANNEL_ID, BACKFILL_WINDOW, BACKFILL_CONCURRENCY,
+    BACKFILL_RATE, BACKFILL_MAX_EMPTY_WINDOWS
+)
+from utils.rate_limit import TokenBucket, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = 'backfill_last_message'
+
+# Límite de ids por llamada de forward_messages/delete_messages en la Bot API
+MAX_IDS_PER_CALL = 100
+MAX_ATTEMPTS = 5
+# Sin sondeo, ids seguidos sin mensaje antes de sondear el resto de la ventana
+PROBE_AFTER_MISSES = 5
+
+def _naive_utc(value):
+    # Las columnas DateTime de los modelos son UTC sin zona horaria
+    return value.replace(tzinfo=None) if value else None
+
+def _seconds(duration):
+    # python-telegram-bot puede entregar la duración como int o como timedelta
+    if duration is None:
+        return None
+    return int(duration.total_seconds()) if hasattr(duration, 'total_seconds') else int(duration)
+
+def pending_video_fields(message):
+    """
+    Datos del video de un mensaje para DatabaseManager.upsert_pending_video
+    (sin message_id: en un reenvío el id del mensaje no es el del canal)
+    """
+    video = message.video
+    # En un reenvío la fecha del post original está en forward_origin
+    origin = getattr(message, 'forward_origin', None)
+    return {
+        'file_id': video.file_id,
+        'file_unique_id': video.file_unique_id,
+        'caption': message.caption,
+        'file_name': video.file_name,
+        'mime_type': video.mime_type,
+        'file_size': video.file_size,
+        'duration': _seconds(video.duration),
+        'posted_at': _naive_utc(getattr(origin, 'date', None) or message.date),
+    }
+
+class BackfillStats:
+    """Contadores de un backfill"""
+
+    def __init__(self, start_id):
+        self.start_id = start_id
+        self.last_message_id = start_id - 1  # Checkpoint: todo hasta aquí ya se revisó
+        self.windows = 0
+        self.empty_windows = 0
+        self.skipped_known = 0   # ids que ya estaban en la BD
+        self.messages = 0        # mensajes existentes encontrados
+        self.videos = 0          # videos agregados a la cola
+        self.api_calls = 0
+        self.retries = 0
+
+class ChannelBackfill:
+    """Recorre el historial del canal de almacenamiento y llena la cola de indexación"""
+
+    def __init__(self, bot, db, scratch_chat_id, window=BACKFILL_WINDOW,
+                 concurrency=BACKFILL_CONCURRENCY, rate=BACKFILL_RATE,
+                 max_empty_windows=BACKFILL_MAX_EMPTY_WINDOWS):
+        self.bot = bot
+        self.db = db
+        self.scratch_chat_id = scratch_chat_id
+        self.window = max(1, min(window, MAX_IDS_PER_CALL))
+        self.concurrency = max(1, concurrency)
+        self.max_empty_windows = max_empty_windows
+        self.bucket = TokenBucket(rate)
+        self._scratch_ids = []
+
+    async def run(self, start_id, end_id=None, on_progress=None):
+        """
+        Ejecuta el backfill desde start_id.
+
+        Args:
+            start_id: primer message_id a revisar
+            end_id: último message_id; si es None se termina tras
+                max_empty_windows ventanas vacías seguidas
+            on_progress: corrutina on_progress(stats) llamada tras cada tanda
+
+        Returns:
+            BackfillStats con los totales
+        """
+        stats = BackfillStats(start_id)
+        # Sondear con forward_messages solo al empezar y tras una ventana vacía
+        probe = True
+        consecutive_empty = 0
+        last_non_empty_id = start_id - 1
+        next_id = start_id
+
+        try:
+            while end_id is None or next_id <= end_id:
+                # Una tanda de ventanas contiguas que se procesan en paralelo
+                windows = []
+                for _ in range(self.concurrency):
+                    if end_id is not None and next_id > end_id:
+                        break
+                    last_id = next_id + self.window - 1
+                    if end_id is not None:
+                        last_id = min(last_id, end_id)
+                    windows.append((next_id, last_id))
+                    next_id = last_id + 1
+
+                results = await asyncio.gather(
+                    *[self._process_window(first_id, last_id, stats, probe) for first_id, last_id in windows]
+                )
+                probe = any(found == 0 for found in results)
+
+                # Las ventanas vacías se cuentan en orden: cortan si las últimas
+                # max_empty_windows revisadas están vacías
+                for (first_id, last_id), found in zip(windows, results):
+                    stats.windows += 1
+                    if found == 0:
+                        stats.empty_windows += 1
+                        consecutive_empty += 1
+                    else:
+                        consecutive_empty = 0
+                        last_non_empty_id = last_id
+                finished = end_id is None and consecutive_empty >= self.max_empty_windows
+
+                stats.last_message_id = windows[-1][1]
+                await self.db.set_config(CHECKPOINT_KEY, str(stats.last_message_id))
+
+                if on_progress is not None:
+                    try:
+                        await on_progress(stats)
+                    except Exception as e:
+                        logger.error(f"Error actualizando progreso del backfill: {e}")
+
+                if finished:
+                    # El checkpoint no avanza sobre las ventanas vacías del final:
+                    # la próxima vez se vuelven a revisar por si se publicó algo
+                    stats.last_message_id = last_non_empty_id
+                    await self.db.set_config(CHECKPOINT_KEY, str(stats.last_message_id))
+                    break
+        finally:
+            await self.cleanup(stats)
+
+        return stats
+
+    async def _process_window(self, first_id, last_id, stats, probe):
+        """
+        Revisa una ventana de ids.
+
+        Args:
+            probe: sondear primero la ventana entera con forward_messages
+                (conviene si puede estar vacía; en un tramo denso solo duplica
+                los reenvíos)
+
+        Returns:
+            cantidad de mensajes existentes encontrados (0 = ventana vacía),
+            o -1 si todos los ids ya estaban en la BD
+        """
+        known = await self.db.get_known_storage_message_ids(first_id, last_id)
+        message_ids = [msg_id for msg_id in range(first_id, last_id + 1) if msg_id not in known]
+        stats.skipped_known += len(known)
+        if not message_ids:
+            return -1
+
+        # Sondeo: una llamada para toda la ventana
+        expected = None
+        if probe:
+            expected = await self._probe(message_ids, stats)
+            if expected == 0:
+                return 0
+
+        # Contenido: un forward por id (con sondeo, hasta encontrar todos los que existen)
+        found = 0
+        misses = 0
+        for position, msg_id in enumerate(message_ids):
+            if expected is not None and found >= expected:
+                break
+            if expected is None and misses >= PROBE_AFTER_MISSES:
+                # Sin sondeo y varios ids seguidos sin mensaje: sondear el resto
+                remaining = await self._probe(message_ids[position:], stats)
+                if remaining == 0:
+                    break
+                expected = found + remaining
+            try:
+                message = await self._call(
+                    stats, self.bot.forward_message,
+                    chat_id=self.scratch_chat_id,
+                    from_chat_id=STORAGE_CHANNEL_ID,
+                    message_id=msg_id,
+                    disable_notification=True
+                )
+            except BadRequest:
+                # No existe (o no se puede reenviar)
+                misses += 1
+                continue
+            self._scratch_ids.append(message.message_id)
+            found += 1
+            misses = 0
+
+            if message.video:
+                try:
+                    await self.db.upsert_pending_video(message_id=msg_id, **pending_video_fields(message))
+                    stats.videos += 1
+                except Exception as e:
+                    logger.error(f"Error guardando video {msg_id} del backfill: {e}")
+
+        stats.messages += found
+        return found
+
+    async def _probe(self, message_ids, stats):
+        """Reenvía los ids con una sola llamada y devuelve cuántos existen"""
+        try:
+            probed = await self._call(
+                stats, self.bot.forward_messages,
+                chat_id=self.scratch_chat_id,
+                from_chat_id=STORAGE_CHANNEL_ID,
+                message_ids=message_ids,
+                disable_notification=True
+            )
+        except BadRequest as e:
+            # Ningún id se pudo reenviar
+            logger.debug(f"Ids {message_ids[0]}-{message_ids[-1]} vacíos: {e}")
+            return 0
+        self._scratch_ids.extend(m.message_id for m in probed)
+        return len(probed)
+
+    async def _call(self, stats, method, **kwargs):
+        """Llama a la Bot API bajo el token bucket, reintentando 429 y errores de red"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await self.bucket.acquire()
+            stats.api_calls += 1
+            try:
+                return await method(**kwargs)
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                # El flood control es por bot: frenar todas las ventanas
+                self.bucket.penalize(delay)
+                error = e
+            except (BadRequest, Forbidden):
+                raise
+            except NetworkError as e:
+                delay = 2 ** attempt
+                error = e
+
+            if attempt < MAX_ATTEMPTS:
+                stats.retries += 1
+                await asyncio.sleep(delay)
+        raise error
+
+    async def cleanup(self, stats=None):
+        """Borra del chat de trabajo todos los mensajes reenviados, 100 por llamada"""
+        stats = stats or BackfillStats(0)
+        scratch_ids, self._scratch_ids = self._scratch_ids, []
+        for i in range(0, len(scratch_ids), MAX_IDS_PER_CALL):
+            chunk = scratch_ids[i:i + MAX_IDS_PER_CALL]
+            try:
+                await self._call(stats, self.bot.delete_messages, chat_id=self.scratch_chat_id, message_ids=chunk)
+            except Exception as e:
+                logger.warning(f"No se pudieron borrar {len(chunk)} mensajes del chat de trabajo: {e}")
@@ -0,0 +1,39 @@
+"""
+Detección de chats muertos (usuarios que bloquearon el bot o borraron la cuenta)
+
+Los envíos que fallan con Forbidden o "Chat not found" marcan al usuario como
+no alcanzable (users.is_reachable = False); los broadcasts solo recorren los
+alcanzables. Un my_chat_member con estado 'member' lo vuelve a habilitar.
+"""
+import logging
+
+from telegram.error import BadRequest, Forbidden
+
+logger = logging.getLogger(__name__)
+
+def dead_chat_reason(error):
+    """
+    Motivo por el que el chat ya no recibe mensajes, o None si el error es otro.
+
+    Returns:
+        'blocked', 'deactivated', 'not_found' o None
+    """
+    message = str(error).lower()
+    if isinstance(error, Forbidden):
+        if 'deactivated' in message:
+            return 'deactivated'
+        return 'blocked'
+    if isinstance(error, BadRequest) and 'chat not found' in message:
+        return 'not_found'
+    return None
+
+async def record_if_dead(db, chat_id, error):
+    """Marca al usuario como no alcanzable si el error lo indica. Retorna True si lo marcó"""
+    reason = dead_chat_reason(error)
+    if reason is None:
+        return False
+    try:
+        await db.mark_users_unreachable([chat_id], reason)
+    except Exception as e:
+        logger.error(f"Error marcando chat {chat_id} como no alcanzable: {e}")
+    return True
@@ -0,0 +1,366 @@
+"""
+Cola de entregas de videos/episodios después de ver el anuncio
+
+Reemplaza al hilo por petición de /api/ad-completed: una sola cola acotada
+con un número fijo de workers que corren en el loop de la API y comparten
+el DatabaseManager (engine/pool) y un único Bot.
+
+- Backpressure: si la cola está llena, submit() retorna 'full' y el endpoint
+  responde 503 para que la Mini App reintente.
+- De-duplicación: un (user_id, content_type, content_id) pendiente, en curso
+  o entregado hace menos de DELIVERY_DEDUP_SECONDS no se vuelve a encolar.
+- Reintentos: RetryAfter (429) espera lo que pide Telegram. Los errores de
+  red y 5xx reintentan con backoff exponencial solo en los mensajes de
+  texto: un send_video/send_photo que dio timeout suele haberse entregado
+  igual, y reintentarlo le duplica el archivo al usuario.
+- Una vez enviado el video la entrega cuenta como hecha aunque falle el
+  mensaje final con el menú.
+"""
+import asyncio
+import io
+import logging
+import time
+from collections import deque
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config.settings import (
+    BOT_TOKEN, DELIVERY_WORKERS, DELIVERY_QUEUE_SIZE,
+    DELIVERY_DEDUP_SECONDS, DELIVERY_MAX_RETRIES
+)
+from utils.rate_limit import retry_after_seconds
+from utils.dead_chats import record_if_dead
+
+logger = logging.getLogger(__name__)
+
+# Muestras de latencia que se guardan para los percentiles de /health
+LATENCY_SAMPLES = 500
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+class DeliveryQueue:
+    """Cola acotada de entregas con pool fijo de workers"""
+
+    def __init__(self, workers=DELIVERY_WORKERS, max_size=DELIVERY_QUEUE_SIZE,
+                 dedup_seconds=DELIVERY_DEDUP_SECONDS, max_retries=DELIVERY_MAX_RETRIES):
+        self.workers = workers
+        self.max_size = max_size
+        self.dedup_seconds = dedup_seconds
+        self.max_retries = max_retries
+
+        self.db = None
+        self.bot = None
+        self._queue = None
+        self._tasks = []
+        self._active = {}     # clave -> 'pending' | 'sending'
+        self._delivered = {}  # clave -> momento de la entrega (monotonic)
+
+        self.enqueued = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self._wait_ms = deque(maxlen=LATENCY_SAMPLES)
+        self._total_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def started(self):
+        return self._queue is not None
+
+    async def start(self, db, bot=None):
+        """Crea la cola y los workers (llamar desde el loop donde van a correr)"""
+        if self.started:
+            return
+        self.db = db
+        if bot is None:
+            bot = Bot(token=BOT_TOKEN)
+            await bot.initialize()
+        self.bot = bot
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"delivery-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Cola de entregas iniciada: {self.workers} workers, capacidad {self.max_size}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.bot is not None:
+            await self.bot.shutdown()
+
+    def _expire_delivered(self, now):
+        expired = [key for key, at in self._delivered.items() if now - at > self.dedup_seconds]
+        for key in expired:
+            del self._delivered[key]
+
+    async def submit(self, user_id, content_id, content_type='movie'):
+        """
+        Encola una entrega.
+
+        Returns:
+            'queued', 'duplicate' (ya pendiente o entregada hace poco) o 'full'
+        """
+        key = (user_id, content_type, content_id)
+        now = time.monotonic()
+        self._expire_delivered(now)
+
+        if key in self._active or key in self._delivered:
+            self.duplicates += 1
+            return 'duplicate'
+
+        try:
+            self._queue.put_nowait((key, now))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 'full'
+
+        self._active[key] = 'pending'
+        self.enqueued += 1
+        return 'queued'
+
+    async def _worker(self):
+        while True:
+            key, queued_at = await self._queue.get()
+            started_at = time.monotonic()
+            self._wait_ms.append((started_at - queued_at) * 1000)
+            self._active[key] = 'sending'
+
+            user_id, content_type, content_id = key
+            try:
+                if content_type == 'episode':
+                    ok = await self._deliver_episode(user_id, content_id)
+                else:
+                    ok = await self._deliver_movie(user_id, content_id)
+            except Exception as e:
+                logger.error(f"Error entregando {content_type} {content_id} a {user_id}: {e}", exc_info=True)
+                ok = False
+            finally:
+                self._active.pop(key, None)
+                self._queue.task_done()
+
+            finished_at = time.monotonic()
+            self._total_ms.append((finished_at - queued_at) * 1000)
+            if ok:
+                self.delivered += 1
+                self._delivered[key] = finished_at
+            else:
+                # Sin marca de entregado: el usuario puede volver a pedirlo
+                self.failed += 1
+
+    async def _call(self, method, retry_network=True, **kwargs):
+        """
+        Llama a un método del Bot reintentando 429 y, si retry_network, errores
+        de red y 5xx (no para envíos de archivos: pueden haber llegado igual)
+        """
+        attempt = 0
+        while True:
+            # Un archivo en memoria queda al final tras un intento: rebobinarlo
+            for value in kwargs.values():
+                if isinstance(value, io.IOBase):
+                    value.seek(0)
+            try:
+                return await method(**kwargs)
+            except RetryAfter as e:
+                error, delay = e, retry_after_seconds(e)
+            except (BadRequest, Forbidden):
+                # Errores del pedido o bot bloqueado: reintentar no sirve
+                raise
+            except NetworkError as e:
+                if not retry_network:
+                    raise
+                # Incluye TimedOut y las respuestas 5xx de la Bot API
+                error, delay = e, 2 ** attempt
+                logger.warning(f"Error de red en {method.__name__}: {e}")
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _notify_error(self, user_id, text):
+        try:
+            await self._call(self.bot.send_message, chat_id=user_id, text=text)
+        except Exception:
+            pass
+
+    async def _deliver_episode(self, user_id, episode_id):
+        episode = await self.db.get_episode_by_id(episode_id)
+        if not episode:
+            logger.warning(f"Episodio no encontrado para entregar: {episode_id}")
+            return False
+
+        show = await self.db.get_tv_show_by_id(episode.tv_show_id)
+        if not show:
+            logger.warning(f"Serie no encontrada para entregar: {episode.tv_show_id}")
+            return False
+
+        logger.info(f"Enviando episodio: {show.name} S{episode.season_number}x{episode.episode_number:02d} a user_id={user_id}")
+
+        caption = f"📺 <b>{show.name}</b>\n"
+        caption += f"🎬 Temporada {episode.season_number}, Episodio {episode.episode_number}\n"
+        if episode.title:
+            caption += f"📝 {episode.title}\n"
+        if episode.air_date:
+            caption += f"📅 {episode.air_date}\n"
+        if episode.overview:
+            caption += f"\n{episode.overview}\n"
+
+        try:
+            await self._call(
+                self.bot.send_video,
+                retry_network=False,
+                chat_id=user_id,
+                video=episode.file_id,
+                caption=caption,
+                parse_mode='HTML',
+                protect_content=True,
+                read_timeout=60,
+                write_timeout=60,
+                connect_timeout=60
+            )
+        except Exception as e:
+            logger.error(f"Error enviando episodio: {e}")
+            # Si bloqueó el bot no tiene sentido avisarle: se marca como no alcanzable
+            if not await record_if_dead(self.db, user_id, e):
+                await self._notify_error(
+                    user_id, "❌ Hubo un error al enviar el episodio. Por favor intenta de nuevo más tarde."
+                )
+            return False
+
+        try:
+            await self._call(
+                self.bot.send_message,
+                chat_id=user_id,
+                text="✅ ¡Disfruta el episodio!\n\nUsa /start para continuar navegando."
+            )
+        except Exception as e:
+            # El episodio ya llegó: la entrega cuenta como hecha
+            logger.warning(f"Error enviando mensaje final a {user_id}: {e}")
+        return True
+
+    async def _download_poster(self, url):
+        import requests as req
+
+        # requests es bloqueante: se descarga en un hilo para no frenar el loop
+        response = await asyncio.to_thread(req.get, url, timeout=10)
+        response.raise_for_status()
+        photo = io.BytesIO(response.content)
+        photo.name = "poster.jpg"
+        return photo
+
+    async def _deliver_movie(self, user_id, video_id):
+        video = await self.db.get_video_by_id(video_id)
+        if not video:
+            logger.warning(f"Video no encontrado para entregar: {video_id}")
+            return False
+
+        logger.info(f"Enviando video: {video.title} a user_id={user_id}")
+
+        # Si tiene poster, enviarlo primero
+        if video.poster_url:
+            try:
+                caption = f"🎬 <b>{video.title}</b>\n"
+                if video.year:
+                    caption += f"📅 {video.year}\n"
+                if video.vote_average:
+                    caption += f"⭐ {video.vote_average/10:.1f}/10\n"
+                if video.runtime:
+                    caption += f"⏱️ {video.runtime} min\n"
+                if video.genres:
+                    caption += f"🎭 {video.genres}\n"
+                if video.overview:
+                    caption += f"\n📝 {video.overview}\n"
+
+                photo = await self._download_poster(video.poster_url)
+                await self._call(
+                    self.bot.send_photo,
+                    retry_network=False,
+                    chat_id=user_id,
+                    photo=photo,
+                    caption=caption,
+                    parse_mode="HTML"
+                )
+            except Exception as e:
+                logger.warning(f"Error enviando poster: {e}")
+
+        caption_text = f"📹 *{video.title}*"
+        if video.description:
+            caption_text += f"\n\n{video.description}"
+
+        try:
+            await self._call(
+                self.bot.send_video,
+                retry_network=False,
+                chat_id=user_id,
+                video=video.file_id,
+                caption=caption_text,
+                parse_mode='Markdown',
+                protect_content=True,
+                read_timeout=60,
+                write_timeout=60,
+                connect_timeout=60
+            )
+        except Exception as e:
+            logger.error(f"Error enviando video: {e}")
+            # Si bloqueó el bot no tiene sentido avisarle: se marca como no alcanzable
+            if not await record_if_dead(self.db, user_id, e):
+                await self._notify_error(
+                    user_id, "❌ Hubo un error al enviar el archivo de video. Por favor intenta de nuevo más tarde."
+                )
+            return False
+
+        keyboard = [
+            [
+                InlineKeyboardButton("🎬 Películas", callback_data="menu_movies"),
+                InlineKeyboardButton("📺 Series", callback_data="menu_series")
+            ]
+        ]
+        try:
+            await self._call(
+                self.bot.send_message,
+                chat_id=user_id,
+                text="🍿 <b>¿Qué quieres ver?</b>\n\nSelecciona una opción:",
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='HTML'
+            )
+        except Exception as e:
+            # El video ya llegó: la entrega cuenta como hecha
+            logger.warning(f"Error enviando menú a {user_id}: {e}")
+        return True
+
+    def stats(self):
+        """Métricas de la cola; solo desde el loop de los workers (recorre _active)"""
+        wait_ms = list(self._wait_ms)
+        total_ms = list(self._total_ms)
+        return {
+            'started': self.started,
+            'workers': len(self._tasks),
+            'queue_depth': self._queue.qsize() if self.started else 0,
+            'queue_capacity': self.max_size,
+            'in_flight': sum(1 for state in self._active.values() if state == 'sending'),
+            'enqueued': self.enqueued,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'retries': self.retries,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'wait_ms_p50': round(_percentile(wait_ms, 50), 1),
+            'wait_ms_p95': round(_percentile(wait_ms, 95), 1),
+            'total_ms_p50': round(_percentile(total_ms, 50), 1),
+            'total_ms_p95': round(_percentile(total_ms, 95), 1),
+        }
+
+    async def async_stats(self):
+        """Métricas para /health: se piden con run_async desde los hilos de Flask"""
+        return self.stats()
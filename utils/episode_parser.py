@@ -0,0 +1,84 @@
+"""
+Parser de episodios en captions y mensajes
+
+Formatos soportados (en este orden de prioridad, igual que antes):
+- Temporada 2 - Capítulo 14 (formato español, sin distinguir mayúsculas)
+- Breaking Bad - S01E01 - 1080p.mp4 (formato S##E##)
+- 1x1, 2x14 y 🔻Lucifer — 02x01 — Audio Latino (formato corto / emoji-dash)
+
+Todos los formatos están en una sola expresión compilada que devuelve
+temporada, episodio y título en el mismo match, sin un segundo re.search
+para el título. La expresión empieza por una clase de caracteres
+([TtSs0-9]) para que el motor de re salte rápido las posiciones donde no
+puede empezar ningún formato; cada rama confirma su primer carácter con un
+lookbehind.
+
+La búsqueda devuelve el formato que aparece primero en el texto. Solo si
+ese no es el de mayor prioridad se busca, desde ahí en adelante, un formato
+de prioridad más alta (caso raro: "1x1 ... S01E01").
+"""
+import re
+from typing import NamedTuple, Optional
+
+# Separador opcional entre el número de episodio y el título (hasta fin de línea)
+_TITLE = r'(?:\s*[-–—]?\s*(.+))?'
+
+# Formato español: Temporada 2 - Capítulo 14 (grupos 1-3)
+_SPANISH = r'(?<=[Tt])(?i:emporada)\s*(\d+)\s*[-–—]\s*(?i:cap[ií]tulo)\s*(\d+)' + _TITLE
+# Formato S##E##: S01E01 (grupos 4-6)
+_SE = r'(?<=[Ss])(\d+)[Ee](\d+)' + _TITLE
+# Formato corto: 1x1, "— 02x01 —" (grupos 7-9; el primer dígito de la
+# temporada es el carácter de la clase inicial)
+_SHORT = r'(?<=\d)(\d*)[xX](\d+)' + _TITLE
+
+EPISODE_PATTERN = re.compile(r'[TtSs0-9](?:' + _SPANISH + '|' + _SE + '|' + _SHORT + ')')
+
+# Formatos de mayor prioridad que uno dado, para el caso raro de varios formatos
+_HIGHER_PRIORITY = {
+    4: re.compile(r'[Tt](?:' + _SPANISH + ')'),
+    7: re.compile(r'[TtSs](?:' + _SPANISH + '|' + _SE + ')'),
+}
+
+_FORMAT_NAMES = {1: 'spanish', 4: 'se', 7: 'short'}
+
+# Solo el formato corto: es el que enruta las respuestas de admin a
+# index_episode_reply sin capturar búsquedas normales como "s01e01"
+SHORT_EPISODE_PATTERN = re.compile(r'\d+[xX]\d+')
+
+class EpisodeMatch(NamedTuple):
+    season: int
+    episode: int
+    title: Optional[str]  # None si no hay texto después del número de episodio
+    format: str           # 'spanish', 'se' o 'short'
+
+def parse_episode(text):
+    """
+    Detecta temporada, episodio y título en un caption.
+
+    Returns:
+        EpisodeMatch o None si el texto no tiene un episodio
+    """
+    if not text:
+        return None
+    match = EPISODE_PATTERN.search(text)
+    if match is None:
+        return None
+
+    while True:
+        group = 1 if match.start(1) >= 0 else 4 if match.start(4) >= 0 else 7
+        if group == 1:
+            break
+        higher = _HIGHER_PRIORITY[group].search(text, match.start() + 1)
+        if higher is None:
+            break
+        match = higher
+
+    season, episode, title = match.group(group, group + 1, group + 2)
+    if group == 7:
+        season = text[match.start()] + season
+    return EpisodeMatch(
+        int(season),
+        int(episode),
+        title.strip() if title is not None else None,
+        _FORMAT_NAMES[group]
+    )
@@ -0,0 +1,111 @@
+"""
+Caché de respuestas y control de flood para la búsqueda automática en grupos
+
+- GroupResponseCache: por chat, la decisión tomada para cada query
+  normalizada (la tarjeta de resultados ya armada, o None si no había que
+  responder) durante un TTL. Las entradas se invalidan si cambia el
+  catálogo (catalog_version), así un título recién agregado se encuentra.
+- GroupReplyLimiter: token bucket por grupo (MAX_RESPONSES_PER_HOUR con una
+  ráfaga corta), intervalo mínimo entre respuestas en el mismo grupo y un
+  token bucket global para todos los grupos, para que un grupo con spam no
+  se lleve la BD ni el cupo de envíos de Telegram de los chats privados.
+
+Ambos guardan como máximo `max_chats` grupos (LRU).
+"""
+import time
+from collections import OrderedDict
+
+from database.catalog_snapshot import catalog_version
+from utils.rate_limit import TokenBucket
+
+class CachedReply:
+    """Decisión cacheada para una query en un grupo"""
+
+    def __init__(self, card, expires_at, version):
+        self.card = card  # (texto, reply_markup) o None si no se responde
+        self.expires_at = expires_at
+        self.version = version
+        self.sent_at = None  # última vez que se envió la tarjeta en el grupo
+
+class GroupResponseCache:
+    """Caché TTL por grupo: chat_id -> {query normalizada: CachedReply}"""
+
+    def __init__(self, ttl, max_queries_per_chat, max_chats):
+        self.ttl = ttl
+        self.max_queries_per_chat = max_queries_per_chat
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id, key):
+        """CachedReply vigente para la query, o None"""
+        queries = self._chats.get(chat_id)
+        entry = queries.get(key) if queries is not None else None
+        if entry is None or entry.expires_at <= time.monotonic() or entry.version != catalog_version.value:
+            if entry is not None:
+                del queries[key]
+            self.misses += 1
+            return None
+        self._chats.move_to_end(chat_id)
+        queries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, chat_id, key, card):
+        """Guarda la decisión para la query (card=None: no responder)"""
+        queries = self._chats.get(chat_id)
+        if queries is None:
+            queries = self._chats[chat_id] = OrderedDict()
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        self._chats.move_to_end(chat_id)
+
+        entry = CachedReply(card, time.monotonic() + self.ttl, catalog_version.value)
+        queries[key] = entry
+        queries.move_to_end(key)
+        while len(queries) > self.max_queries_per_chat:
+            queries.popitem(last=False)
+        return entry
+
+class GroupReplyLimiter:
+    """Límite de respuestas automáticas por grupo y global"""
+
+    def __init__(self, per_group_per_hour, group_burst, min_interval,
+                 global_per_minute, global_burst, max_chats):
+        self.per_group_rate = per_group_per_hour / 3600
+        self.group_burst = group_burst
+        self.min_interval = min_interval
+        self.max_chats = max_chats
+        self.global_bucket = TokenBucket(global_per_minute / 60, capacity=global_burst)
+        self._groups = OrderedDict()  # chat_id -> [TokenBucket, última respuesta]
+        self.rejected = 0
+
+    def _group(self, chat_id):
+        group = self._groups.get(chat_id)
+        if group is None:
+            group = self._groups[chat_id] = [TokenBucket(self.per_group_rate, capacity=self.group_burst), 0.0]
+            while len(self._groups) > self.max_chats:
+                self._groups.popitem(last=False)
+        self._groups.move_to_end(chat_id)
+        return group
+
+    def can_reply(self, chat_id):
+        """True si el grupo podría recibir una respuesta ahora (no consume)"""
+        bucket, last_reply = self._group(chat_id)
+        return (
+            time.monotonic() - last_reply >= self.min_interval
+            and bucket.available()
+            and self.global_bucket.available()
+        )
+
+    def consume(self, chat_id):
+        """Consume una respuesta del grupo y del cupo global. False si no hay cupo"""
+        group = self._group(chat_id)
+        if not self.can_reply(chat_id):
+            self.rejected += 1
+            return False
+        group[0].try_acquire()
+        self.global_bucket.try_acquire()
+        group[1] = time.monotonic()
+        return True
@@ -0,0 +1,87 @@
+"""
+HyperLogLog: conteo aproximado de usuarios únicos en poco espacio
+
+Un sketch son 2**precision registros de un byte. Agregar el mismo usuario
+varias veces no cambia nada, y dos sketches se combinan tomando el máximo
+de cada registro, así que los únicos de un período se calculan uniendo los
+sketches de sus buckets (horas/días) sin volver a leer las visitas.
+
+Con la precisión por defecto (11 → 2 KB) el error típico es ~2.3%; con pocos
+usuarios se usa conteo lineal y el resultado es prácticamente exacto.
+"""
+import hashlib
+import math
+
+DEFAULT_PRECISION = 11
+
+def _hash64(value):
+    """Hash estable de 64 bits (no depende de PYTHONHASHSEED)"""
+    digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+def _alpha(registers):
+    if registers == 16:
+        return 0.673
+    if registers == 32:
+        return 0.697
+    if registers == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / registers)
+
+class HyperLogLog:
+    """Sketch de cardinalidad serializable a bytes (columna LargeBinary)"""
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision debe estar entre 4 y 16")
+        self.precision = precision
+        size = 1 << precision
+        if registers is None:
+            self.registers = bytearray(size)
+        else:
+            if len(registers) != size:
+                raise ValueError(f"Se esperaban {size} registros, hay {len(registers)}")
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Sketch guardado con to_bytes (None o vacío = sketch vacío)"""
+        if not data:
+            return cls()
+        return cls(precision=len(data).bit_length() - 1, registers=data)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add(self, value):
+        """Agrega un elemento; devuelve True si cambió algún registro"""
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        # Posición del primer 1 en los bits restantes (ceros a la izquierda + 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Une otro sketch de la misma precisión en este (máximo por registro)"""
+        if other.precision != self.precision:
+            raise ValueError("No se pueden unir sketches de distinta precisión")
+        registers = self.registers
+        for i, value in enumerate(other.registers):
+            if value > registers[i]:
+                registers[i] = value
+        return self
+
+    def count(self):
+        """Cantidad estimada de elementos distintos"""
+        size = len(self.registers)
+        estimate = _alpha(size) * size * size / sum(2.0 ** -value for value in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Rango bajo: conteo lineal
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
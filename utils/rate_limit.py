@@ -0,0 +1,69 @@
+"""
+Limitador de tasa tipo token bucket para asyncio
+"""
+import asyncio
+import time
+
+def retry_after_seconds(error):
+    """Segundos de un RetryAfter de Telegram (según la versión es int o timedelta)"""
+    value = error.retry_after
+    if hasattr(value, 'total_seconds'):
+        return value.total_seconds()
+    return float(value)
+
+class TokenBucket:
+    """
+    Token bucket: se recargan `rate` tokens por segundo hasta `capacity`.
+
+    `acquire()` espera hasta que haya un token disponible; `try_acquire()`
+    consume uno solo si lo hay, sin esperar, y `available()` solo consulta.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate: tokens por segundo
+            capacity: ráfaga máxima (por defecto igual a rate)
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self, tokens=1):
+        """True si hay `tokens` disponibles (sin consumirlos)"""
+        self._refill()
+        return self.tokens >= tokens
+
+    def try_acquire(self, tokens=1):
+        """Consume `tokens` si están disponibles. Retorna True si se pudo"""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens=1):
+        """Espera hasta poder consumir `tokens`"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # El lock mantiene el orden de llegada entre las tareas que esperan
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def penalize(self, seconds):
+        """Vacía el bucket durante `seconds` (por ejemplo tras un 429 con Retry-After)"""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
@@ -3,15 +3,79 @@ Utilidades para limpiar títulos de películas y extraer información
 """
 import re
 
+# Patrones compilados una sola vez al importar el módulo
+_YEAR_IN_PARENS = re.compile(r'\((\d{4})\)')
+_YEAR_LOOSE = re.compile(r'\b(19\d{2}|20\d{2})\b')
+
+# Palabras sueltas a eliminar (case insensitive). Todas empiezan y terminan en
+# un carácter de palabra y van entre \b, así que quitar una solo junta dos
+# caracteres que no son de palabra: no rompe coincidencias de las demás y la
+# única que puede aparecer así es "Director' Cut" (por ejemplo en
+# "Director'HD Cut"). Por eso se eliminan en una sola pasada las anteriores a
+# Director's Cut, después esa y después las siguientes: mismo resultado que
+# aplicarlas una por una en este orden
+NOISE_TOKENS = [
+    r'\b\d{3,4}p\b',  # Calidad: 1080p, 720p, 2160p
+    r'\b4K\b',  # 4K
+    r'\bUHD\b',  # UHD
+    r'\bHD\b',  # HD
+    r'\bFHD\b',  # Full HD
+    r'\bBluRay\b',  # BluRay
+    r'\bBRRip\b',  # BRRip
+    r'\bWEBRip\b',  # WEBRip
+    r'\bWEB-DL\b',  # WEB-DL
+    r'\bHDRip\b',  # HDRip
+    r'\bDVDRip\b',  # DVDRip
+    r'\bx264\b',  # Codec
+    r'\bx265\b',  # Codec
+    r'\bHEVC\b',  # Codec
+    r'\bh264\b',  # Codec
+    r'\bh265\b',  # Codec
+    r'\b10bit\b',  # Bit depth
+    r'\bAAC\b',  # Audio codec
+    r'\bAC3\b',  # Audio codec
+    r'\bDTS\b',  # Audio codec
+    r'\bLatino\b',  # Idioma
+    r'\bEspañol\b',  # Idioma
+    r'\bSpanish\b',  # Idioma
+    r'\bEnglish\b',  # Idioma
+    r'\bSubtitulado\b',  # Subtítulos
+    r'\bSubs\b',  # Subtítulos
+    r'\bDual\b',  # Dual audio
+    r'\bExtended\b',  # Versión extendida
+    r'\bUnrated\b',  # Versión sin censura
+    r'\bDirector\'?s? Cut\b',  # Director's Cut
+    r'\bREMAST(?:ER|ERED)\b',  # Remasterizado
+    r'\bIMAX\b',  # IMAX
+]
+
+# Etapas que dependen de lo que quedó antes, en el mismo orden que siempre
+_BRACKETS = re.compile(r'\[.*?\]', re.IGNORECASE)  # Cualquier cosa entre corchetes: [1080p], [Latino]
+_QUALITY_PARENS = re.compile(r'\(.*?p\)', re.IGNORECASE)  # Calidad entre paréntesis: (1080p), (720p)
+_DIRECTORS_CUT = NOISE_TOKENS.index(r'\bDirector\'?s? Cut\b')
+_NOISE_STAGES = [
+    re.compile('|'.join(tokens), re.IGNORECASE)
+    for tokens in (
+        NOISE_TOKENS[:_DIRECTORS_CUT],
+        NOISE_TOKENS[_DIRECTORS_CUT:_DIRECTORS_CUT + 1],
+        NOISE_TOKENS[_DIRECTORS_CUT + 1:],
+    )
+]
+_TRAILING_GROUP = re.compile(r'\b-\s*\w+$', re.IGNORECASE)  # Grupo al final: - YIFY, - RARBG
+_SPACED_DASH = re.compile(r'\s+-\s+')  # Guiones con espacios
+# _ y . pasan a espacio y los espacios repetidos quedan en uno solo
+_SEPARATORS = re.compile(r'[\s_.]+')
+_EDGE_SYMBOLS = re.compile(r'^[^\w\s]+|[^\w\s]+$')
+
 def extract_year(text):
     """Extrae el año de un título (formato: título (2023) o título 2023)"""
     # Buscar año entre paréntesis: (2023) o (2020-2023)
-    match = re.search(r'\((\d{4})\)', text)
+    match = _YEAR_IN_PARENS.search(text)
     if match:
         return int(match.group(1))
     
     # Buscar año suelto: 2023
-    match = re.search(r'\b(19\d{2}|20\d{2})\b', text)
+    match = _YEAR_LOOSE.search(text)
     if match:
         return int(match.group(1))
     
@@ -30,62 +94,21 @@ def clean_title(text):
     # Primero extraer el año si existe (lo guardaremos aparte)
     year = extract_year(text)
     
-    # Lista de patrones a eliminar (case insensitive)
-    patterns_to_remove = [
-        r'\[.*?\]',  # Cualquier cosa entre corchetes: [1080p], [Latino]
-        r'\(.*?p\)',  # Calidad entre paréntesis: (1080p), (720p)
-        r'\b\d{3,4}p\b',  # Calidad: 1080p, 720p, 2160p
-        r'\b4K\b',  # 4K
-        r'\bUHD\b',  # UHD
-        r'\bHD\b',  # HD
-        r'\bFHD\b',  # Full HD
-        r'\bBluRay\b',  # BluRay
-        r'\bBRRip\b',  # BRRip
-        r'\bWEBRip\b',  # WEBRip
-        r'\bWEB-DL\b',  # WEB-DL
-        r'\bHDRip\b',  # HDRip
-        r'\bDVDRip\b',  # DVDRip
-        r'\bx264\b',  # Codec
-        r'\bx265\b',  # Codec
-        r'\bHEVC\b',  # Codec
-        r'\bh264\b',  # Codec
-        r'\bh265\b',  # Codec
-        r'\b10bit\b',  # Bit depth
-        r'\bAAC\b',  # Audio codec
-        r'\bAC3\b',  # Audio codec
-        r'\bDTS\b',  # Audio codec
-        r'\bLatino\b',  # Idioma
-        r'\bEspañol\b',  # Idioma
-        r'\bSpanish\b',  # Idioma
-        r'\bEnglish\b',  # Idioma
-        r'\bSubtitulado\b',  # Subtítulos
-        r'\bSubs\b',  # Subtítulos
-        r'\bDual\b',  # Dual audio
-        r'\bExtended\b',  # Versión extendida
-        r'\bUnrated\b',  # Versión sin censura
-        r'\bDirector\'?s? Cut\b',  # Director's Cut
-        r'\bREMAST(ER|ERED)\b',  # Remasterizado
-        r'\bIMAX\b',  # IMAX
-        r'\b-\s*\w+$',  # Grupo al final: - YIFY, - RARBG
-        r'\s+-\s+',  # Guiones con espacios
-    ]
-    
-    cleaned = text
-    
     # Remover año entre paréntesis para limpieza (lo agregaremos después si es necesario)
-    cleaned = re.sub(r'\(\d{4}\)', '', cleaned)
+    cleaned = _YEAR_IN_PARENS.sub('', text)
     
-    # Aplicar todos los patrones
-    for pattern in patterns_to_remove:
-        cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+    cleaned = _BRACKETS.sub('', cleaned)
+    cleaned = _QUALITY_PARENS.sub('', cleaned)
+    for stage in _NOISE_STAGES:
+        cleaned = stage.sub('', cleaned)
+    cleaned = _TRAILING_GROUP.sub('', cleaned)
+    cleaned = _SPACED_DASH.sub('', cleaned)
     
     # Limpiar caracteres especiales y múltiples espacios
-    cleaned = re.sub(r'[_\.]', ' ', cleaned)  # Reemplazar _ y . por espacios
-    cleaned = re.sub(r'\s+', ' ', cleaned)  # Múltiples espacios → uno solo
-    cleaned = cleaned.strip()
+    cleaned = _SEPARATORS.sub(' ', cleaned).strip()
     
     # Remover caracteres especiales al inicio/fin
-    cleaned = re.sub(r'^[^\w\s]+|[^\w\s]+$', '', cleaned)
+    cleaned = _EDGE_SYMBOLS.sub('', cleaned)
     
     return cleaned, year
 
@@ -1,5 +1,13 @@
+import asyncio
+import weakref
 import requests
-from config.settings import TMDB_API_KEY
+import httpx
+from config.settings import TMDB_API_KEY, TMDB_RATE_LIMIT, TMDB_MAX_CONNECTIONS
+from utils.rate_limit import TokenBucket
+from utils.tmdb_cache import TMDBCache
+
+class TMDBNotFoundError(Exception):
+    """TMDB respondió 404 (o hay un 404 cacheado) para el recurso pedido"""
 
 class TMDBApi:
     BASE_URL = "https://api.themoviedb.org/3"
@@ -7,6 +15,16 @@ class TMDBApi:
     
     def __init__(self):
         self.api_key = TMDB_API_KEY
+        self._session = None
+    
+    def _get(self, path, params):
+        """GET a la API de TMDB (bloqueante, para scripts). Retorna el JSON"""
+        if self._session is None:
+            self._session = requests.Session()
+        params = {"api_key": self.api_key, **params}
+        response = self._session.get(f"{self.BASE_URL}{path}", params=params, timeout=10)
+        response.raise_for_status()
+        return response.json()
     
     def search_movie(self, title, year=None, return_multiple=False, limit=5):
         """
@@ -17,7 +35,7 @@ class TMDBApi:
             year: Año (opcional, mejora precisión)
             return_multiple: Si True, retorna lista de resultados. Si False, solo el primero
             limit: Número máximo de resultados cuando return_multiple=True
-            
+        
         Returns:
             Si return_multiple=False: dict con datos de película o None
             Si return_multiple=True: lista de dicts con resultados ordenados por relevancia
@@ -31,13 +49,7 @@ class TMDBApi:
             # 2. Si no encuentra suficientes, buscar en inglés
             if len(results) < limit:
                 en_results = self._search_with_language(title, "en-US", year, return_all=True)
-                # Agregar resultados en inglés que no estén duplicados
-                existing_ids = {r['tmdb_id'] for r in results}
-                for r in en_results:
-                    if r['tmdb_id'] not in existing_ids:
-                        results.append(r)
-                        if len(results) >= limit:
-                            break
+                results = self._merge_results(results, en_results, limit)
             
             # 3. Si aún no encuentra y había año, intentar sin año
             if len(results) == 0 and year:
@@ -46,29 +58,41 @@ class TMDBApi:
                     results = []
                 if len(results) < limit:
                     en_results = self._search_with_language(title, "en-US", None, return_all=True)
-                    existing_ids = {r['tmdb_id'] for r in results}
-                    for r in en_results:
-                        if r['tmdb_id'] not in existing_ids:
-                            results.append(r)
-                            if len(results) >= limit:
-                                break
-            
-            # Calcular score de confianza para cada resultado
-            for result in results:
-                result['confidence'] = self._calculate_confidence(title, year, result)
-            
-            # Ordenar por confianza
-            results.sort(key=lambda x: x['confidence'], reverse=True)
-            
-            if return_multiple:
-                return results[:limit]
-            else:
-                return results[0] if results else None
+                    results = self._merge_results(results, en_results, limit)
             
+            return self._rank_results(title, year, results, return_multiple, limit)
+        
         except Exception as e:
             print(f"Error buscando película: {e}")
             return [] if return_multiple else None
     
+    @staticmethod
+    def _merge_results(results, extra_results, limit):
+        """Agrega resultados de otro idioma que no estén duplicados, hasta `limit`"""
+        results = list(results or [])
+        existing_ids = {r['tmdb_id'] for r in results}
+        for r in extra_results or []:
+            if len(results) >= limit:
+                break
+            if r['tmdb_id'] not in existing_ids:
+                results.append(r)
+                existing_ids.add(r['tmdb_id'])
+        return results
+    
+    def _rank_results(self, title, year, results, return_multiple, limit):
+        """Calcula la confianza de cada resultado y los ordena"""
+        # Calcular score de confianza para cada resultado
+        for result in results:
+            result['confidence'] = self._calculate_confidence(title, year, result)
+        
+        # Ordenar por confianza
+        results.sort(key=lambda x: x['confidence'], reverse=True)
+        
+        if return_multiple:
+            return results[:limit]
+        else:
+            return results[0] if results else None
+    
     def _calculate_confidence(self, search_title, search_year, result):
         """
         Calcula un score de confianza (0-100) basado en similitud de título y año
@@ -112,6 +136,25 @@ class TMDBApi:
         
         return min(100, score)
     
+    @staticmethod
+    def _movie_search_params(title, language, year=None):
+        params = {
+            "query": title,
+            "language": language,
+            "page": 1
+        }
+        if year:
+            params["year"] = year
+        return params
+    
+    def _parse_movie_search(self, data, return_all):
+        if data["results"]:
+            if return_all:
+                return [self._format_movie_data(movie) for movie in data["results"][:10]]
+            else:
+                return self._format_movie_data(data["results"][0])
+        return [] if return_all else None
+    
     def _search_with_language(self, title, language, year=None, return_all=False):
         """
         Busca en un idioma específico
@@ -120,28 +163,9 @@ class TMDBApi:
             return_all: Si True, retorna lista de todos los resultados. Si False, solo el primero
         """
         try:
-            url = f"{self.BASE_URL}/search/movie"
-            params = {
-                "api_key": self.api_key,
-                "query": title,
-                "language": language,
-                "page": 1
-            }
-            
-            if year:
-                params["year"] = year
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data["results"]:
-                if return_all:
-                    return [self._format_movie_data(movie) for movie in data["results"][:10]]
-                else:
-                    return self._format_movie_data(data["results"][0])
-            return [] if return_all else None
-            
+            data = self._get("/search/movie", self._movie_search_params(title, language, year))
+            return self._parse_movie_search(data, return_all)
+        
         except Exception as e:
             print(f"Error en búsqueda ({language}): {e}")
             return [] if return_all else None
@@ -161,53 +185,53 @@ class TMDBApi:
             "genre_ids": movie.get("genre_ids", [])
         }
     
+    def _format_movie_details(self, movie):
+        """Formatea los detalles completos de la película"""
+        return {
+            "tmdb_id": movie.get("id"),
+            "title": movie.get("title", "Sin título"),
+            "original_title": movie.get("original_title", ""),
+            "year": movie.get("release_date", "")[:4] if movie.get("release_date") else "N/A",
+            "overview": movie.get("overview", "Sin descripción disponible."),
+            "poster_url": f"{self.IMAGE_BASE_URL}{movie['poster_path']}" if movie.get("poster_path") else None,
+            "backdrop_url": f"{self.IMAGE_BASE_URL}{movie['backdrop_path']}" if movie.get("backdrop_path") else None,
+            "vote_average": movie.get("vote_average", 0),
+            "runtime": movie.get("runtime", 0),
+            "genres": [g["name"] for g in movie.get("genres", [])],
+            "budget": movie.get("budget", 0),
+            "revenue": movie.get("revenue", 0),
+            "tagline": movie.get("tagline", "")
+        }
+    
     def get_movie_details(self, tmdb_id):
         """Obtiene detalles completos de una película por su ID de TMDB"""
         try:
-            url = f"{self.BASE_URL}/movie/{tmdb_id}"
-            params = {
-                "api_key": self.api_key,
-                "language": "es-ES"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            movie = response.json()
-            
-            return {
-                "tmdb_id": movie.get("id"),
-                "title": movie.get("title", "Sin título"),
-                "original_title": movie.get("original_title", ""),
-                "year": movie.get("release_date", "")[:4] if movie.get("release_date") else "N/A",
-                "overview": movie.get("overview", "Sin descripción disponible."),
-                "poster_url": f"{self.IMAGE_BASE_URL}{movie['poster_path']}" if movie.get("poster_path") else None,
-                "backdrop_url": f"{self.IMAGE_BASE_URL}{movie['backdrop_path']}" if movie.get("backdrop_path") else None,
-                "vote_average": movie.get("vote_average", 0),
-                "runtime": movie.get("runtime", 0),
-                "genres": [g["name"] for g in movie.get("genres", [])],
-                "budget": movie.get("budget", 0),
-                "revenue": movie.get("revenue", 0),
-                "tagline": movie.get("tagline", "")
-            }
-            
+            movie = self._get(f"/movie/{tmdb_id}", {"language": "es-ES"})
+            return self._format_movie_details(movie)
+        
         except Exception as e:
             print(f"Error obteniendo detalles: {e}")
             return None
     
     # ==================== MÉTODOS PARA SERIES ====================
     
+    @staticmethod
+    def _split_name_year(name):
+        """Extrae año si está presente (ej: "Loki (2021)" -> "Loki", "2021")"""
+        year = None
+        clean_name = name
+        if "(" in name and ")" in name:
+            parts = name.split("(")
+            clean_name = parts[0].strip()
+            year_text = parts[1].split(")")[0].strip()
+            if year_text.isdigit():
+                year = year_text
+        return clean_name, year
+    
     def search_tv_show(self, name):
         """Busca una serie por nombre - Primero en español, luego en inglés"""
         try:
-            # Extraer año si está presente (ej: "Loki (2021)" -> "Loki", "2021")
-            year = None
-            clean_name = name
-            if "(" in name and ")" in name:
-                parts = name.split("(")
-                clean_name = parts[0].strip()
-                year_text = parts[1].split(")")[0].strip()
-                if year_text.isdigit():
-                    year = year_text
+            clean_name, year = self._split_name_year(name)
             
             # 1. Intentar buscar en español
             result = self._search_tv_with_language(clean_name, "es-ES", year)
@@ -226,33 +250,30 @@ class TMDBApi:
                     return result
             
             return None
-            
+        
         except Exception as e:
             print(f"Error buscando serie: {e}")
             return None
     
+    @staticmethod
+    def _tv_search_params(name, language, year=None):
+        params = {
+            "query": name,
+            "language": language,
+            "page": 1
+        }
+        if year:
+            params["first_air_date_year"] = year
+        return params
+    
     def _search_tv_with_language(self, name, language, year=None):
         """Busca serie en un idioma específico"""
         try:
-            url = f"{self.BASE_URL}/search/tv"
-            params = {
-                "api_key": self.api_key,
-                "query": name,
-                "language": language,
-                "page": 1
-            }
-            
-            if year:
-                params["first_air_date_year"] = year
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
+            data = self._get("/search/tv", self._tv_search_params(name, language, year))
             if data["results"]:
                 return self._format_tv_data(data["results"][0])
             return None
-            
+        
         except Exception as e:
             print(f"Error en búsqueda de serie ({language}): {e}")
             return None
@@ -275,79 +296,265 @@ class TMDBApi:
             "genre_ids": show.get("genre_ids", [])
         }
     
+    def _format_tv_details(self, show):
+        """Formatea los detalles completos de la serie"""
+        year_str = show.get("first_air_date", "")[:4] if show.get("first_air_date") else None
+        year = int(year_str) if year_str and year_str.isdigit() else None
+        
+        return {
+            "tmdb_id": show.get("id"),
+            "name": show.get("name", "Sin título"),
+            "original_name": show.get("original_name", ""),
+            "year": year,
+            "overview": show.get("overview", "Sin descripción disponible."),
+            "poster_url": f"{self.IMAGE_BASE_URL}{show['poster_path']}" if show.get("poster_path") else None,
+            "backdrop_url": f"{self.IMAGE_BASE_URL}{show['backdrop_path']}" if show.get("backdrop_path") else None,
+            "vote_average": show.get("vote_average", 0),
+            "number_of_seasons": show.get("number_of_seasons", 0),
+            "number_of_episodes": show.get("number_of_episodes", 0),
+            "genres": [g["name"] for g in show.get("genres", [])],
+            "status": show.get("status", "Unknown"),
+            "tagline": show.get("tagline", ""),
+            "networks": [n["name"] for n in show.get("networks", [])],
+            "created_by": [c["name"] for c in show.get("created_by", [])]
+        }
+    
     def get_tv_show_details(self, tmdb_id):
         """Obtiene detalles completos de una serie por su ID de TMDB"""
         try:
-            url = f"{self.BASE_URL}/tv/{tmdb_id}"
-            params = {
-                "api_key": self.api_key,
-                "language": "es-ES"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            show = response.json()
-            
-            year_str = show.get("first_air_date", "")[:4] if show.get("first_air_date") else None
-            year = int(year_str) if year_str and year_str.isdigit() else None
-            
-            return {
-                "tmdb_id": show.get("id"),
-                "name": show.get("name", "Sin título"),
-                "original_name": show.get("original_name", ""),
-                "year": year,
-                "overview": show.get("overview", "Sin descripción disponible."),
-                "poster_url": f"{self.IMAGE_BASE_URL}{show['poster_path']}" if show.get("poster_path") else None,
-                "backdrop_url": f"{self.IMAGE_BASE_URL}{show['backdrop_path']}" if show.get("backdrop_path") else None,
-                "vote_average": show.get("vote_average", 0),
-                "number_of_seasons": show.get("number_of_seasons", 0),
-                "number_of_episodes": show.get("number_of_episodes", 0),
-                "genres": [g["name"] for g in show.get("genres", [])],
-                "status": show.get("status", "Unknown"),
-                "tagline": show.get("tagline", ""),
-                "networks": [n["name"] for n in show.get("networks", [])],
-                "created_by": [c["name"] for c in show.get("created_by", [])]
-            }
-            
+            show = self._get(f"/tv/{tmdb_id}", {"language": "es-ES"})
+            return self._format_tv_details(show)
+        
         except Exception as e:
             print(f"Error obteniendo detalles de serie: {e}")
             return None
     
+    def _format_season(self, season):
+        """Formatea una temporada con sus episodios"""
+        episodes = []
+        for ep in season.get("episodes", []):
+            episodes.append({
+                "episode_number": ep.get("episode_number"),
+                "name": ep.get("name", f"Episodio {ep.get('episode_number')}"),
+                "overview": ep.get("overview", "Sin descripción disponible."),
+                "air_date": ep.get("air_date"),
+                "runtime": ep.get("runtime"),
+                "still_path": f"{self.IMAGE_BASE_URL}{ep['still_path']}" if ep.get("still_path") else None,
+                "vote_average": ep.get("vote_average", 0)
+            })
+        
+        return {
+            "season_number": season.get("season_number"),
+            "name": season.get("name", f"Temporada {season.get('season_number')}"),
+            "overview": season.get("overview", ""),
+            "air_date": season.get("air_date"),
+            "poster_url": f"{self.IMAGE_BASE_URL}{season['poster_path']}" if season.get("poster_path") else None,
+            "episodes": episodes
+        }
+    
     def get_season_details(self, tmdb_id, season_number):
         """Obtiene detalles de una temporada específica incluyendo episodios"""
         try:
-            url = f"{self.BASE_URL}/tv/{tmdb_id}/season/{season_number}"
-            params = {
-                "api_key": self.api_key,
-                "language": "es-ES"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            season = self._get(f"/tv/{tmdb_id}/season/{season_number}", {"language": "es-ES"})
+            return self._format_season(season)
+        
+        except Exception as e:
+            print(f"Error obteniendo temporada: {e}")
+            return None
+
+
+class AsyncTMDBApi(TMDBApi):
+    """
+    Cliente TMDB para handlers async: no bloquea el event loop del bot.
+    
+    Usa un httpx.AsyncClient con conexiones keep-alive por event loop (un
+    cliente queda ligado al loop donde se crea; server.py tiene dos), compartido
+    por todo el proceso (ver AsyncTMDBApi.shared()), lanza las búsquedas es-ES/en-US en
+    paralelo y respeta el límite de peticiones de TMDB con un token bucket.
+    Las respuestas pasan por TMDBCache (memoria + tabla tmdb_cache).
+    Los métodos públicos devuelven lo mismo que TMDBApi, pero con await.
+    """
+    
+    _shared = None
+    
+    def __init__(self):
+        super().__init__()
+        # loop -> httpx.AsyncClient; al desaparecer un loop se suelta su cliente
+        self._clients = weakref.WeakKeyDictionary()
+        self._bucket = TokenBucket(TMDB_RATE_LIMIT)
+        self.cache = TMDBCache()
+    
+    @classmethod
+    def shared(cls, db=None):
+        """
+        Instancia única del proceso (un solo pool de conexiones).
+        
+        Args:
+            db: DatabaseManager del bot para el caché persistente; basta con
+                pasarlo una vez al arrancar
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        if db is not None:
+            cls._shared.cache.bind(db)
+        return cls._shared
+    
+    def _get_client(self):
+        # Un cliente por event loop: no se reemplaza al cambiar de loop
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self.BASE_URL,
+                timeout=10,
+                limits=httpx.Limits(
+                    max_connections=TMDB_MAX_CONNECTIONS,
+                    max_keepalive_connections=TMDB_MAX_CONNECTIONS
+                )
+            )
+            self._clients[loop] = client
+        return client
+    
+    async def close(self):
+        """
+        Cierra las conexiones de todos los clientes: el del loop actual aquí y
+        los de otros loops que sigan corriendo en su propio loop
+        """
+        current = asyncio.get_running_loop()
+        for loop, client in list(self._clients.items()):
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+            # Con el loop ya cerrado no se puede usar aclose: solo se suelta el cliente
+        self._clients.clear()
+    
+    async def _get(self, path, params):
+        """
+        GET a la API de TMDB, pasando por el caché. Reintenta una vez si TMDB
+        responde 429. Lanza TMDBNotFoundError en 404.
+        """
+        cached = await self.cache.get(path, params)
+        if cached is not None:
+            status_code, data = cached
+            if status_code == 404:
+                raise TMDBNotFoundError(path)
+            return data
+        
+        client = self._get_client()
+        request_params = {"api_key": self.api_key, **params}
+        
+        for attempt in range(2):
+            await self._bucket.acquire()
+            response = await client.get(path, params=request_params)
+            if response.status_code == 429 and attempt == 0:
+                retry_after = float(response.headers.get("Retry-After", 1))
+                self._bucket.penalize(retry_after)
+                continue
+            if response.status_code == 404:
+                await self.cache.set(path, params, 404, None)
+                raise TMDBNotFoundError(path)
             response.raise_for_status()
-            season = response.json()
+            data = response.json()
+            await self.cache.set(path, params, 200, data)
+            return data
+    
+    async def search_movie(self, title, year=None, return_multiple=False, limit=5):
+        """
+        Igual que TMDBApi.search_movie, pero las búsquedas en español e inglés
+        se hacen al mismo tiempo
+        """
+        try:
+            results, en_results = await asyncio.gather(
+                self._search_with_language(title, "es-ES", year, return_all=True),
+                self._search_with_language(title, "en-US", year, return_all=True)
+            )
+            results = self._merge_results(results, en_results, limit)
             
-            episodes = []
-            for ep in season.get("episodes", []):
-                episodes.append({
-                    "episode_number": ep.get("episode_number"),
-                    "name": ep.get("name", f"Episodio {ep.get('episode_number')}"),
-                    "overview": ep.get("overview", "Sin descripción disponible."),
-                    "air_date": ep.get("air_date"),
-                    "runtime": ep.get("runtime"),
-                    "still_path": f"{self.IMAGE_BASE_URL}{ep['still_path']}" if ep.get("still_path") else None,
-                    "vote_average": ep.get("vote_average", 0)
-                })
+            # Si no encuentra y había año, intentar sin año
+            if len(results) == 0 and year:
+                results, en_results = await asyncio.gather(
+                    self._search_with_language(title, "es-ES", None, return_all=True),
+                    self._search_with_language(title, "en-US", None, return_all=True)
+                )
+                results = self._merge_results(results, en_results, limit)
             
-            return {
-                "season_number": season.get("season_number"),
-                "name": season.get("name", f"Temporada {season.get('season_number')}"),
-                "overview": season.get("overview", ""),
-                "air_date": season.get("air_date"),
-                "poster_url": f"{self.IMAGE_BASE_URL}{season['poster_path']}" if season.get("poster_path") else None,
-                "episodes": episodes
-            }
+            return self._rank_results(title, year, results, return_multiple, limit)
+        
+        except Exception as e:
+            print(f"Error buscando película: {e}")
+            return [] if return_multiple else None
+    
+    async def _search_with_language(self, title, language, year=None, return_all=False):
+        try:
+            data = await self._get("/search/movie", self._movie_search_params(title, language, year))
+            return self._parse_movie_search(data, return_all)
+        
+        except Exception as e:
+            print(f"Error en búsqueda ({language}): {e}")
+            return [] if return_all else None
+    
+    async def get_movie_details(self, tmdb_id):
+        try:
+            movie = await self._get(f"/movie/{tmdb_id}", {"language": "es-ES"})
+            return self._format_movie_details(movie)
+        
+        except Exception as e:
+            print(f"Error obteniendo detalles: {e}")
+            return None
+    
+    async def search_tv_show(self, name):
+        """
+        Igual que TMDBApi.search_tv_show (prioridad español > inglés > sin año),
+        pero español e inglés se consultan al mismo tiempo
+        """
+        try:
+            clean_name, year = self._split_name_year(name)
+            
+            es_result, en_result = await asyncio.gather(
+                self._search_tv_with_language(clean_name, "es-ES", year),
+                self._search_tv_with_language(clean_name, "en-US", year)
+            )
+            if es_result:
+                return es_result
+            if en_result:
+                return en_result
+            
+            # Último intento sin año
+            if year:
+                return await self._search_tv_with_language(clean_name, "es-ES", None)
             
+            return None
+        
+        except Exception as e:
+            print(f"Error buscando serie: {e}")
+            return None
+    
+    async def _search_tv_with_language(self, name, language, year=None):
+        try:
+            data = await self._get("/search/tv", self._tv_search_params(name, language, year))
+            if data["results"]:
+                return self._format_tv_data(data["results"][0])
+            return None
+        
+        except Exception as e:
+            print(f"Error en búsqueda de serie ({language}): {e}")
+            return None
+    
+    async def get_tv_show_details(self, tmdb_id):
+        try:
+            show = await self._get(f"/tv/{tmdb_id}", {"language": "es-ES"})
+            return self._format_tv_details(show)
+        
+        except Exception as e:
+            print(f"Error obteniendo detalles de serie: {e}")
+            return None
+    
+    async def get_season_details(self, tmdb_id, season_number):
+        try:
+            season = await self._get(f"/tv/{tmdb_id}/season/{season_number}", {"language": "es-ES"})
+            return self._format_season(season)
+        
         except Exception as e:
             print(f"Error obteniendo temporada: {e}")
             return None
-
@@ -0,0 +1,155 @@
+"""
+Caché de respuestas de la API de TMDB
+
+Dos niveles:
+- LRU en memoria (TMDB_CACHE_MEMORY_ITEMS entradas) para lo más reciente
+- Tabla tmdb_cache en la base de datos, que sobrevive a reinicios
+
+La clave es el endpoint más los parámetros (incluido el idioma), sin la
+api_key. Cada tipo de endpoint tiene su propio TTL y las respuestas vacías
+o 404 también se guardan (caché negativo) con un TTL más corto.
+
+El nivel de la BD usa el DatabaseManager del bot (bind(db), lo hace
+AsyncTMDBApi.shared(db) al arrancar); sin BD enlazada solo queda el LRU.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from config.settings import TMDB_CACHE_MEMORY_ITEMS
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# (patrón del endpoint, TTL en segundos)
+ENDPOINT_TTLS = [
+    (re.compile(r'^/search/'), DAY),
+    (re.compile(r'^/tv/\d+/season/\d+$'), DAY),  # temporadas en emisión suman episodios
+    (re.compile(r'^/(movie|tv)/\d+$'), 7 * DAY),
+]
+DEFAULT_TTL = DAY
+
+# Búsquedas sin resultados y 404
+NEGATIVE_TTL = 6 * HOUR
+
+class TMDBCache:
+    """Caché de respuestas de TMDB con LRU en memoria y persistencia en la BD"""
+
+    def __init__(self, db=None, memory_items=TMDB_CACHE_MEMORY_ITEMS):
+        self._db = db
+        self.memory_items = memory_items
+        self._memory = OrderedDict()  # cache_key -> (expires_at epoch, status_code, payload)
+
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def bind(self, db):
+        """Usa el DatabaseManager existente (mismo engine/pool) para el nivel persistente"""
+        self._db = db
+
+    @staticmethod
+    def make_key(path, params):
+        """Clave estable para endpoint + parámetros (sin api_key)"""
+        query = urlencode(sorted((k, str(v)) for k, v in params.items() if k != "api_key"))
+        return hashlib.sha256(f"{path}?{query}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def ttl_for(path, status_code, payload):
+        """TTL en segundos según el endpoint y si la respuesta es negativa"""
+        if status_code == 404:
+            return NEGATIVE_TTL
+        if isinstance(payload, dict) and payload.get("results") == []:
+            return NEGATIVE_TTL
+        for pattern, ttl in ENDPOINT_TTLS:
+            if pattern.match(path):
+                return ttl
+        return DEFAULT_TTL
+
+    def _remember(self, cache_key, expires_at, status_code, payload):
+        self._memory[cache_key] = (expires_at, status_code, payload)
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _count_hit(self, status_code, payload):
+        if status_code == 404 or (isinstance(payload, dict) and payload.get("results") == []):
+            self.negative_hits += 1
+
+    async def get(self, path, params):
+        """
+        Busca una respuesta cacheada.
+
+        Returns:
+            (status_code, payload) o None si no está o venció
+        """
+        cache_key = self.make_key(path, params)
+
+        entry = self._memory.get(cache_key)
+        if entry is not None:
+            expires_at, status_code, payload = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(cache_key)
+                self.memory_hits += 1
+                self._count_hit(status_code, payload)
+                return status_code, payload
+            del self._memory[cache_key]
+
+        stored = None
+        if self._db is not None:
+            try:
+                stored = await self._db.get_tmdb_cache(cache_key)
+            except Exception as e:
+                logger.warning(f"Error leyendo caché de TMDB: {e}")
+
+        if stored is None:
+            self.misses += 1
+            return None
+
+        status_code, raw_payload, expires_at = stored
+        payload = json.loads(raw_payload) if raw_payload else None
+        remaining = (expires_at - datetime.utcnow()).total_seconds()
+        self._remember(cache_key, time.time() + remaining, status_code, payload)
+        self.db_hits += 1
+        self._count_hit(status_code, payload)
+        return status_code, payload
+
+    async def set(self, path, params, status_code, payload):
+        """Guarda una respuesta (200 con JSON o 404 con payload None)"""
+        cache_key = self.make_key(path, params)
+        ttl = self.ttl_for(path, status_code, payload)
+        self._remember(cache_key, time.time() + ttl, status_code, payload)
+
+        if self._db is None:
+            return
+        try:
+            await self._db.set_tmdb_cache(
+                cache_key,
+                path,
+                status_code,
+                json.dumps(payload) if payload is not None else None,
+                datetime.utcnow() + timedelta(seconds=ttl)
+            )
+        except Exception as e:
+            logger.warning(f"Error guardando caché de TMDB: {e}")
+
+    def stats(self):
+        """Contadores de aciertos/fallos para /stats"""
+        hits = self.memory_hits + self.db_hits
+        total = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_ratio': (hits / total) if total else 0.0,
+            'memory_items': len(self._memory),
+        }